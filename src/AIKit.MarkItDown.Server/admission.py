@@ -0,0 +1,132 @@
+"""Admission control: per-class concurrency limits and bounded waiting for conversions."""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from config import ADMISSION_LIMITS, ADMISSION_RETRY_AFTER
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Conversion class of each extension; anything else is "other"
+CONVERSION_CLASSES = {
+    **dict.fromkeys(("wav", "mp3", "m4a", "mp4", "flac", "ogg", "aac", "wma"), "audio"),
+    **dict.fromkeys(("jpg", "jpeg", "png", "bmp", "tif", "tiff", "gif", "webp", "heic"), "ocr"),
+    "pdf": "pdf",
+    **dict.fromkeys(("docx", "doc", "xlsx", "xls", "pptx", "ppt", "msg", "epub", "zip"), "office"),
+    **dict.fromkeys(("txt", "text", "md", "csv", "json", "jsonl", "html", "htm", "xml", "rss", "atom", "ipynb"), "text"),
+}
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a conversion class is at its concurrency limit and its wait queue is full."""
+
+    def __init__(self, conversion_class: str, retry_after: int):
+        super().__init__(f"Too many concurrent {conversion_class} conversions. Try again later.")
+        self.conversion_class = conversion_class
+        self.retry_after = retry_after
+
+
+def conversion_class(file_extension: Optional[str]) -> str:
+    """Classify a conversion by its file extension.
+
+    Args:
+        file_extension: The file extension, without the leading dot.
+
+    Returns:
+        One of "audio", "ocr", "pdf", "office", "text" or "other".
+    """
+    return CONVERSION_CLASSES.get((file_extension or "").lower().lstrip("."), "other")
+
+
+class _ClassLimiter:
+    """Concurrency limit and bounded wait queue for one conversion class."""
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+
+    async def acquire(self, wait: bool):
+        if self._semaphore is None:
+            self.active += 1
+            return
+        if self._semaphore.locked() and not wait and self.waiting >= self.max_queue:
+            raise AdmissionRejectedError(self.name, ADMISSION_RETRY_AFTER)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+class AdmissionController:
+    """Admits conversions per class so heavy formats cannot starve cheap ones.
+
+    Each class (audio, OCR/image, PDF, office, text, other) has its own concurrency
+    limit and wait queue. Interactive requests are rejected right away once both are
+    full; background work (batches, jobs) waits for a slot instead, since it is already
+    bounded by its own concurrency.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]]):
+        self._limiters = {name: _ClassLimiter(name, limit, max_queue) for name, (limit, max_queue) in limits.items()}
+
+    def _limiter(self, file_extension: Optional[str]) -> _ClassLimiter:
+        name = conversion_class(file_extension)
+        return self._limiters.get(name) or self._limiters["other"]
+
+    async def acquire(self, file_extension: Optional[str], wait: bool = False) -> _ClassLimiter:
+        """Take a slot for a conversion; the caller must call release() on the returned limiter.
+
+        Args:
+            file_extension: The file extension of the conversion.
+            wait: Wait for a slot even when the class queue is full, instead of failing fast.
+
+        Returns:
+            The limiter holding the slot.
+
+        Raises:
+            AdmissionRejectedError: If the class is saturated and wait is False.
+        """
+        limiter = self._limiter(file_extension)
+        try:
+            await limiter.acquire(wait)
+        except AdmissionRejectedError:
+            logger.warning(f"Rejected {limiter.name} conversion: {limiter.active} running, {limiter.waiting} waiting")
+            metrics.record_rejection(limiter.name)
+            raise
+        return limiter
+
+    @asynccontextmanager
+    async def slot(self, file_extension: Optional[str], wait: bool = False):
+        """Hold a slot for a conversion for the duration of the block."""
+        limiter = await self.acquire(file_extension, wait)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def waiting(self, name: str) -> int:
+        """Number of conversions of a class waiting for a slot."""
+        limiter = self._limiters.get(name)
+        return limiter.waiting if limiter is not None else 0
+
+    @property
+    def classes(self):
+        return list(self._limiters)
+
+
+# Global admission controller
+admission_controller = AdmissionController(ADMISSION_LIMITS)
@@ -0,0 +1,144 @@
+"""Lazy, size-limited extraction of ZIP and tar archive members."""
+
+import logging
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from constants import UPLOAD_CHUNK_SIZE
+from uploads import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+# Upload extensions converted member by member on /convert rather than by MarkItDown's ZIP converter
+ARCHIVE_EXTENSIONS = ("zip",)
+
+
+class ArchiveError(ValueError):
+    """Raised when an archive or one of its members cannot be extracted within the limits."""
+
+
+class ArchiveTotalSizeError(ArchiveError):
+    """Raised when the total decompressed size of an archive exceeds the cap."""
+
+
+def archive_kind(stream: BinaryIO) -> Optional[str]:
+    """Detect whether a seekable stream holds a ZIP or tar archive.
+
+    Args:
+        stream: A seekable binary stream positioned at the start of the archive.
+
+    Returns:
+        "zip", "tar" or None if the stream is not a supported archive.
+    """
+    try:
+        if zipfile.is_zipfile(stream):
+            return "zip"
+        stream.seek(0)
+        if tarfile.is_tarfile(stream):
+            return "tar"
+        return None
+    finally:
+        stream.seek(0)
+
+
+def _copy_member(source: BinaryIO, name: str, max_member_size: int, remaining: int) -> SpooledUpload:
+    """Copy one member into a SpooledUpload, counting the bytes actually decompressed."""
+    suffix = "." + name.rsplit(".", 1)[-1].lower() if "." in name.rsplit("/", 1)[-1] else None
+    upload = SpooledUpload(suffix=suffix)
+    try:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if upload.size + len(chunk) > remaining:
+                raise ArchiveTotalSizeError("Archive exceeds the maximum total decompressed size")
+            if upload.size + len(chunk) > max_member_size:
+                raise ArchiveError(f"Member {name} exceeds the maximum file size")
+            upload.write(chunk)
+        upload.finish()
+    except BaseException:
+        upload.close()
+        raise
+    return upload
+
+
+def iter_archive_members(
+    stream: BinaryIO,
+    max_members: int,
+    max_total_bytes: int,
+    max_member_size: int
+) -> Iterator[Tuple[str, Optional[SpooledUpload], Optional[str]]]:
+    """Extract archive members one at a time.
+
+    Members are only decompressed when the iterator is advanced, so a consumer that
+    converts members as it goes never holds more than one extracted member per
+    in-flight conversion. Sizes are counted from the decompressed data rather than
+    trusted from archive headers.
+
+    Args:
+        stream: A seekable stream holding a ZIP or tar archive.
+        max_members: Maximum number of file members to extract.
+        max_total_bytes: Cap on the total decompressed bytes across members.
+        max_member_size: Cap on the decompressed size of one member.
+
+    Yields:
+        Tuples of (name, upload, error). Either upload or error is set; the consumer
+        owns and must close each upload.
+
+    Raises:
+        ArchiveError: If the stream is not a supported archive.
+    """
+    kind = archive_kind(stream)
+    if kind is None:
+        raise ArchiveError("Unsupported archive format. Expected a ZIP or tar archive.")
+
+    total = 0
+    count = 0
+
+    if kind == "zip":
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                    continue
+                if count >= max_members:
+                    yield info.filename, None, f"Archive has more than {max_members} members"
+                    return
+                count += 1
+                try:
+                    with archive.open(info) as source:
+                        upload = _copy_member(source, info.filename, max_member_size, max_total_bytes - total)
+                except ArchiveTotalSizeError as e:
+                    yield info.filename, None, str(e)
+                    return
+                except ArchiveError as e:
+                    yield info.filename, None, str(e)
+                    continue
+                except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+                    yield info.filename, None, f"Failed to extract member: {e}"
+                    continue
+                total += upload.size
+                yield info.filename, upload, None
+    else:
+        with tarfile.open(fileobj=stream, mode="r:*") as archive:
+            for info in archive:
+                if not info.isfile():
+                    continue
+                if count >= max_members:
+                    yield info.name, None, f"Archive has more than {max_members} members"
+                    return
+                count += 1
+                try:
+                    source = archive.extractfile(info)
+                    upload = _copy_member(source, info.name, max_member_size, max_total_bytes - total)
+                except ArchiveTotalSizeError as e:
+                    yield info.name, None, str(e)
+                    return
+                except ArchiveError as e:
+                    yield info.name, None, str(e)
+                    continue
+                except tarfile.TarError as e:
+                    yield info.name, None, f"Failed to extract member: {e}"
+                    continue
+                total += upload.size
+                yield info.name, upload, None
@@ -0,0 +1 @@
+"""Benchmark harness for the MarkItDown server."""
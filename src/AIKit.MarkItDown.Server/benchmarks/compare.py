@@ -0,0 +1,77 @@
+"""Compare two benchmark reports written by benchmarks.run.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Prints the change in p50/p95/p99 latency, throughput and peak RSS for every
+result present in both reports, and exits with status 1 if any p95 latency grew
+by more than the threshold percentage.
+"""
+
+import argparse
+import json
+from typing import Dict, List, Optional, Tuple
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb")
+
+
+def _key(result: Dict) -> Tuple:
+    return (result["mode"], result["format"], result["size"], result["concurrency"])
+
+
+def _change(old: float, new: float) -> Optional[float]:
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float) -> Tuple[List[str], bool]:
+    """Build the comparison table and detect p95 regressions.
+
+    Args:
+        baseline: The baseline report.
+        candidate: The report to compare against the baseline.
+        threshold: Allowed p95 latency growth in percent.
+
+    Returns:
+        Tuple of (table lines, regressed).
+    """
+    old_results = {_key(r): r for r in baseline["results"]}
+    lines = ["mode       format size       conc " + " ".join(f"{m:>22}" for m in METRICS)]
+    regressed = False
+    for result in candidate["results"]:
+        old = old_results.get(_key(result))
+        if old is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            change = _change(old[metric], result[metric])
+            cells.append(f"{old[metric]:>9} -> {result[metric]:<9}" + (f"{change:+.0f}%" if change is not None else ""))
+        p95_change = _change(old["p95_ms"], result["p95_ms"])
+        if p95_change is not None and p95_change > threshold:
+            regressed = True
+            cells.append("REGRESSION")
+        mode, fmt, size, concurrency = _key(result)
+        lines.append(f"{mode:<10} {fmt:<6} {size:<10} {concurrency:<4} " + " ".join(f"{c:>22}" for c in cells))
+    return lines, regressed
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p95 latency growth in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    lines, regressed = compare(baseline, candidate, args.threshold)
+    print(f"baseline {baseline['meta'].get('commit')} -> candidate {candidate['meta'].get('commit')}")
+    print("\n".join(lines))
+    raise SystemExit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Build benchmark corpora at several sizes from the TestShared fixture generators.
+
+Each generator in src/TestShared/scripts writes one small fixture (test.pdf,
+test.xlsx, ...). The base fixture is produced by running the generator in a temp
+directory, then scaled to each requested size by replicating its content. If a
+generator's dependencies are missing, the checked-in fixture from
+src/TestShared/files is used as the base instead.
+"""
+
+import copy
+import json
+import logging
+import os
+import re
+import runpy
+import shutil
+import tempfile
+import wave
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TEST_SHARED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "TestShared"))
+SCRIPTS_DIR = os.path.join(TEST_SHARED_DIR, "scripts")
+FILES_DIR = os.path.join(TEST_SHARED_DIR, "files")
+
+
+@dataclass
+class CorpusFile:
+    """One benchmark input."""
+    format: str
+    size: int
+    unit: str
+    path: str
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def bytes(self) -> int:
+        return os.path.getsize(self.path)
+
+
+def _scale_pdf(base: str, target: str, pages: int):
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(base)
+    writer = PdfWriter()
+    for index in range(pages):
+        writer.add_page(reader.pages[index % len(reader.pages)])
+    with open(target, "wb") as f:
+        writer.write(f)
+
+
+def _scale_xlsx(base: str, target: str, rows: int):
+    from openpyxl import Workbook, load_workbook
+
+    source = load_workbook(base, read_only=True)
+    # Write-only mode keeps memory flat for million-row sheets
+    workbook = Workbook(write_only=True)
+    for index, sheet in enumerate(source.worksheets):
+        values = [list(row) for row in sheet.iter_rows(values_only=True)]
+        out = workbook.create_sheet(sheet.title)
+        if not values:
+            continue
+        out.append(values[0])
+        data = values[1:] or [values[0]]
+        count = rows if index == 0 else len(data)
+        for row in range(count):
+            out.append(data[row % len(data)])
+    source.close()
+    workbook.save(target)
+
+
+def _scale_docx(base: str, target: str, copies: int):
+    _scale_zip_xml(base, target, "word/document.xml", r"(<w:body>)(.*?)(<w:sectPr)", copies)
+
+
+def _scale_zip_xml(base: str, target: str, member: str, pattern: str, copies: int):
+    """Repeat the part of an XML member matched by the middle group of pattern."""
+    with zipfile.ZipFile(base) as source, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as out:
+        for info in source.infolist():
+            data = source.read(info)
+            if info.filename == member:
+                text = data.decode("utf-8")
+                text = re.sub(pattern, lambda m: m.group(1) + m.group(2) * copies + m.group(3), text, count=1, flags=re.S)
+                data = text.encode("utf-8")
+            out.writestr(info, data)
+
+
+def _scale_pptx(base: str, target: str, slides: int):
+    from pptx import Presentation
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+    presentation = Presentation(base)
+    originals = list(presentation.slides)
+    for index in range(len(originals), slides):
+        source = originals[index % len(originals)]
+        slide = presentation.slides.add_slide(source.slide_layout)
+        for shape in list(slide.shapes):
+            shape._element.getparent().remove(shape._element)
+        for shape in source.shapes:
+            # Pictures and charts reference parts by relationship id; copying them would dangle
+            if shape.shape_type in (MSO_SHAPE_TYPE.PICTURE, MSO_SHAPE_TYPE.CHART):
+                continue
+            slide.shapes._spTree.insert_element_before(copy.deepcopy(shape._element), "p:extLst")
+    presentation.save(target)
+
+
+def _scale_html(base: str, target: str, copies: int):
+    with open(base, "r", encoding="utf-8") as f:
+        text = f.read()
+    text = re.sub(r"(<body[^>]*>)(.*)(</body>)", lambda m: m.group(1) + m.group(2) * copies + m.group(3), text, count=1, flags=re.S | re.I)
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _scale_ipynb(base: str, target: str, copies: int):
+    with open(base, "r", encoding="utf-8") as f:
+        notebook = json.load(f)
+    notebook["cells"] = notebook["cells"] * copies
+    with open(target, "w", encoding="utf-8") as f:
+        json.dump(notebook, f)
+
+
+def _scale_zip(base: str, target: str, copies: int):
+    with zipfile.ZipFile(base) as source, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as out:
+        for copy_index in range(copies):
+            for info in source.infolist():
+                if not info.is_dir():
+                    out.writestr(f"copy{copy_index}/{info.filename}", source.read(info))
+
+
+def _scale_jpg(base: str, target: str, factor: int):
+    from PIL import Image
+
+    with Image.open(base) as image:
+        image.resize((image.width * factor, image.height * factor)).save(target, quality=90)
+
+
+def _scale_wav(base: str, target: str, copies: int):
+    with wave.open(base, "rb") as source:
+        params = source.getparams()
+        frames = source.readframes(source.getnframes())
+    with wave.open(target, "wb") as out:
+        out.setparams(params)
+        for _ in range(copies):
+            out.writeframes(frames)
+
+
+@dataclass
+class FormatSpec:
+    """How to build and scale the corpus for one format."""
+    extension: str
+    unit: str
+    scale: Optional[Callable[[str, str, int], None]]
+    quick: List[int]
+    full: List[int]
+
+
+FORMATS: Dict[str, FormatSpec] = {
+    "pdf": FormatSpec("pdf", "pages", _scale_pdf, [1, 10], [1, 10, 100, 1000]),
+    "xlsx": FormatSpec("xlsx", "rows", _scale_xlsx, [10, 1000], [10, 1000, 100000, 1000000]),
+    "docx": FormatSpec("docx", "copies", _scale_docx, [1, 10], [1, 10, 100]),
+    "pptx": FormatSpec("pptx", "slides", _scale_pptx, [4, 40], [4, 40, 400]),
+    "html": FormatSpec("html", "copies", _scale_html, [1, 10], [1, 100, 1000]),
+    "ipynb": FormatSpec("ipynb", "copies", _scale_ipynb, [1], [1, 100]),
+    "epub": FormatSpec("epub", "copies", None, [1], [1]),
+    "zip": FormatSpec("zip", "copies", _scale_zip, [1], [1, 100]),
+    "jpg": FormatSpec("jpg", "scale", _scale_jpg, [1], [1, 4]),
+    "wav": FormatSpec("wav", "copies", _scale_wav, [1], [1, 12]),
+}
+
+# Checked-in fixtures whose names differ from the generator output
+CHECKED_IN_FIXTURES = {"wav": "testaudio_16000_test01_20s.wav"}
+
+
+def generate_base(fmt: str, work_dir: str) -> str:
+    """Produce the base fixture for a format.
+
+    Args:
+        fmt: The format name (e.g. "pdf").
+        work_dir: Directory to write the fixture into.
+
+    Returns:
+        Path to the base fixture.
+
+    Raises:
+        FileNotFoundError: If neither the generator nor a checked-in fixture is available.
+    """
+    spec = FORMATS[fmt]
+    target = os.path.join(work_dir, f"base.{spec.extension}")
+    if os.path.exists(target):
+        return target
+
+    script = os.path.join(SCRIPTS_DIR, f"generate_{fmt}.py")
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        try:
+            os.chdir(tmp)
+            runpy.run_path(script, run_name="__main__")
+            shutil.move(os.path.join(tmp, f"test.{spec.extension}"), target)
+            return target
+        except Exception as e:
+            logger.warning(f"Generator {os.path.basename(script)} failed ({e}); using checked-in fixture")
+        finally:
+            os.chdir(cwd)
+
+    fixture = os.path.join(FILES_DIR, CHECKED_IN_FIXTURES.get(fmt, f"test.{spec.extension}"))
+    if not os.path.exists(fixture):
+        raise FileNotFoundError(f"No generator output or fixture for {fmt}")
+    shutil.copyfile(fixture, target)
+    return target
+
+
+def build_corpus(formats: List[str], profile: str, corpus_dir: str, sizes: Optional[Dict[str, List[int]]] = None) -> List[CorpusFile]:
+    """Build (or reuse) the corpus files for the requested formats and sizes.
+
+    Files are written once as <format>-<size>.<ext> and reused by later runs, so a
+    corpus built for one commit can be benchmarked against another.
+
+    Args:
+        formats: Format names to include.
+        profile: "quick" or "full", selecting the default sizes.
+        corpus_dir: Directory holding the corpus.
+        sizes: Optional per-format size overrides.
+
+    Returns:
+        List of corpus files in format and size order.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = []
+    for fmt in formats:
+        spec = FORMATS[fmt]
+        base = generate_base(fmt, corpus_dir)
+        for size in (sizes or {}).get(fmt) or getattr(spec, profile):
+            target = os.path.join(corpus_dir, f"{fmt}-{size}.{spec.extension}")
+            if not os.path.exists(target):
+                logger.info(f"Building {os.path.basename(target)}")
+                if size == 1 or spec.scale is None:
+                    shutil.copyfile(base, target)
+                else:
+                    spec.scale(base, target, size)
+            corpus.append(CorpusFile(format=fmt, size=size, unit=spec.unit, path=target))
+    return corpus
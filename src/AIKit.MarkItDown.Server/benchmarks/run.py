@@ -0,0 +1,282 @@
+"""Benchmark /convert in-process and over a local uvicorn server.
+
+Run from src/AIKit.MarkItDown.Server:
+
+    python -m benchmarks.run --profile quick --output bench.json
+
+For every corpus file and concurrency level, reports p50/p95/p99 latency,
+throughput and the peak RSS of the server process tree as JSON with a stable
+layout, so results from two commits can be diffed or compared with
+benchmarks.compare.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import psutil
+
+from benchmarks.corpus import FORMATS, CorpusFile, build_corpus
+
+logger = logging.getLogger("benchmarks")
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_DIR = os.path.join(SERVER_DIR, "benchmarks", ".corpus")
+SERVER_STARTUP_TIMEOUT = 180
+
+
+class RssSampler:
+    """Samples the resident memory of a process and its children in a background thread."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _tree_rss(self) -> int:
+        try:
+            process = psutil.Process(self.pid)
+            total = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    continue
+            return total
+        except psutil.Error:
+            return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._tree_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._tree_rss()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+async def run_level(client: httpx.AsyncClient, item: CorpusFile, concurrency: int, requests: int, headers: Dict[str, str]) -> Dict:
+    """Send requests for one corpus file at a fixed concurrency and summarize them."""
+    with open(item.path, "rb") as f:
+        data = f.read()
+
+    async def convert() -> int:
+        response = await client.post("/convert", files={"file": (item.name, data)}, headers=headers)
+        await response.aread()
+        return response.status_code
+
+    # One untimed request warms the converter for this format
+    await convert()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await convert()
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+        "wall_s": round(wall, 3),
+    }
+
+
+async def run_suite(mode: str, client: httpx.AsyncClient, pid: int, corpus: List[CorpusFile], levels: List[int], requests: int, headers: Dict[str, str]) -> List[Dict]:
+    """Benchmark every corpus file at every concurrency level."""
+    results = []
+    for item in corpus:
+        for concurrency in levels:
+            count = requests or max(5, 2 * concurrency)
+            logger.info(f"[{mode}] {item.name} ({item.bytes} bytes) x{count} at concurrency {concurrency}")
+            with RssSampler(pid) as sampler:
+                summary = await run_level(client, item, concurrency, count, headers)
+            results.append({
+                "mode": mode,
+                "format": item.format,
+                "size": item.size,
+                "unit": item.unit,
+                "bytes": item.bytes,
+                "concurrency": concurrency,
+                **summary,
+                "peak_rss_mb": round(sampler.peak / (1024 * 1024), 1),
+            })
+    return results
+
+
+async def run_inprocess(corpus: List[CorpusFile], levels: List[int], requests: int, headers: Dict[str, str]) -> List[Dict]:
+    """Drive the app through an ASGI transport inside this process."""
+    if SERVER_DIR not in sys.path:
+        sys.path.insert(0, SERVER_DIR)
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            return await run_suite("inprocess", client, os.getpid(), corpus, levels, requests, headers)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(corpus: List[CorpusFile], levels: List[int], requests: int, headers: Dict[str, str]) -> List[Dict]:
+    """Start a local uvicorn server and drive it over HTTP."""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR,
+        env=os.environ.copy()
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+            deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not become healthy in time")
+                await asyncio.sleep(0.25)
+            return await run_suite("uvicorn", client, process.pid, corpus, levels, requests, headers)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_sizes(value: Optional[str]) -> Dict[str, List[int]]:
+    sizes = {}
+    for part in (value or "").split(";"):
+        if part.strip():
+            fmt, _, numbers = part.partition("=")
+            sizes[fmt.strip()] = [int(n) for n in numbers.split(",") if n.strip()]
+    return sizes
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the MarkItDown server over the TestShared corpus.")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "both"], default="both")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Comma-separated formats (default: all)")
+    parser.add_argument("--profile", choices=["quick", "full"], default="quick", help="Corpus sizes to build")
+    parser.add_argument("--sizes", help='Per-format size overrides, e.g. "pdf=1,100;xlsx=10,1000000"')
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=0, help="Requests per level (default: max(5, 2 x concurrency))")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--keep-cache", action="store_true", help="Leave the result cache enabled")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+
+    if not args.keep_cache:
+        # Every request must reach a converter; repeated uploads would otherwise be cache hits
+        os.environ["CACHE_MAX_BYTES"] = "0"
+        os.environ["CACHE_DIR"] = ""
+    headers = {"x-api-key": os.environ["API_KEY"]} if os.environ.get("API_KEY") else {}
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        raise SystemExit(f"Unknown formats: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    corpus = build_corpus(formats, args.profile, args.corpus_dir, _parse_sizes(args.sizes))
+
+    results = []
+    if args.mode in ("inprocess", "both"):
+        results += asyncio.run(run_inprocess(corpus, levels, args.requests, headers))
+    if args.mode in ("uvicorn", "both"):
+        results += asyncio.run(run_uvicorn(corpus, levels, args.requests, headers))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "conversion_workers": os.environ.get("CONVERSION_WORKERS"),
+            "profile": args.profile,
+            "cache": args.keep_cache,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        logger.info(f"Wrote {len(results)} results to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Content-addressed cache for conversion results with an in-memory LRU and optional disk tier."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from models import MarkDownConfig
+from executor import ConversionOutput
+from selection import DocumentSelection
+from tabular import tabular_file, tabular_settings
+from transcription import segmented_audio, transcription_settings
+from config import CACHE_MAX_BYTES, CACHE_DIR, CACHE_DISK_MAX_BYTES
+from constants import VERSION
+
+logger = logging.getLogger(__name__)
+
+# Config fields that hold credentials; only their presence is part of the cache key
+SECRET_FIELDS = ("llm_api_key", "docintel_key")
+
+
+def cache_key(content_hash: str, file_extension: Optional[str], config: Optional[MarkDownConfig], options: Optional[Dict[str, Any]] = None, selection: Optional[DocumentSelection] = None) -> str:
+    """Build the cache key for a conversion.
+
+    The key covers the content hash, the file extension and the conversion-relevant
+    config fields. Secrets are never hashed into the key; only whether they are set.
+
+    Args:
+        content_hash: Hex digest of the uploaded bytes.
+        file_extension: The file extension used for the conversion.
+        config: The effective MarkDownConfig.
+        options: Extra converter options for the conversion.
+        selection: The part of the document converted, if not all of it.
+
+    Returns:
+        str: Hex digest identifying the conversion result.
+    """
+    fields = config.model_dump(exclude=set(SECRET_FIELDS)) if config else {}
+    if config:
+        for name in SECRET_FIELDS:
+            fields[name] = bool(getattr(config, name))
+
+    payload = {
+        "version": VERSION,
+        "content": content_hash,
+        "extension": (file_extension or "").lower(),
+        "config": fields,
+        "options": options or {}
+    }
+    if selection is not None:
+        payload["selection"] = selection.cache_fields()
+    if segmented_audio(file_extension):
+        payload["transcription"] = transcription_settings()
+    if tabular_file(file_extension):
+        payload["tabular"] = tabular_settings()
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check whether an If-None-Match header matches an ETag.
+
+    Args:
+        if_none_match: The raw If-None-Match header value.
+        etag: The quoted ETag of the current representation.
+
+    Returns:
+        bool: True if the client already has this representation.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def _entry_size(output: ConversionOutput) -> int:
+    return len(output.text_content.encode("utf-8")) + len((output.title or "").encode("utf-8"))
+
+
+class ResultCache:
+    """Thread-safe conversion result cache.
+
+    Results are kept in an in-memory LRU bounded by bytes. When a directory is
+    configured, results are also written to disk so they survive restarts; the disk
+    tier is pruned oldest-first once it exceeds its byte budget.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, ConversionOutput]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_size: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or bool(self.disk_dir)
+
+    def get(self, key: str) -> Optional[ConversionOutput]:
+        """Look up a result, promoting disk hits into memory.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            ConversionOutput or None if the key is not cached.
+        """
+        with self._lock:
+            output = self._entries.get(key)
+            if output is not None:
+                self._entries.move_to_end(key)
+                return output
+
+        output = self._read_disk(key)
+        if output is not None:
+            self._put_memory(key, output)
+        return output
+
+    def put(self, key: str, output: ConversionOutput):
+        """Store a result in memory and, if configured, on disk.
+
+        Args:
+            key: The cache key.
+            output: The conversion result.
+        """
+        self._put_memory(key, output)
+        self._write_disk(key, output)
+
+    def _put_memory(self, key: str, output: ConversionOutput):
+        size = _entry_size(output)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= _entry_size(previous)
+            self._entries[key] = output
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= _entry_size(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[ConversionOutput]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+        return ConversionOutput(text_content=data["text_content"], title=data.get("title"))
+
+    def _write_disk(self, key: str, output: ConversionOutput):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"text_content": output.text_content, "title": output.title}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+            return
+        self._prune_disk(os.path.getsize(path))
+
+    def _prune_disk(self, added: int):
+        """Delete the least recently used disk entries once the disk budget is exceeded."""
+        if self.disk_max_bytes <= 0:
+            return
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sum(os.path.getsize(p) for p, _ in self._scan_disk())
+            else:
+                self._disk_size += added
+            if self._disk_size <= self.disk_max_bytes:
+                return
+
+            for path, _ in sorted(self._scan_disk(), key=lambda entry: entry[1]):
+                if self._disk_size <= self.disk_max_bytes:
+                    break
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    self._disk_size -= size
+                except OSError:
+                    continue
+
+    def _scan_disk(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.path.getmtime(path)
+                    except OSError:
+                        continue
+
+
+# Global result cache
+result_cache = ResultCache(max_bytes=CACHE_MAX_BYTES, disk_dir=CACHE_DIR, disk_max_bytes=CACHE_DISK_MAX_BYTES)
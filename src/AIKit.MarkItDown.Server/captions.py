@@ -0,0 +1,328 @@
+"""Memoized, parallel LLM image descriptions shared by all conversions in a process."""
+
+import base64
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import CAPTION_CACHE_MAX_ENTRIES, CAPTION_CACHE_PATH, LLM_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# MarkItDown's prompt when llm_prompt is not set; part of the key of cached descriptions
+DEFAULT_CAPTION_PROMPT = "Write a detailed caption for this image."
+
+
+def caption_key(image: bytes, model: str, prompt: Optional[str]) -> str:
+    """Build the cache key of an image description.
+
+    Args:
+        image: The image bytes.
+        model: The LLM model.
+        prompt: The prompt; a blank prompt stands for MarkItDown's default.
+
+    Returns:
+        str: Hex digest of the image content hash, model and prompt.
+    """
+    if prompt is None or not prompt.strip():
+        prompt = DEFAULT_CAPTION_PROMPT
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(image).digest())
+    digest.update(model.encode("utf-8") + b"\0" + prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CaptionCache:
+    """Thread-safe LRU of image descriptions with an optional SQLite tier.
+
+    The SQLite database is shared by every worker process and survives restarts; it
+    is pruned to max_entries, least recently used first. Descriptions being produced
+    are tracked so that concurrent requests for the same image wait for a single LLM
+    call instead of making their own.
+    """
+
+    def __init__(self, max_entries: int, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a description, promoting database hits into memory."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            description = self._entries.get(key)
+            if description is not None:
+                self._entries.move_to_end(key)
+                return description
+
+        description = self._read_db(key)
+        if description is not None:
+            self._put_memory(key, description)
+        return description
+
+    def put(self, key: str, description: str):
+        """Store a description in memory and, if configured, in the database."""
+        if not self.enabled:
+            return
+        self._put_memory(key, description)
+        self._write_db(key, description)
+
+    def describe(self, key: str, call: Callable[[], Optional[str]]) -> Optional[str]:
+        """Return the cached description for key, or produce it with call.
+
+        If the description is already being produced, waits for it instead.
+
+        Args:
+            key: The caption key.
+            call: Makes the LLM call and returns the description.
+
+        Returns:
+            The description, or None if the LLM returned none.
+        """
+        description = self.get(key)
+        if description is not None:
+            return description
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result()
+        return self._produce(key, future, call)
+
+    def schedule(self, key: str, call: Callable[[], Optional[str]], executor: ThreadPoolExecutor):
+        """Produce the description for key on executor unless it is cached or already pending.
+
+        Conversions reaching the image before the call finishes wait for its result.
+        """
+        if self.get(key) is not None:
+            return
+        future, owner = self._claim(key)
+        if not owner:
+            return
+        task = executor.submit(self._produce, key, future, call)
+        task.add_done_callback(lambda t: t.cancelled() and self._abandon(key, future))
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future, False
+            future = self._pending[key] = Future()
+            return future, True
+
+    def _produce(self, key: str, future: Future, call: Callable[[], Optional[str]]) -> Optional[str]:
+        try:
+            description = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            if description:
+                self.put(key, description)
+            future.set_result(description)
+            return description
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _abandon(self, key: str, future: Future):
+        with self._lock:
+            self._pending.pop(key, None)
+        if not future.done():
+            future.set_exception(RuntimeError("Image description was cancelled"))
+
+    def _put_memory(self, key: str, description: str):
+        with self._lock:
+            self._entries[key] = description
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Opened on first use, so every worker process gets its own connection
+        if not self.path:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS captions (key TEXT PRIMARY KEY, description TEXT NOT NULL, used_at REAL NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS captions_used_at ON captions (used_at)")
+            self._conn = conn
+        return self._conn
+
+    def _read_db(self, key: str) -> Optional[str]:
+        try:
+            with self._db_lock:
+                conn = self._connection()
+                if conn is None:
+                    return None
+                with conn:
+                    row = conn.execute("SELECT description FROM captions WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        conn.execute("UPDATE captions SET used_at = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read image description cache: {e}")
+            return None
+        return row[0] if row is not None else None
+
+    def _write_db(self, key: str, description: str):
+        try:
+            with self._db_lock:
+                conn = self._connection()
+                if conn is None:
+                    return
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO captions (key, description, used_at) VALUES (?, ?, ?)", (key, description, time.time()))
+                    conn.execute(
+                        "DELETE FROM captions WHERE used_at < (SELECT used_at FROM captions ORDER BY used_at DESC LIMIT 1 OFFSET ?)",
+                        (self.max_entries - 1,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to write image description cache: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# Per-process image description cache
+caption_cache = CaptionCache(max_entries=CAPTION_CACHE_MAX_ENTRIES, path=CAPTION_CACHE_PATH)
+
+
+def _image_request(messages: List[Dict[str, Any]]) -> Optional[Tuple[str, bytes]]:
+    """Extract (prompt, image bytes) from a single-image caption request, as sent by MarkItDown."""
+    if len(messages) != 1 or not isinstance(messages[0].get("content"), list):
+        return None
+    prompt = image = None
+    for part in messages[0]["content"]:
+        if part.get("type") == "text":
+            prompt = part.get("text")
+        elif part.get("type") == "image_url":
+            url = (part.get("image_url") or {}).get("url", "")
+            header, _, data = url.partition(",")
+            if not header.startswith("data:") or not header.endswith(";base64"):
+                return None
+            try:
+                image = base64.b64decode(data)
+            except ValueError:
+                return None
+    if prompt is None or image is None:
+        return None
+    return prompt, image
+
+
+def _response(description: Optional[str]) -> Any:
+    """Wrap a description in the shape of a chat completion response."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=description))])
+
+
+class CaptioningClient:
+    """OpenAI-compatible client wrapper that memoizes image descriptions.
+
+    MarkItDown describes images through client.chat.completions.create; single-image
+    requests are answered from the caption cache, other requests go to the wrapped
+    client unchanged.
+    """
+
+    def __init__(self, client: Any, cache: CaptionCache = caption_cache):
+        self.client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        request = _image_request(messages) if not kwargs else None
+        if request is None:
+            return self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        prompt, image = request
+        key = caption_key(image, model, prompt)
+        return _response(self.cache.describe(key, lambda: self._call(model, messages)))
+
+    def _call(self, model: str, messages: List[Dict[str, Any]]) -> Optional[str]:
+        response = self.client.chat.completions.create(model=model, messages=messages)
+        return response.choices[0].message.content
+
+    def schedule(self, image: bytes, content_type: Optional[str], model: str, prompt: Optional[str], executor: ThreadPoolExecutor):
+        """Describe an image on executor ahead of the conversion reaching it.
+
+        Args:
+            image: The image bytes.
+            content_type: The image MIME type.
+            model: The LLM model.
+            prompt: The prompt; a blank prompt stands for MarkItDown's default.
+            executor: The executor bounding concurrent LLM calls.
+        """
+        if prompt is None or not prompt.strip():
+            prompt = DEFAULT_CAPTION_PROMPT
+        data_uri = f"data:{content_type or 'application/octet-stream'};base64,{base64.b64encode(image).decode('utf-8')}"
+        messages = [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": data_uri}}
+            ]
+        }]
+        self.cache.schedule(caption_key(image, model, prompt), lambda: self._call(model, messages), executor)
+
+
+@contextmanager
+def prefetch_captions(file_stream: BinaryIO, file_extension: Optional[str], kwargs: Dict[str, Any], selection=None) -> Iterator[None]:
+    """Describe the images of a document in parallel while it is being converted.
+
+    MarkItDown describes images one after another as it reaches them. For formats
+    with many images, their descriptions are requested up front on a pool of
+    LLM_CONCURRENCY threads; the conversion then picks each one up from the cache, or
+    waits for it if it is still being produced. Calls still running when the block
+    exits complete in the background and are cached; queued ones are dropped.
+
+    Args:
+        file_stream: The document, rewound to its start on exit from the scan.
+        file_extension: The file extension of the document.
+        kwargs: The conversion kwargs holding llm_client, llm_model and llm_prompt.
+        selection: The part of the document being converted.
+    """
+    client = kwargs.get("llm_client")
+    model = kwargs.get("llm_model")
+    extension = (file_extension or "").lower().lstrip(".")
+    if not isinstance(client, CaptioningClient) or not model or extension != "pptx" or LLM_CONCURRENCY < 1 or not caption_cache.enabled:
+        yield
+        return
+
+    from segments import iter_pptx_images
+
+    position = file_stream.tell()
+    try:
+        images = {hashlib.sha256(blob).digest(): (blob, content_type) for blob, content_type in iter_pptx_images(file_stream, selection)}
+    except Exception as e:
+        logger.warning(f"Failed to scan images for description: {str(e)}")
+        images = {}
+    finally:
+        file_stream.seek(position)
+
+    if not images:
+        yield
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(LLM_CONCURRENCY, len(images)), thread_name_prefix="caption")
+    try:
+        for blob, content_type in images.values():
+            client.schedule(blob, content_type, model, kwargs.get("llm_prompt"), executor)
+        yield
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,259 @@
+"""Splitting converted Markdown into heading- and size-bounded chunks for retrieval pipelines."""
+
+import math
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from executor import Segment
+from config import CHUNK_TOKENS, CHUNK_OVERLAP
+
+# Rough characters-per-token ratio used for token estimates
+CHARS_PER_TOKEN = 4
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_SLIDE_MARKER = re.compile(r"<!-- Slide number: (\d+) -->")
+_SHEET_HEADING = re.compile(r"^## (.+)$", re.M)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of tokens in a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def chunk_settings(chunk_tokens: Optional[int] = None, chunk_overlap: Optional[int] = None) -> Tuple[int, int]:
+    """Resolve the chunk size and overlap of a request against the configured defaults.
+
+    Args:
+        chunk_tokens: Requested approximate tokens per chunk.
+        chunk_overlap: Requested approximate tokens shared by consecutive chunks.
+
+    Returns:
+        Tuple of (chunk_tokens, chunk_overlap).
+
+    Raises:
+        ValueError: If the size is not positive or the overlap is not smaller than the size.
+    """
+    tokens = CHUNK_TOKENS if chunk_tokens is None else chunk_tokens
+    overlap = min(CHUNK_OVERLAP, tokens - 1) if chunk_overlap is None else chunk_overlap
+    if tokens < 1:
+        raise ValueError("'chunk_tokens' must be a positive number")
+    if overlap < 0 or overlap >= tokens:
+        raise ValueError("'chunk_overlap' must be at least 0 and smaller than 'chunk_tokens'")
+    return tokens, overlap
+
+
+def split_origins(markdown: str, file_extension: Optional[str]) -> List[Tuple[Segment, int]]:
+    """Recover the pages, slides or sheets of a whole-document conversion.
+
+    MarkItDown separates PDF pages with form feeds, marks every PowerPoint slide with
+    a "Slide number" comment and starts every Excel sheet with a "## <name>" heading.
+
+    Args:
+        markdown: The Markdown of the whole document.
+        file_extension: The file extension of the source document.
+
+    Returns:
+        List of (segment, offset of the segment in markdown) in document order.
+    """
+    extension = (file_extension or "").lower().lstrip(".")
+    if extension == "pdf" and "\f" in markdown:
+        segments, offset = [], 0
+        for index, page in enumerate(markdown.split("\f"), start=1):
+            segments.append((Segment(kind="page", index=index, markdown=page), offset))
+            offset += len(page) + 1
+        return segments
+
+    if extension == "pptx":
+        matches = list(_SLIDE_MARKER.finditer(markdown))
+        if matches:
+            return [
+                (Segment(kind="slide", index=int(match.group(1)), markdown=markdown[match.start():matches[i + 1].start() if i + 1 < len(matches) else len(markdown)]), match.start())
+                for i, match in enumerate(matches)
+            ]
+
+    if extension in ("xlsx", "xls"):
+        matches = list(_SHEET_HEADING.finditer(markdown))
+        if matches:
+            return [
+                (Segment(kind="sheet", index=i + 1, label=match.group(1), markdown=markdown[match.start():matches[i + 1].start() if i + 1 < len(matches) else len(markdown)]), match.start())
+                for i, match in enumerate(matches)
+            ]
+
+    return [(Segment(kind="document", index=1, markdown=markdown), 0)]
+
+
+def _blocks(markdown: str) -> Iterator[Tuple[int, int, Optional[Tuple[int, str]]]]:
+    """Split Markdown into blocks separated by blank lines.
+
+    Headings are blocks of their own. Fenced code blocks are never split and their
+    lines are never taken for headings.
+
+    Yields:
+        (start, end, heading) where heading is (level, title) for heading blocks.
+    """
+    start = None
+    end = 0
+    in_fence = False
+    position = 0
+    for line in markdown.splitlines(keepends=True):
+        line_start, position = position, position + len(line)
+        stripped = line.strip()
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else _HEADING.match(stripped)
+        if heading:
+            if start is not None:
+                yield start, end, None
+                start = None
+            yield line_start, line_start + len(line.rstrip()), (len(heading.group(1)), heading.group(2))
+            continue
+        if not stripped and not in_fence:
+            if start is not None:
+                yield start, end, None
+                start = None
+            continue
+        if start is None:
+            start = line_start
+        end = line_start + len(line.rstrip())
+    if start is not None:
+        yield start, end, None
+
+
+class MarkdownChunker:
+    """Turns converted segments into chunks with heading paths, origins and offsets.
+
+    Chunks end at headings and before they would exceed max_tokens; a block larger
+    than that is split on whitespace. Consecutive chunks of one section share about
+    overlap_tokens of text. Chunks never span two pages, slides or sheets, while the
+    heading path carries over from one segment to the next.
+
+    Offsets are character positions in the whole Markdown document, i.e. the
+    segments joined by blank lines as in a streamed Markdown response.
+    """
+
+    def __init__(self, max_tokens: int, overlap_tokens: int, file_extension: Optional[str] = None):
+        self.max_chars = max_tokens * CHARS_PER_TOKEN
+        self.overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+        self.file_extension = file_extension
+        self.count = 0
+        self._headings: List[Tuple[int, str]] = []
+        self._offset = 0
+        self._started = False
+
+    def add(self, segment: Segment) -> List[Dict[str, Any]]:
+        """Chunk the next segment of the document.
+
+        A "document" segment is first split into the pages, slides or sheets it holds.
+
+        Args:
+            segment: The next segment, in document order.
+
+        Returns:
+            The chunks of the segment.
+        """
+        if not segment.markdown:
+            return []
+        if self._started:
+            self._offset += 2
+        base = self._offset
+        self._started = True
+        self._offset += len(segment.markdown)
+
+        parts = split_origins(segment.markdown, self.file_extension) if segment.kind == "document" else [(segment, 0)]
+        chunks = []
+        for part, offset in parts:
+            chunks.extend(self._chunk(part, base + offset))
+        return chunks
+
+    def _chunk(self, segment: Segment, base: int) -> List[Dict[str, Any]]:
+        markdown = segment.markdown
+        origin = {"kind": segment.kind, "index": segment.index, "label": segment.label}
+        chunks = []
+        start = end = None
+        heading_only = False
+        path = self._heading_path()
+
+        def emit(chunk_start: int, chunk_end: int):
+            text = markdown[chunk_start:chunk_end]
+            chunks.append({
+                "index": self.count,
+                "text": text,
+                "heading_path": path,
+                "origin": origin,
+                "start": base + chunk_start,
+                "end": base + chunk_end,
+                "tokens": estimate_tokens(text)
+            })
+            self.count += 1
+
+        for block_start, block_end, heading in _blocks(markdown):
+            if heading is not None:
+                if start is not None:
+                    emit(start, end)
+                level, title = heading
+                self._headings = [h for h in self._headings if h[0] < level] + [heading]
+                path = self._heading_path()
+                start, end = block_start, block_end
+                heading_only = True
+                continue
+
+            if start is not None and (heading_only or block_end - start <= self.max_chars):
+                # A heading always stays with the block that follows it
+                end = block_end
+                heading_only = False
+                if block_end - start <= self.max_chars:
+                    continue
+            elif start is not None:
+                emit(start, end)
+                start = self._overlap_start(markdown, start, end)
+            else:
+                start = block_start
+            # Blocks too large for one chunk are cut on whitespace, keeping the overlap
+            while block_end - start > self.max_chars:
+                cut = self._cut(markdown, start, start + self.max_chars)
+                emit(start, cut)
+                start = self._overlap_start(markdown, start, cut)
+            end = block_end
+
+        if start is not None:
+            emit(start, end)
+        return chunks
+
+    def _heading_path(self) -> List[str]:
+        return [title for _, title in self._headings]
+
+    def _overlap_start(self, markdown: str, start: int, end: int) -> int:
+        """Where the chunk after [start, end) begins, so it repeats the end of it."""
+        if self.overlap_chars <= 0:
+            return end
+        position = max(end - self.overlap_chars, start + 1)
+        space = markdown.find(" ", position, end)
+        newline = markdown.find("\n", position, end)
+        breaks = [p for p in (space, newline) if p != -1]
+        position = min(breaks) + 1 if breaks else end
+        while position < end and markdown[position].isspace():
+            position += 1
+        return position
+
+    @staticmethod
+    def _cut(markdown: str, start: int, limit: int) -> int:
+        """The last whitespace position before limit, or limit if there is none."""
+        cut = max(markdown.rfind(" ", start + 1, limit), markdown.rfind("\n", start + 1, limit))
+        return cut if cut > start else limit
+
+
+def chunk_document(markdown: str, file_extension: Optional[str], max_tokens: int, overlap_tokens: int) -> List[Dict[str, Any]]:
+    """Chunk a whole converted document.
+
+    Args:
+        markdown: The converted Markdown.
+        file_extension: The file extension of the source, used to recover pages, slides and sheets.
+        max_tokens: Approximate maximum tokens per chunk.
+        overlap_tokens: Approximate tokens shared by consecutive chunks.
+
+    Returns:
+        The chunks, in document order.
+    """
+    chunker = MarkdownChunker(max_tokens, overlap_tokens, file_extension)
+    return chunker.add(Segment(kind="document", index=1, markdown=markdown))
@@ -0,0 +1,167 @@
+"""Registry of long-lived LLM and Document Intelligence clients shared across requests."""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Hashable, List, Optional
+
+from config import CLIENT_POOL_MAX_SIZE, CLIENT_IDLE_TIMEOUT
+
+if TYPE_CHECKING:
+    import openai
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+
+logger = logging.getLogger(__name__)
+
+
+def credential_fingerprint(secret: Optional[str]) -> Optional[str]:
+    """Fingerprint a credential so it can be used in a key without being stored in clear.
+
+    Args:
+        secret: The credential value.
+
+    Returns:
+        A short hex digest, or None if no credential is set.
+    """
+    if not secret:
+        return None
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+class ClientRegistry:
+    """Thread-safe LRU registry of SDK clients.
+
+    Clients keep their HTTP connection pools and TLS sessions alive between requests.
+    Entries idle for longer than idle_timeout are dropped, and the least recently used
+    entry is dropped once the registry holds max_size clients. Dropped clients are
+    closed, releasing their connection pools; holders reach clients through a
+    PooledClient, which looks them up on every use, so a dropped client is rebuilt
+    rather than used after it was closed.
+    """
+
+    def __init__(self, max_size: int, idle_timeout: float):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clients: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Get the client for key, building it with factory if needed.
+
+        Args:
+            key: Hashable key identifying the client (kind, fingerprint, endpoint, model).
+            factory: Callable that builds a new client.
+
+        Returns:
+            The cached or newly built client.
+        """
+        now = time.monotonic()
+        with self._lock:
+            dropped = self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._clients.move_to_end(key)
+        self._close(dropped)
+        if entry is not None:
+            return entry[0]
+
+        # Build outside the lock; if two threads race, the first one stored wins
+        client = factory()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                dropped = [client]
+                client = entry[0]
+            else:
+                self._clients[key] = [client, now]
+                while len(self._clients) > self.max_size:
+                    dropped.append(self._clients.popitem(last=False)[1][0])
+        self._close(dropped)
+        return client
+
+    def _evict_idle(self, now: float) -> List[Any]:
+        expired = [key for key, (_, last_used) in self._clients.items() if now - last_used > self.idle_timeout]
+        if expired:
+            logger.info(f"Evicted {len(expired)} idle clients")
+        return [self._clients.pop(key)[0] for key in expired]
+
+    def _close(self, clients: List[Any]):
+        # Closed outside the lock, since closing may wait for connections to shut down
+        for client in clients:
+            close = getattr(client, "close", None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Failed to close evicted client: {str(e)}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+class PooledClient:
+    """Handle on a registry client that resolves it from the registry on every use.
+
+    Holders such as pooled MarkItDown instances outlive registry entries. Going
+    through the registry on each attribute access keeps the entry's idle time current
+    and transparently rebuilds a client that was evicted and closed meanwhile.
+    """
+
+    def __init__(self, registry: ClientRegistry, key: Hashable, factory: Callable[[], Any]):
+        self._registry = registry
+        self._key = key
+        self._factory = factory
+
+    @property
+    def client(self) -> Any:
+        """The current client for this handle's key."""
+        return self._registry.get(self._key, self._factory)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+def get_openai_client(api_key: str, model: Optional[str] = None) -> PooledClient:
+    """Get a pooled OpenAI client for the given credential and model.
+
+    Args:
+        api_key: The OpenAI API key.
+        model: The model the client will be used with.
+
+    Returns:
+        PooledClient: A handle on a long-lived openai.OpenAI client.
+    """
+    def build() -> "openai.OpenAI":
+        import openai
+        return openai.OpenAI(api_key=api_key)
+
+    key = ("openai", credential_fingerprint(api_key), model)
+    return PooledClient(client_registry, key, build)
+
+
+def get_docintel_client(endpoint: str, api_key: str) -> PooledClient:
+    """Get a pooled Azure Document Intelligence client for the given endpoint and key.
+
+    Args:
+        endpoint: The Document Intelligence endpoint.
+        api_key: The Document Intelligence key.
+
+    Returns:
+        PooledClient: A handle on a long-lived DocumentIntelligenceClient.
+    """
+    def build() -> "DocumentIntelligenceClient":
+        from azure.ai.documentintelligence import DocumentIntelligenceClient
+        from azure.core.credentials import AzureKeyCredential
+        return DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(api_key))
+
+    key = ("docintel", credential_fingerprint(api_key), endpoint)
+    return PooledClient(client_registry, key, build)
+
+
+# Global client registry (one per process)
+client_registry = ClientRegistry(max_size=CLIENT_POOL_MAX_SIZE, idle_timeout=CLIENT_IDLE_TIMEOUT)
@@ -0,0 +1,225 @@
+"""Response compression negotiated from Accept-Encoding, applied while the response streams."""
+
+import logging
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Compression levels tuned for streaming: fast enough to keep up with conversion output
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 4
+
+# Body chunks larger than this are compressed in a thread instead of on the event loop
+THREADED_CHUNK_SIZE = 256 * 1024
+
+# Media types worth compressing; everything the conversion routes return is text-like
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/msgpack", "application/xml")
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def available_encodings() -> Dict[str, type]:
+    """The content codings this process can produce, most preferred first."""
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = _ZstdEncoder
+    if brotli is not None:
+        encoders["br"] = _BrotliEncoder
+    encoders["gzip"] = _GzipEncoder
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: Optional[str], encodings: List[str]) -> Optional[str]:
+    """Pick the content coding for a response.
+
+    Args:
+        accept_encoding: The Accept-Encoding header.
+        encodings: The codings the server may use, in order of preference.
+
+    Returns:
+        The coding with the highest q-value accepted by the client, ties broken by
+        server preference, or None to send the response uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses responses with gzip, zstd or brotli.
+
+    The coding is negotiated from Accept-Encoding among those enabled and installed
+    (zstd and brotli need the zstandard and brotli packages). Streaming responses are
+    compressed chunk by chunk and flushed, so clients still receive output as it is
+    produced. Complete bodies smaller than minimum_size are sent as they are. ETags
+    of compressed responses are made weak, as the bytes differ per coding.
+    """
+
+    def __init__(self, app, encodings: List[str], minimum_size: int = 1024):
+        self.app = app
+        available = available_encodings()
+        self.encoders = {name: available[name] for name in encodings if name in available}
+        missing = [name for name in encodings if name not in available]
+        if missing:
+            logger.info(f"Response compression without {', '.join(missing)}: package not installed")
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encoders:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = None
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = negotiate_encoding(accept_encoding, list(self.encoders))
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = dict((k.lower(), v) for k, v in message.get("headers", []))
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                compressible = message["status"] not in (204, 304) and content_type.startswith(COMPRESSIBLE_TYPES)
+                if compressible:
+                    _add_header(message, b"vary", b"Accept-Encoding")
+                passthrough = not compressible or encoding is None or b"content-encoding" in headers
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                encoder = self.encoders[encoding]()
+                _start_compressed(start_message, encoding)
+                if not more_body:
+                    compressed = await _run(encoder.compress, body) + encoder.finish()
+                    _set_header(start_message, b"content-length", str(len(compressed)).encode("ascii"))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send(start_message)
+
+            compressed = await _run(encoder.compress, body) if body else b""
+            if not more_body:
+                compressed += encoder.finish()
+            if compressed or not more_body:
+                await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+
+async def _run(function, data: bytes) -> bytes:
+    if len(data) > THREADED_CHUNK_SIZE:
+        return await run_in_threadpool(function, data)
+    return function(data)
+
+
+def _add_header(message, name: bytes, value: bytes):
+    headers: List[Tuple[bytes, bytes]] = list(message.get("headers", []))
+    for index, (key, existing) in enumerate(headers):
+        if key.lower() == name:
+            if value.lower() not in existing.lower():
+                headers[index] = (key, existing + b", " + value)
+            message["headers"] = headers
+            return
+    headers.append((name, value))
+    message["headers"] = headers
+
+
+def _set_header(message, name: bytes, value: Optional[bytes]):
+    headers = [(key, existing) for key, existing in message.get("headers", []) if key.lower() != name]
+    if value is not None:
+        headers.append((name, value))
+    message["headers"] = headers
+
+
+def _start_compressed(message, encoding: str):
+    """Rewrite the response headers for a compressed body."""
+    _set_header(message, b"content-length", None)
+    _set_header(message, b"content-encoding", encoding.encode("ascii"))
+    for key, value in message.get("headers", []):
+        if key.lower() == b"etag" and not value.startswith(b"W/"):
+            _set_header(message, b"etag", b"W/" + value)
+            break
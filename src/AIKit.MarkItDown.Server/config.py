@@ -3,13 +3,141 @@
 import os
 from dotenv import load_dotenv
 from models import MarkDownConfig
+from constants import MAX_FILE_SIZE
 
 # Load environment variables from .env file if it exists
 load_dotenv()
 
+# Directory of the application; relative data paths are resolved against it, not the working directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Optional API key for authentication
 API_KEY = os.getenv("API_KEY")
 
+# Conversion worker pool settings (0 workers runs conversions in a thread inside the server process)
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", str(os.cpu_count() or 1)))
+CONVERSION_TIMEOUT = float(os.getenv("CONVERSION_TIMEOUT", "300"))
+CONVERSION_MAX_JOBS_PER_WORKER = int(os.getenv("CONVERSION_MAX_JOBS_PER_WORKER", "100"))
+CONVERSION_START_METHOD = os.getenv("CONVERSION_START_METHOD", "spawn")
+
+# Preload-and-fork launcher (serve.py): server worker processes, listen address, per-worker private memory ceiling in MB (0 disables), heartbeat and graceful shutdown timeouts
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_MAX_MEMORY_MB = int(os.getenv("SERVER_MAX_MEMORY_MB", "0"))
+SERVER_HEARTBEAT_TIMEOUT = float(os.getenv("SERVER_HEARTBEAT_TIMEOUT", "30"))
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+
+# Startup: "eager" loads converters before the port opens, "background" loads them after it opens, "lazy" on first use
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background").lower()
+# Formats (file extensions) whose converters must be warm before /ready reports ready
+READY_FORMATS = [f.strip().lower().lstrip(".") for f in os.getenv("READY_FORMATS", "").split(",") if f.strip()]
+
+# Uploads larger than this many bytes are spooled to a temp file instead of memory
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+
+# Batch conversion limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(max(CONVERSION_WORKERS, 1) * 2)))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+BATCH_MAX_ARCHIVE_BYTES = int(os.getenv("BATCH_MAX_ARCHIVE_BYTES", str(1024 * 1024 * 1024)))
+
+# Batch URI conversion: URIs per request, URIs fetched or awaiting conversion at once, and fetches per host
+BATCH_MAX_URIS = int(os.getenv("BATCH_MAX_URIS", "1000"))
+BATCH_URI_CONCURRENCY = int(os.getenv("BATCH_URI_CONCURRENCY", "32"))
+FETCH_PER_HOST_CONNECTIONS = int(os.getenv("FETCH_PER_HOST_CONNECTIONS", "4"))
+
+# Pooled LLM / Document Intelligence clients
+CLIENT_POOL_MAX_SIZE = int(os.getenv("CLIENT_POOL_MAX_SIZE", "32"))
+CLIENT_IDLE_TIMEOUT = float(os.getenv("CLIENT_IDLE_TIMEOUT", "600"))
+
+# Pre-built MarkItDown instances kept per worker process, keyed by effective config
+MARKITDOWN_POOL_SIZE = int(os.getenv("MARKITDOWN_POOL_SIZE", "8"))
+
+# Memoized LLM image descriptions (optionally persisted to SQLite) and parallel description calls per conversion
+CAPTION_CACHE_MAX_ENTRIES = int(os.getenv("CAPTION_CACHE_MAX_ENTRIES", "10000"))
+CAPTION_CACHE_PATH = os.getenv("CAPTION_CACHE_PATH") or None
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+
+# Managed Document Intelligence calls: concurrency, retries with backoff, polling and PDF page batching
+DOCINTEL_MANAGED = os.getenv("DOCINTEL_MANAGED", "true").lower() in ("1", "true", "yes")
+DOCINTEL_API_VERSION = os.getenv("DOCINTEL_API_VERSION", "2024-11-30")
+DOCINTEL_CONCURRENCY = int(os.getenv("DOCINTEL_CONCURRENCY", "8"))
+DOCINTEL_MAX_RETRIES = int(os.getenv("DOCINTEL_MAX_RETRIES", "5"))
+DOCINTEL_RETRY_BASE = float(os.getenv("DOCINTEL_RETRY_BASE", "1"))
+DOCINTEL_RETRY_MAX = float(os.getenv("DOCINTEL_RETRY_MAX", "30"))
+DOCINTEL_POLL_INTERVAL = float(os.getenv("DOCINTEL_POLL_INTERVAL", "1"))
+DOCINTEL_PAGE_BATCH = int(os.getenv("DOCINTEL_PAGE_BATCH", "0"))
+DOCINTEL_TIMEOUT = float(os.getenv("DOCINTEL_TIMEOUT", "60"))
+
+# Page-parallel PDF conversion: page ranges per PDF (0 or 1 disables) and minimum page count to split
+PDF_FANOUT = int(os.getenv("PDF_FANOUT", "0"))
+PDF_FANOUT_MIN_PAGES = int(os.getenv("PDF_FANOUT_MIN_PAGES", "50"))
+
+# Segmented audio transcription (opt-in): backend ("auto" picks an installed offline one: "faster_whisper", then "sphinx", else the online "google"), segment length, overlap, silence detection and parallelism
+TRANSCRIBE_SEGMENTED = os.getenv("TRANSCRIBE_SEGMENTED", "false").lower() in ("1", "true", "yes")
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "auto").lower()
+TRANSCRIBE_MODEL = os.getenv("TRANSCRIBE_MODEL", "base")
+TRANSCRIBE_LANGUAGE = os.getenv("TRANSCRIBE_LANGUAGE", "en-US")
+TRANSCRIBE_SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "30"))
+TRANSCRIBE_OVERLAP_MS = int(os.getenv("TRANSCRIBE_OVERLAP_MS", "500"))
+TRANSCRIBE_MIN_SILENCE_MS = int(os.getenv("TRANSCRIBE_MIN_SILENCE_MS", "400"))
+TRANSCRIBE_SILENCE_DB = float(os.getenv("TRANSCRIBE_SILENCE_DB", "16"))
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+
+# Streaming spreadsheet and CSV conversion: data rows per Markdown table before the header is repeated (0 renders one table)
+TABULAR_BLOCK_ROWS = int(os.getenv("TABULAR_BLOCK_ROWS", "1000"))
+
+# Response compression: content codings in order of preference (zstd and br need their packages) and minimum body size
+COMPRESSION_ENCODINGS = [e.strip().lower() for e in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if e.strip()]
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Default chunk size and overlap, in approximate tokens, for chunked output
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "512"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+
+# Server-side fetching for /convert_uri (http and https URIs), with a cache of validators and small bodies
+URI_FETCH = os.getenv("URI_FETCH", "true").lower() in ("1", "true", "yes")
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))
+FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "10"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(MAX_FILE_SIZE)))
+FETCH_MAX_REDIRECTS = int(os.getenv("FETCH_MAX_REDIRECTS", "5"))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "100"))
+FETCH_CACHE_MAX_ENTRIES = int(os.getenv("FETCH_CACHE_MAX_ENTRIES", "10000"))
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Conversion result cache (in-memory LRU bounded by bytes, optional disk tier that survives restarts)
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_DIR = os.getenv("CACHE_DIR") or None
+CACHE_DISK_MAX_BYTES = int(os.getenv("CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Concurrent identical conversions (same content or URI and effective config) share one run
+CONVERSION_COALESCING = os.getenv("CONVERSION_COALESCING", "true").lower() in ("1", "true", "yes")
+
+# Asynchronous jobs (/jobs): runner concurrency, queue bound, result TTL and result store ("memory" or "sqlite")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", str(max(CONVERSION_WORKERS, 1))))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+JOB_STORE_PATH = os.path.join(APP_DIR, os.getenv("JOB_STORE_PATH") or "jobs.db")
+
+# Admission control: (concurrency limit, max waiting requests) per conversion class; a limit of 0 disables it
+_ADMISSION_DEFAULTS = {
+    "audio": (max(CONVERSION_WORKERS // 4, 1), 4),
+    "ocr": (max(CONVERSION_WORKERS // 2, 1), 8),
+    "pdf": (max(CONVERSION_WORKERS, 1), 16),
+    "office": (max(CONVERSION_WORKERS, 1), 16),
+    "text": (max(CONVERSION_WORKERS, 1) * 4, 64),
+    "other": (max(CONVERSION_WORKERS, 1), 16),
+}
+ADMISSION_LIMITS = {
+    name: (
+        int(os.getenv(f"ADMISSION_{name.upper()}_CONCURRENCY", str(limit))),
+        int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", str(queue)))
+    )
+    for name, (limit, queue) in _ADMISSION_DEFAULTS.items()
+}
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
 def load_default_config() -> MarkDownConfig:
     """Load default configuration from environment variables.
 
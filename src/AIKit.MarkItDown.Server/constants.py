@@ -2,4 +2,8 @@
 
 # Constants
 MAX_FILE_SIZE = 200 * 1024 * 1024  # 200MB limit
+MULTIPART_OVERHEAD = 1024 * 1024  # Allowance for multipart framing and form fields on top of MAX_FILE_SIZE
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Uploads are read in 1MB chunks
 VERSION = "1.0.0"
+WORKER_STARTUP_TIMEOUT = 120  # Seconds to wait for a conversion worker to warm up
+DOCINTEL_EXTENSIONS = ("pdf", "jpg", "jpeg", "png", "bmp", "tiff", "docx", "pptx", "xlsx")  # File types MarkItDown's DocumentIntelligenceConverter accepts by default
@@ -0,0 +1,323 @@
+"""Shared conversion flow used by the routes: cache lookup, job dispatch and cache store."""
+
+import json
+import logging
+from urllib.parse import urlparse, urlunparse
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple, Union
+from starlette.concurrency import run_in_threadpool
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from executor import conversion_pool, ConversionJob, ConversionOutput, Segment
+from chunking import MarkdownChunker
+from cache import result_cache, cache_key
+from admission import admission_controller, AdmissionRejectedError
+from singleflight import conversion_flights
+from clients import credential_fingerprint
+from models import MarkDownConfig
+import metrics
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+def resolve_extension(filename: Optional[str], extension: Optional[str] = None) -> Optional[str]:
+    """Determine the file extension for a conversion.
+
+    Args:
+        filename: The uploaded file name or archive member path.
+        extension: Optional explicit extension override.
+
+    Returns:
+        The lower-cased extension without the leading dot, or None.
+    """
+    if extension:
+        return extension
+    name = (filename or "").rsplit("/", 1)[-1]
+    return name.split('.')[-1].lower() if '.' in name else None
+
+
+def uri_extension(uri: str) -> Optional[str]:
+    """Guess the file extension of a URI from its path, used to classify the conversion."""
+    return resolve_extension(urlparse(uri).path)
+
+
+def flight_key(key: str, config: Optional[MarkDownConfig]) -> str:
+    """Build the coalescing key of a conversion from its cache key.
+
+    The cache key only records whether credentials are set, so the fingerprints of the
+    credentials are added: a caller only joins a conversion that runs with its own
+    Document Intelligence and LLM keys, and never gets a result produced with another
+    caller's keys, or that caller's authentication error.
+
+    Args:
+        key: The cache key of the conversion.
+        config: The effective MarkDownConfig.
+
+    Returns:
+        str: The key conversions are coalesced on.
+    """
+    if config is None:
+        return key
+    fingerprints = [credential_fingerprint(config.docintel_key), credential_fingerprint(config.llm_api_key)]
+    return ":".join([key] + [fingerprint or "-" for fingerprint in fingerprints])
+
+
+def uri_key(uri: str, config: Optional[MarkDownConfig]) -> str:
+    """Build the coalescing key of a URI converted without fetching it first.
+
+    The scheme and host are lower-cased and the fragment dropped, so spellings of the
+    same resource share a key.
+    """
+    parsed = urlparse(uri.strip())
+    normalized = urlunparse(parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), fragment=""))
+    return flight_key(cache_key(f"uri:{normalized}", uri_extension(uri), config), config)
+
+
+def conversion_options(file_extension: Optional[str]) -> Dict[str, Any]:
+    """Build the converter options for a file extension.
+
+    Args:
+        file_extension: The file extension of the upload.
+
+    Returns:
+        Dict of extra keyword arguments for the converter.
+    """
+    options = {}
+    if file_extension == 'pdf':
+        options['check_extractable'] = False
+    return options
+
+
+async def lookup_cached(key: str) -> Optional[ConversionOutput]:
+    """Look up a cached result, counting the hit or miss.
+
+    Args:
+        key: The cache key.
+
+    Returns:
+        The cached ConversionOutput, or None on a miss or when caching is disabled.
+    """
+    if not result_cache.enabled:
+        return None
+    result = await run_in_threadpool(result_cache.get, key)
+    metrics.record_cache(result is not None)
+    return result
+
+
+async def run_cached(key: str, job: ConversionJob, wait: bool = False) -> Tuple[ConversionOutput, bool]:
+    """Return a cached result for key or run the job in the worker pool and cache it.
+
+    Cache misses go through admission control for the job's conversion class. A miss
+    for a key that is already being converted with the same credentials joins that
+    conversion instead of running its own, and gets its result or error (see
+    singleflight.SingleFlight and flight_key()).
+
+    Args:
+        key: The cache key for the job.
+        job: The conversion job.
+        wait: Wait for an admission slot instead of failing fast when the class is saturated.
+
+    Returns:
+        Tuple of (result, cache_hit).
+
+    Raises:
+        AdmissionRejectedError: If the conversion class is saturated and wait is False.
+    """
+    result = await lookup_cached(key)
+    if result is not None:
+        return result, True
+
+    async def convert() -> ConversionOutput:
+        async with admission_controller.slot(job.file_extension, wait=wait):
+            output = await conversion_pool.run(job)
+        if result_cache.enabled:
+            await run_in_threadpool(result_cache.put, key, output)
+        return output
+
+    flight = flight_key(key, job.config)
+    shared = flight in conversion_flights
+    try:
+        # An uploaded file spooled to disk is removed with its request, so the conversion is restarted if that request leaves
+        result = await conversion_flights.run(flight, convert, handoff=job.source_type == "path")
+    except AdmissionRejectedError:
+        # A waiting caller that joined a fail-fast conversion tries again on its own terms
+        if shared and wait:
+            return await run_cached(key, job, wait=True)
+        raise
+    return result, False
+
+
+def stream_mode(stream: bool, accept: Optional[str]) -> Optional[str]:
+    """Decide whether and how to stream a conversion response.
+
+    Args:
+        stream: The stream query flag.
+        accept: The Accept header.
+
+    Returns:
+        "ndjson" for segment events, "markdown" for chunked Markdown, or None to not stream.
+    """
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        return "ndjson"
+    if stream:
+        return "markdown"
+    return None
+
+
+def result_format(accept: Optional[str]) -> str:
+    """Decide how to render a conversion result.
+
+    Args:
+        accept: The Accept header.
+
+    Returns:
+        "msgpack" or "json" for a MarkDownResult envelope, or "markdown" for the bare Markdown.
+
+    Raises:
+        HTTPException: 406 if only msgpack is acceptable and msgpack is not installed.
+    """
+    accept = (accept or "").lower()
+    if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        if msgpack is not None:
+            return "msgpack"
+        if JSON_MEDIA_TYPE not in accept:
+            raise HTTPException(status_code=406, detail="msgpack responses are not available on this server")
+    if JSON_MEDIA_TYPE in accept:
+        return "json"
+    return "markdown"
+
+
+def result_response(result: BaseModel, fmt: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Render a conversion result in the negotiated format.
+
+    Args:
+        result: The MarkDownResult (or a subclass) to send.
+        fmt: "markdown", "json" or "msgpack", as returned by result_format().
+        headers: Optional extra response headers.
+
+    Returns:
+        Response: Markdown text, a JSON envelope or a msgpack envelope.
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if fmt == "msgpack":
+        return Response(content=msgpack.packb(result.model_dump(), use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+    if fmt == "json":
+        return Response(content=result.model_dump_json(), media_type=JSON_MEDIA_TYPE, headers=headers)
+    return Response(content=result.text, media_type="text/markdown", headers=headers)
+
+
+async def admitted_events(events: AsyncIterator, file_extension: Optional[str]) -> AsyncIterator:
+    """Hold an admission slot for a streaming conversion until its events are exhausted.
+
+    The slot is taken before the first event is produced, so a saturated class still
+    fails fast before the response starts.
+    """
+    limiter = await admission_controller.acquire(file_extension)
+    try:
+        async for event in events:
+            yield event
+    finally:
+        await events.aclose()
+        limiter.release()
+
+
+async def cached_events(result: ConversionOutput) -> AsyncIterator[Union[Segment, ConversionOutput]]:
+    """Replay a cached result as a single-segment event stream."""
+    yield Segment(kind="document", index=1, markdown=result.text_content)
+    yield ConversionOutput(text_content="", title=result.title)
+
+
+async def _markdown_chunks(first, events: AsyncIterator) -> AsyncIterator[str]:
+    separator = ""
+    event = first
+    while isinstance(event, Segment):
+        if event.markdown:
+            yield separator + event.markdown
+            separator = "\n\n"
+        event = await events.__anext__()
+
+
+async def _ndjson_events(first, events: AsyncIterator) -> AsyncIterator[str]:
+    count = 0
+    event = first
+    try:
+        while isinstance(event, Segment):
+            count += 1
+            yield json.dumps({"type": "segment", "kind": event.kind, "index": event.index, "label": event.label, "markdown": event.markdown}) + "\n"
+            event = await events.__anext__()
+        yield json.dumps({"type": "done", "title": event.title, "metadata": {"segments": count}}) + "\n"
+    except Exception as e:
+        logger.error(f"Streaming conversion failed: {str(e)}")
+        yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+
+async def _chunk_events(first, events: AsyncIterator, chunker: MarkdownChunker) -> AsyncIterator[str]:
+    event = first
+    try:
+        while isinstance(event, Segment):
+            chunks = await run_in_threadpool(chunker.add, event)
+            for chunk in chunks:
+                yield json.dumps({"type": "chunk", **chunk}) + "\n"
+            event = await events.__anext__()
+        yield json.dumps({"type": "done", "title": event.title, "metadata": {"chunks": chunker.count}}) + "\n"
+    except Exception as e:
+        logger.error(f"Streaming conversion failed: {str(e)}")
+        yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+
+async def streaming_response(events: AsyncIterator, mode: str, headers: Optional[Dict[str, str]] = None, on_close: Optional[Callable[[], None]] = None, chunker: Optional[MarkdownChunker] = None) -> StreamingResponse:
+    """Build a chunked response from conversion events.
+
+    The first event is awaited before the response starts, so errors raised before any
+    output (invalid input, unsupported format) still surface as regular HTTP errors.
+    Later failures end a Markdown stream early, or are reported as an "error" event in
+    NDJSON mode. The final NDJSON "done" event carries the title and metadata.
+
+    Args:
+        events: Async iterator of Segment objects followed by the final ConversionOutput.
+        mode: "markdown" or "ndjson", as returned by stream_mode().
+        headers: Optional extra response headers.
+        on_close: Optional cleanup callback run once the stream ends.
+        chunker: If set, the response is NDJSON "chunk" events built by this chunker as
+            segments arrive, whatever the mode.
+
+    Returns:
+        StreamingResponse: The chunked response.
+    """
+    try:
+        first = await events.__anext__()
+    except BaseException:
+        await events.aclose()
+        if on_close is not None:
+            on_close()
+        raise
+
+    if chunker is not None:
+        rendered = _chunk_events(first, events, chunker)
+    elif mode == "ndjson":
+        rendered = _ndjson_events(first, events)
+    else:
+        rendered = _markdown_chunks(first, events)
+
+    async def body():
+        try:
+            async for chunk in rendered:
+                yield chunk
+        finally:
+            await events.aclose()
+            if on_close is not None:
+                on_close()
+
+    media_type = NDJSON_MEDIA_TYPE if mode == "ndjson" or chunker is not None else "text/markdown"
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
@@ -1,7 +1,287 @@
-"""Converter module for initializing the MarkItDown instance."""
+"""Converter module for creating MarkItDown instances and running conversion jobs."""
 
-from markitdown import MarkItDown
+import io
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, Iterator, List, Optional
+from executor import ConversionJob, ConversionOutput, Segment
+from models import MarkDownConfig
+from utils import build_instance_kwargs, build_conversion_kwargs
+from clients import credential_fingerprint, get_docintel_client
+from config import default_config, MARKITDOWN_POOL_SIZE
+from transcription import segmented_audio
+from metrics import CONVERTERS
 
-# Initialize MarkItDown instance
-md = MarkItDown(enable_plugins=True)
+if TYPE_CHECKING:
+    from markitdown import MarkItDown
 
+logger = logging.getLogger(__name__)
+
+# Set once the MarkItDown stack (markitdown and every converter's dependencies) is imported in this process
+_stack_loaded = threading.Event()
+
+# Converters whose optional dependencies live in a module other than their own
+DEPENDENCY_MODULES = {"AudioConverter": "markitdown.converters._transcribe_audio"}
+
+
+def instance_key(config: Optional[MarkDownConfig]) -> Hashable:
+    """Build the pool key for the MarkItDown instance serving a configuration.
+
+    Only settings fixed at construction time are part of the key; credentials are
+    fingerprinted rather than kept in clear.
+
+    Args:
+        config: The effective MarkDownConfig, or None for the defaults.
+
+    Returns:
+        A hashable key.
+    """
+    if config is None:
+        return (True, None, None, None, None, None)
+    return (
+        config.enable_plugins if config.enable_plugins is not None else True,
+        config.docintel_endpoint,
+        credential_fingerprint(config.docintel_key),
+        credential_fingerprint(config.llm_api_key),
+        config.llm_model,
+        config.llm_prompt
+    )
+
+
+def build_markitdown(config: Optional[MarkDownConfig]) -> "MarkItDown":
+    """Build a MarkItDown instance with the converters and clients for a configuration.
+
+    The LLM client, the streaming spreadsheet and CSV converter and, when configured,
+    a Document Intelligence converter backed by the pooled Document Intelligence
+    client are wired in at construction. The
+    MarkItDown stack is imported on the first call, so a process only pays for it
+    once it converts or warms up.
+
+    Args:
+        config: The effective MarkDownConfig, or None for the defaults.
+
+    Returns:
+        MarkItDown: A ready instance.
+    """
+    from markitdown import MarkItDown, PRIORITY_SPECIFIC_FILE_FORMAT
+    from tabular import TabularConverter
+
+    md = MarkItDown(enable_plugins=True) if config is None else MarkItDown(**build_instance_kwargs(config))
+    # Takes over XLSX and CSV from MarkItDown's DataFrame-based converters
+    md.register_converter(TabularConverter(), priority=PRIORITY_SPECIFIC_FILE_FORMAT)
+    if config is not None and config.docintel_endpoint and config.docintel_key:
+        from azure.core.credentials import AzureKeyCredential
+        from markitdown.converters import DocumentIntelligenceConverter
+
+        docintel = DocumentIntelligenceConverter(endpoint=config.docintel_endpoint, credential=AzureKeyCredential(config.docintel_key))
+        docintel.doc_intel_client = get_docintel_client(config.docintel_endpoint, config.docintel_key)
+        # Registered last, so it is still tried before the spreadsheet converter
+        md.register_converter(docintel, priority=PRIORITY_SPECIFIC_FILE_FORMAT)
+    _stack_loaded.set()
+    return md
+
+
+def converter_status() -> Dict[str, str]:
+    """Report the load state of the built-in converters in this process.
+
+    Returns:
+        Mapping of converter class name to "cold" (not imported yet), "warm" (imported
+        with its dependencies) or "unavailable" (optional dependencies are missing).
+    """
+    names = sorted(set(CONVERTERS.values()))
+    if default_config.docintel_endpoint:
+        names.append("DocumentIntelligenceConverter")
+    if not _stack_loaded.is_set():
+        return {name: "cold" for name in names}
+
+    import markitdown.converters
+
+    status = {}
+    for name in names:
+        converter = getattr(markitdown.converters, name, None)
+        module = sys.modules.get(DEPENDENCY_MODULES.get(name, getattr(converter, "__module__", "")))
+        available = converter is not None and getattr(module, "_dependency_exc_info", None) is None
+        status[name] = "warm" if available else "unavailable"
+    return status
+
+
+class MarkItDownPool:
+    """Thread-safe LRU pool of MarkItDown instances keyed by effective configuration.
+
+    A checked-out instance is used by one conversion at a time; concurrent
+    conversions with the same configuration get separate instances. At most max_size
+    idle instances are kept, and the least recently used ones are dropped first.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._idle: "OrderedDict[Hashable, List[MarkItDown]]" = OrderedDict()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self, config: Optional[MarkDownConfig]) -> Iterator["MarkItDown"]:
+        """Borrow an instance for a configuration, building one if none is idle.
+
+        Args:
+            config: The effective MarkDownConfig.
+
+        Yields:
+            MarkItDown: An instance for exclusive use within the block.
+        """
+        key = instance_key(config)
+        md = None
+        with self._lock:
+            instances = self._idle.get(key)
+            if instances:
+                md = instances.pop()
+                self._count -= 1
+                if not instances:
+                    del self._idle[key]
+
+        if md is None:
+            md = build_markitdown(config)
+
+        try:
+            yield md
+        finally:
+            self._return(key, md)
+
+    def _return(self, key: Hashable, md: "MarkItDown"):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._idle.setdefault(key, []).append(md)
+            self._idle.move_to_end(key)
+            self._count += 1
+            while self._count > self.max_size:
+                oldest_key, instances = next(iter(self._idle.items()))
+                instances.pop(0)
+                self._count -= 1
+                if not instances:
+                    del self._idle[oldest_key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count
+
+
+# Per-process pool of MarkItDown instances
+markitdown_pool = MarkItDownPool(max_size=MARKITDOWN_POOL_SIZE)
+
+
+def preload():
+    """Import the MarkItDown stack and the conversion modules without building an instance.
+
+    Used by the preload-and-fork launcher (serve.py), whose server workers then share
+    these modules copy-on-write. Instances are still built in each worker, as the
+    ONNX Runtime session of MarkItDown's file type detection owns threads that do not
+    survive a fork.
+    """
+    import markitdown.converters  # noqa: F401 - imports every converter with its dependencies
+    import captions, pdfpages, segments, tabular  # noqa: F401
+
+
+def warm_up():
+    """Prepare the current process for conversions.
+
+    Builds the MarkItDown instance, with its clients, for the env-configured default config.
+    """
+    try:
+        with markitdown_pool.checkout(default_config):
+            pass
+    except Exception as e:
+        logger.warning(f"Failed to prebuild the default MarkItDown instance: {str(e)}")
+
+
+def run_job(job: ConversionJob, on_segment: Optional[Callable[[Segment], None]] = None) -> ConversionOutput:
+    """Run a conversion job synchronously.
+
+    Args:
+        job: The job describing the source, extension and effective config.
+        on_segment: If set, the document is emitted segment by segment through this
+            callback and the returned output carries only the title.
+
+    Returns:
+        ConversionOutput: The converted Markdown and title, or a PdfRangeOutput for a
+            job with a page_range.
+
+    Raises:
+        ValueError: If the config or source type is invalid.
+    """
+    if job.page_range is not None:
+        from pdfpages import convert_page_range
+        return convert_page_range(job)
+
+    kwargs = dict(job.options)
+    if job.config:
+        kwargs.update(build_conversion_kwargs(job.config))
+
+    started = time.perf_counter()
+    with markitdown_pool.checkout(job.config) as md:
+        timings: Dict[str, float] = {"client_build": time.perf_counter() - started}
+        started = time.perf_counter()
+        with _prefetched_captions(md, job):
+            output = _convert(md, job, kwargs, on_segment)
+    timings["conversion"] = time.perf_counter() - started
+    output.timings = timings
+    return output
+
+
+@contextmanager
+def _prefetched_captions(md: "MarkItDown", job: ConversionJob) -> Iterator[None]:
+    """Describe the job's images in parallel ahead of the conversion, when an LLM is configured."""
+    if getattr(md, "_llm_client", None) is None or job.source_type not in ("bytes", "path"):
+        yield
+        return
+
+    from captions import prefetch_captions
+
+    llm = {"llm_client": md._llm_client, "llm_model": md._llm_model, "llm_prompt": md._llm_prompt}
+    stream = io.BytesIO(job.source) if job.source_type == "bytes" else open(job.source, "rb")
+    with stream, prefetch_captions(stream, job.file_extension, llm, job.selection):
+        yield
+
+
+def _convert(md: "MarkItDown", job: ConversionJob, kwargs: dict, on_segment: Optional[Callable[[Segment], None]]) -> ConversionOutput:
+    selection = job.selection
+    # Document Intelligence converts whole documents, so segmenting is skipped when it is configured
+    docintel = job.config is not None and bool(job.config.docintel_endpoint)
+    if docintel and selection is not None and (selection.pages or selection.slides or selection.sheets or selection.max_rows):
+        raise ValueError("Page, slide, sheet and row selection is not supported with Document Intelligence")
+
+    # With TRANSCRIBE_SEGMENTED set, recordings are transcribed in parallel segments
+    audio = segmented_audio(job.file_extension)
+    if (on_segment is not None or selection is not None or audio) and (not docintel or audio) and job.source_type in ("bytes", "path"):
+        from segments import convert_segments
+        if job.config:
+            # Segmenters call converters directly, so pass the instance's LLM settings explicitly
+            kwargs.update({k: v for k, v in build_instance_kwargs(job.config).items() if k.startswith("llm_")})
+        collected: List[Segment] = []
+        stream = io.BytesIO(job.source) if job.source_type == "bytes" else open(job.source, "rb")
+        with stream:
+            title = convert_segments(md, stream, job.file_extension, on_segment or collected.append, selection=selection, **kwargs)
+        if on_segment is not None:
+            return ConversionOutput(text_content="", title=title)
+        return ConversionOutput(text_content="\n\n".join(s.markdown for s in collected if s.markdown), title=title)
+
+    if job.source_type == "bytes":
+        result = md.convert_stream(io.BytesIO(job.source), file_extension=job.file_extension, **kwargs)
+    elif job.source_type == "path":
+        result = md.convert_local(job.source, file_extension=job.file_extension, **kwargs)
+    elif job.source_type == "uri":
+        result = md.convert(job.source, **kwargs)
+    else:
+        raise ValueError(f"Unsupported source type: {job.source_type}")
+
+    text_content = result.text_content
+    if selection is not None and selection.max_chars:
+        text_content = text_content[:selection.max_chars]
+    if on_segment is not None:
+        on_segment(Segment(kind="document", index=1, markdown=text_content))
+        return ConversionOutput(text_content="", title=result.title)
+    return ConversionOutput(text_content=text_content, title=result.title)
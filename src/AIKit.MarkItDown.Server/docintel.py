@@ -0,0 +1,283 @@
+"""Managed Azure Document Intelligence calls: bounded concurrency, retries and page batching."""
+
+import asyncio
+import io
+import logging
+import random
+import re
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from executor import ConversionJob, ConversionOutput, ConversionError, Segment
+from pdfpages import pdf_page_count
+from constants import VERSION, DOCINTEL_EXTENSIONS
+from config import (
+    DOCINTEL_MANAGED, DOCINTEL_API_VERSION, DOCINTEL_CONCURRENCY, DOCINTEL_MAX_RETRIES,
+    DOCINTEL_RETRY_BASE, DOCINTEL_RETRY_MAX, DOCINTEL_POLL_INTERVAL, DOCINTEL_PAGE_BATCH, DOCINTEL_TIMEOUT
+)
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Office formats do not support the OCR add-on features
+NO_OCR_EXTENSIONS = ("docx", "pptx", "xlsx")
+OCR_FEATURES = "formulas,ocrHighResolution,styleFont"
+
+# Responses worth retrying: throttling and transient service errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+class DocIntelError(ConversionError):
+    """Raised when Document Intelligence rejects or fails an analysis.
+
+    Attributes:
+        status_code: The HTTP status returned by the service, if any.
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message, "DocIntelError")
+        self.status_code = status_code
+
+
+def page_batches(page_count: int, batch_size: int) -> List[str]:
+    """Split a page count into Document Intelligence page ranges.
+
+    Args:
+        page_count: Number of pages of the document.
+        batch_size: Pages per batch.
+
+    Returns:
+        Ranges such as ["1-50", "51-100", "101-120"], or [] if no split is needed.
+    """
+    if batch_size <= 0 or page_count <= batch_size:
+        return []
+    return [f"{start}-{min(start + batch_size - 1, page_count)}" for start in range(1, page_count + 1, batch_size)]
+
+
+def _retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    """Seconds the service asked to wait, from Retry-After (seconds or HTTP date)."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_message(response: httpx.Response) -> str:
+    try:
+        error = response.json().get("error") or {}
+        return f"{error.get('code', response.status_code)}: {error.get('message', response.text)}"
+    except ValueError:
+        return f"{response.status_code}: {response.text[:200]}"
+
+
+class DocIntelService:
+    """Runs Document Intelligence analyses on the event loop instead of in a worker.
+
+    At most max_concurrency analyses (or page batches) are in flight per process.
+    Throttled (429) and transiently failing requests are retried with exponential
+    backoff and full jitter, honouring Retry-After. Analyses are polled with async
+    sleeps, so no worker process or thread is held while the service works. PDFs
+    with more than page_batch pages are analyzed as page ranges in parallel and
+    their Markdown is stitched back in page order.
+    """
+
+    def __init__(self, api_version: str, max_concurrency: int, max_retries: int, retry_base: float, retry_max: float, poll_interval: float, page_batch: int, timeout: float, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_version = api_version
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.page_batch = page_batch
+        self.timeout = timeout
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def handles(self, job: ConversionJob) -> bool:
+        """Whether a job is converted by this service rather than by a worker.
+
+        Jobs are handled when Document Intelligence is configured with a key and the
+        source is an upload or a fetched body of a type the service accepts.
+        """
+        config = job.config
+        return (
+            DOCINTEL_MANAGED
+            and config is not None
+            and bool(config.docintel_endpoint and config.docintel_key)
+            and job.source_type in ("bytes", "path")
+            and (job.file_extension or "").lower().lstrip(".") in DOCINTEL_EXTENSIONS
+        )
+
+    async def start(self):
+        """Create the pooled HTTP client. Safe to call more than once."""
+        if self._client is not None:
+            return
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=max(self.max_concurrency * 2, 10)),
+            headers={"User-Agent": f"AIKit-MarkItDown/{VERSION}"},
+            transport=self.transport
+        )
+
+    async def shutdown(self):
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def convert(self, job: ConversionJob, on_segment: Optional[Callable[[Segment], None]] = None) -> ConversionOutput:
+        """Convert a job with Document Intelligence.
+
+        Args:
+            job: A job for which handles() is True.
+            on_segment: For streaming jobs, receives the document as a single segment.
+
+        Returns:
+            ConversionOutput: The converted Markdown.
+
+        Raises:
+            ValueError: If the document or selection is rejected.
+            DocIntelError: If the analysis fails, including after exhausting retries.
+        """
+        await self.start()
+        selection = job.selection
+        if selection is not None and (selection.pages or selection.slides or selection.sheets or selection.max_rows):
+            raise ValueError("Page, slide, sheet and row selection is not supported with Document Intelligence")
+
+        source = job.source
+        if job.source_type == "path":
+            source = await run_in_threadpool(_read_file, job.source)
+        extension = job.file_extension.lower().lstrip(".")
+
+        batches = []
+        if extension == "pdf" and self.page_batch > 0:
+            page_count = await run_in_threadpool(pdf_page_count, io.BytesIO(source))
+            batches = page_batches(page_count or 0, self.page_batch)
+
+        started = asyncio.get_running_loop().time()
+        if batches:
+            logger.info(f"Analyzing {len(batches)} page batches of {self.page_batch} pages with Document Intelligence")
+            parts = await asyncio.gather(*(self.analyze(job.config.docintel_endpoint, job.config.docintel_key, source, extension, pages) for pages in batches))
+        else:
+            parts = [await self.analyze(job.config.docintel_endpoint, job.config.docintel_key, source, extension)]
+        metrics.record_stage("docintel", asyncio.get_running_loop().time() - started)
+
+        text_content = "\n\n".join(part.strip() for part in parts if part.strip())
+        if selection is not None and selection.max_chars:
+            text_content = text_content[:selection.max_chars]
+        if on_segment is not None:
+            on_segment(Segment(kind="document", index=1, markdown=text_content))
+            return ConversionOutput(text_content="")
+        return ConversionOutput(text_content=text_content)
+
+    async def analyze(self, endpoint: str, key: str, source: bytes, extension: str, pages: Optional[str] = None) -> str:
+        """Analyze a document (or some of its pages) with the prebuilt layout model.
+
+        Args:
+            endpoint: The Document Intelligence endpoint.
+            key: The Document Intelligence key.
+            source: The document bytes.
+            extension: The file extension, which selects the analysis features.
+            pages: Optional page range such as "1-50".
+
+        Returns:
+            The Markdown content with Document Intelligence's comments removed.
+        """
+        params: Dict[str, str] = {"api-version": self.api_version, "outputContentFormat": "markdown"}
+        if extension not in NO_OCR_EXTENSIONS:
+            params["features"] = OCR_FEATURES
+        if pages:
+            params["pages"] = pages
+        headers = {"Ocp-Apim-Subscription-Key": key}
+        url = f"{endpoint.rstrip('/')}/documentintelligence/documentModels/prebuilt-layout:analyze"
+
+        async with self._semaphore:
+            response = await self._request("POST", url, params=params, headers={**headers, "Content-Type": "application/octet-stream"}, content=source)
+            operation = response.headers.get("Operation-Location")
+            if response.status_code != 202 or not operation:
+                raise DocIntelError(f"Document Intelligence did not start the analysis: {_error_message(response)}", response.status_code)
+
+            delay = _retry_after(response) or self.poll_interval
+            while True:
+                await asyncio.sleep(delay)
+                response = await self._request("GET", operation, headers=headers)
+                if response.status_code != 200:
+                    raise DocIntelError(f"Polling the Document Intelligence analysis failed: {_error_message(response)}", response.status_code)
+                result = response.json()
+                status = result.get("status")
+                if status == "succeeded":
+                    return _COMMENT.sub("", (result.get("analyzeResult") or {}).get("content") or "")
+                if status == "failed":
+                    error = result.get("error") or {}
+                    raise DocIntelError(f"Document Intelligence analysis failed: {error.get('code')}: {error.get('message')}")
+                delay = _retry_after(response) or self.poll_interval
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying throttling and transient failures with jittered backoff.
+
+        Raises:
+            ValueError: If the service rejected the document (400 or 415).
+            DocIntelError: On other errors, or once retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await self._client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+                failure = _error_message(response)
+            except httpx.TransportError as e:
+                failure = f"{type(e).__name__}: {str(e)}"
+
+            if attempt >= self.max_retries:
+                status_code = response.status_code if response is not None else None
+                raise DocIntelError(f"Document Intelligence request failed after {attempt + 1} attempts: {failure}", status_code)
+            delay = _retry_after(response)
+            if delay is None:
+                delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+            else:
+                delay = min(delay, self.retry_max) + random.uniform(0, self.retry_base)
+            attempt += 1
+            metrics.record_docintel_retry(response.status_code if response is not None else "transport")
+            logger.warning(f"Document Intelligence {method} failed ({failure}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        if response.status_code in (400, 415):
+            raise ValueError(f"Document Intelligence rejected the document: {_error_message(response)}")
+        if response.status_code >= 400:
+            raise DocIntelError(f"Document Intelligence request failed: {_error_message(response)}", response.status_code)
+        return response
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Global Document Intelligence service
+docintel_service = DocIntelService(
+    api_version=DOCINTEL_API_VERSION,
+    max_concurrency=DOCINTEL_CONCURRENCY,
+    max_retries=DOCINTEL_MAX_RETRIES,
+    retry_base=DOCINTEL_RETRY_BASE,
+    retry_max=DOCINTEL_RETRY_MAX,
+    poll_interval=DOCINTEL_POLL_INTERVAL,
+    page_batch=DOCINTEL_PAGE_BATCH,
+    timeout=DOCINTEL_TIMEOUT
+)
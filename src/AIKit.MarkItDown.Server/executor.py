@@ -0,0 +1,513 @@
+"""Execution layer that runs conversions off the event loop in a pool of worker processes."""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple, Union
+
+from models import MarkDownConfig
+from selection import DocumentSelection
+from config import CONVERSION_WORKERS, CONVERSION_TIMEOUT, CONVERSION_MAX_JOBS_PER_WORKER, CONVERSION_START_METHOD, STARTUP_MODE
+from constants import WORKER_STARTUP_TIMEOUT
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionError(Exception):
+    """Raised when a conversion fails inside a worker."""
+
+    def __init__(self, message: str, error_type: Optional[str] = None):
+        super().__init__(message)
+        self.error_type = error_type or type(self).__name__
+
+
+class ConversionTimeoutError(ConversionError):
+    """Raised when a conversion exceeds the configured timeout."""
+
+
+@dataclass
+class ConversionJob:
+    """A unit of work sent to a conversion worker.
+
+    Attributes:
+        source: The data to convert: raw bytes, a local file path or a URI.
+        source_type: One of "bytes", "path" or "uri".
+        file_extension: Optional file extension hint (without the leading dot).
+        config: The effective MarkDownConfig for the conversion.
+        options: Extra keyword arguments passed to the converter.
+        stream: Emit the document segment by segment while converting.
+        selection: Optional pages, slides or sheets to convert and output cap.
+        page_range: Inclusive (first, last) PDF pages to extract for a page-parallel
+            conversion; the worker then returns a PdfRangeOutput.
+    """
+    source: Any
+    source_type: str
+    file_extension: Optional[str] = None
+    config: Optional[MarkDownConfig] = None
+    options: Dict[str, Any] = field(default_factory=dict)
+    stream: bool = False
+    selection: Optional[DocumentSelection] = None
+    page_range: Optional[Tuple[int, int]] = None
+
+
+@dataclass
+class Segment:
+    """A part of a document emitted while a streaming conversion is running.
+
+    Attributes:
+        kind: "page", "sheet", "slide", "document", "table" for a block of CSV rows,
+            "audio" for a transcribed part of a recording, or "archive" and "file" for
+            archive members.
+        index: 1-based position of the segment within the document; the blocks of a
+            long sheet share the sheet's index.
+        markdown: The Markdown for this segment.
+        label: Optional name of the segment (e.g. the sheet name).
+    """
+    kind: str
+    index: int
+    markdown: str
+    label: Optional[str] = None
+
+
+@dataclass
+class ConversionOutput:
+    """The result of a conversion, as returned to the routes.
+
+    Attributes:
+        text_content: The converted Markdown.
+        title: The document title, if any.
+        timings: Seconds spent in each stage inside the worker (e.g. "client_build", "conversion").
+    """
+    text_content: str
+    title: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def _worker_main(conn, startup_mode: str):
+    """Entry point of a worker process.
+
+    Warms a MarkItDown instance (unless the startup mode is "lazy"), signals readiness
+    with the state of its converters and then serves jobs from the pipe until it
+    receives None or the pipe is closed. Changes in converter state, such as the
+    stack loading on the first job of a lazy worker, are reported before the result.
+
+    Args:
+        conn: The child end of the pipe shared with the pool.
+        startup_mode: "eager", "background" or "lazy".
+    """
+    from converter import warm_up, run_job, converter_status
+
+    if startup_mode != "lazy":
+        warm_up()
+    reported = converter_status()
+    conn.send(("ready", reported))
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        try:
+            on_segment = (lambda segment: conn.send(("segment", segment))) if job.stream else None
+            reply = ("ok", run_job(job, on_segment))
+        except Exception as e:
+            reply = ("error", (type(e).__name__, str(e), isinstance(e, ValueError)))
+        status = converter_status()
+        if status != reported:
+            reported = status
+            conn.send(("status", status))
+        conn.send(reply)
+
+
+class _Worker:
+    """A single worker process and the parent end of its pipe."""
+
+    def __init__(self, context, index: int, startup_mode: str):
+        self.index = index
+        self.jobs = 0
+        self.ready = False
+        self.converters: Dict[str, str] = {}
+        self._ready_lock = threading.Lock()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, startup_mode), name=f"markitdown-worker-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self):
+        """Block until the worker has signalled readiness.
+
+        Raises:
+            ConversionTimeoutError: If the worker does not start in time.
+            ConversionError: If the worker process died.
+        """
+        with self._ready_lock:
+            if self.ready:
+                return
+            try:
+                if not self.conn.poll(WORKER_STARTUP_TIMEOUT):
+                    raise ConversionTimeoutError("Conversion worker did not start in time")
+                _, self.converters = self.conn.recv()
+            except (EOFError, OSError):
+                raise ConversionError("Conversion worker exited unexpectedly")
+            self.ready = True
+
+    def run(self, job: ConversionJob, timeout: float, on_segment: Optional[Callable[[Segment], None]] = None):
+        """Send a job to the worker and block until it answers.
+
+        Args:
+            job: The job to run.
+            timeout: Maximum number of seconds to wait for the result.
+            on_segment: Called with each segment of a streaming job as it arrives.
+
+        Returns:
+            Tuple of (status, payload) as sent by the worker.
+
+        Raises:
+            ConversionTimeoutError: If the worker does not answer in time.
+            ConversionError: If the worker process died.
+        """
+        self.wait_ready()
+        try:
+            self.jobs += 1
+            self.conn.send(job)
+            deadline = time.monotonic() + timeout
+            while True:
+                if not self.conn.poll(max(deadline - time.monotonic(), 0)):
+                    raise ConversionTimeoutError(f"Conversion timed out after {timeout} seconds")
+                status, payload = self.conn.recv()
+                if status == "status":
+                    self.converters = payload
+                elif status != "segment":
+                    return status, payload
+                elif on_segment is not None:
+                    on_segment(payload)
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            raise ConversionError("Conversion worker exited unexpectedly")
+
+    def stop(self, kill: bool = False):
+        """Stop the worker process.
+
+        Args:
+            kill: Terminate the process immediately instead of asking it to exit.
+        """
+        if not kill:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                kill = True
+            else:
+                self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+
+class ConversionPool:
+    """Bounded pool of conversion worker processes.
+
+    Each worker owns a warmed MarkItDown instance. Jobs are dispatched to idle workers
+    from the event loop; a worker that times out is killed and replaced, and workers are
+    recycled after a configurable number of jobs to limit memory creep.
+
+    The startup mode decides when converters load: "eager" waits for every worker to
+    warm up before start() returns, "background" lets them warm up while the server
+    already accepts connections, and "lazy" loads the MarkItDown stack on each
+    worker's first job.
+
+    With zero processes, jobs run in a thread inside the server process instead.
+    """
+
+    def __init__(self, processes: int, timeout: float, max_jobs_per_worker: int, start_method: str, startup_mode: str = "background"):
+        self.processes = processes
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.start_method = start_method
+        self.startup_mode = startup_mode
+        self._context = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: Dict[int, _Worker] = {}
+        self._next_index = 0
+        self._lock = threading.Lock()
+        self._start_lock = asyncio.Lock()
+        self.waiting = 0
+        self.running = 0
+
+    @property
+    def started(self) -> bool:
+        return self._threads is not None
+
+    async def start(self):
+        """Start the worker processes. Safe to call more than once."""
+        async with self._start_lock:
+            if self.started:
+                return
+            self._threads = ThreadPoolExecutor(max_workers=max(self.processes, 1), thread_name_prefix="conversion")
+            loop = asyncio.get_running_loop()
+            if self.processes <= 0:
+                from converter import warm_up
+                if self.startup_mode == "eager":
+                    await loop.run_in_executor(self._threads, warm_up)
+                elif self.startup_mode == "background":
+                    loop.run_in_executor(self._threads, warm_up)
+                logger.info(f"Running conversions in-process ({self.startup_mode} startup)")
+                return
+
+            self._context = multiprocessing.get_context(self.start_method)
+            self._idle = asyncio.Queue()
+            workers = [self._spawn() for _ in range(self.processes)]
+            for worker in workers:
+                self._idle.put_nowait(worker)
+            logger.info(f"Started {self.processes} conversion workers ({self.start_method}, {self.startup_mode} startup)")
+            if self.startup_mode == "eager":
+                await asyncio.gather(*(loop.run_in_executor(self._threads, self._watch_ready, worker) for worker in workers))
+
+    async def shutdown(self):
+        """Stop all worker processes."""
+        if not self.started:
+            return
+        workers = list(self._workers.values())
+        self._workers.clear()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._threads, worker.stop) for worker in workers))
+        self._threads.shutdown(wait=False)
+        self._threads = None
+        self._idle = None
+        logger.info("Conversion workers stopped")
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self._next_index, self.startup_mode)
+        self._next_index += 1
+        self._workers[worker.index] = worker
+        if self.startup_mode != "eager":
+            # Pick up the ready message as soon as it arrives so /ready reflects warm workers while idle
+            threading.Thread(target=self._watch_ready, args=(worker,), name=f"ready-watch-{worker.index}", daemon=True).start()
+        return worker
+
+    def _watch_ready(self, worker: _Worker):
+        try:
+            worker.wait_ready()
+        except ConversionError as e:
+            logger.warning(f"Conversion worker {worker.index} failed to start: {e}")
+
+    @property
+    def idle_workers(self) -> int:
+        """Number of worker processes waiting for a job."""
+        return self._idle.qsize() if self._idle is not None else 0
+
+    @property
+    def ready_workers(self) -> int:
+        """Number of worker processes that have finished starting up."""
+        with self._lock:
+            return sum(1 for worker in self._workers.values() if worker.ready)
+
+    def converter_status(self) -> Dict[str, str]:
+        """Report the load state of each converter across the pool.
+
+        A converter is "warm" once it is loaded in at least one ready worker (or in the
+        server process when running in-process), "unavailable" if its dependencies are
+        missing and "cold" otherwise.
+
+        Returns:
+            Mapping of converter class name to its state.
+        """
+        if self.processes <= 0:
+            from converter import converter_status
+            return converter_status()
+
+        with self._lock:
+            reports = [worker.converters for worker in self._workers.values() if worker.ready]
+        status: Dict[str, str] = {}
+        for report in reports:
+            for name, state in report.items():
+                if state == "warm" or name not in status:
+                    status[name] = state
+                elif state == "unavailable" and status[name] == "cold":
+                    status[name] = state
+        return status
+
+    def _replace(self, worker: _Worker, kill: bool) -> _Worker:
+        """Stop a worker and start a fresh one in its place.
+
+        If no process can be started, the stopped worker is returned instead: its next
+        job fails and the replacement is tried again, so the pool never shrinks.
+        """
+        with self._lock:
+            self._workers.pop(worker.index, None)
+        try:
+            worker.stop(kill=kill)
+        except Exception as e:
+            logger.warning(f"Stopping conversion worker {worker.index} failed: {e}")
+        try:
+            with self._lock:
+                return self._spawn()
+        except Exception as e:
+            logger.error(f"Starting a replacement for conversion worker {worker.index} failed: {e}")
+            worker.ready = False
+            return worker
+
+    def _dispatch(self, worker: _Worker, job: ConversionJob, on_segment: Optional[Callable[[Segment], None]] = None):
+        """Run a job on a worker from a pool thread, recycling the worker when needed.
+
+        Returns:
+            Tuple of ((status, payload), worker) where worker is the one to return to the pool.
+        """
+        try:
+            outcome = worker.run(job, self.timeout, on_segment)
+        except ConversionError as e:
+            logger.warning(f"Recycling conversion worker {worker.index}: {e}")
+            return ("failed", e), self._replace(worker, kill=True)
+        except Exception as e:
+            # E.g. an unpicklable job or a failing on_segment: the worker may be mid-job, so it is not reused
+            logger.error(f"Recycling conversion worker {worker.index} after an unexpected error: {e}")
+            return ("failed", ConversionError(f"Conversion failed: {e}", type(e).__name__)), self._replace(worker, kill=True)
+
+        if worker.jobs >= self.max_jobs_per_worker:
+            logger.info(f"Recycling conversion worker {worker.index} after {worker.jobs} jobs")
+            worker = self._replace(worker, kill=False)
+        return outcome, worker
+
+    def _release(self, worker: _Worker, future):
+        """Return the worker of a finished dispatch, or its replacement, to the idle queue."""
+        try:
+            _, worker = future.result()
+        except BaseException as e:
+            logger.error(f"Dispatch to conversion worker {worker.index} failed: {e!r}")
+        if self._idle is not None:
+            self._idle.put_nowait(worker)
+        else:
+            worker.stop()
+
+    async def run(self, job: ConversionJob, on_segment: Optional[Callable[[Segment], None]] = None) -> ConversionOutput:
+        """Run a conversion job without blocking the event loop.
+
+        Args:
+            job: The job to run.
+            on_segment: For streaming jobs, called from a pool thread with each segment.
+
+        Returns:
+            ConversionOutput: The converted Markdown and title.
+
+        Raises:
+            ValueError: If the job was rejected for invalid input.
+            ConversionTimeoutError: If the job exceeded the timeout.
+            ConversionError: If the conversion failed.
+        """
+        await self.start()
+        from docintel import docintel_service
+        from pdfpages import pdf_fanout
+        try:
+            if docintel_service.handles(job):
+                # Document Intelligence is awaited on the event loop, without holding a worker
+                output = await asyncio.wait_for(docintel_service.convert(job, on_segment), self.timeout)
+            elif pdf_fanout.handles(job) and self.processes > 1:
+                output = await pdf_fanout.convert(job, lambda range_job: self._run(range_job, None), self.idle_workers)
+            else:
+                output = await self._run(job, on_segment)
+        except asyncio.TimeoutError:
+            metrics.record_error(ConversionTimeoutError.__name__)
+            raise ConversionTimeoutError(f"Conversion timed out after {self.timeout} seconds")
+        except asyncio.CancelledError:
+            raise
+        except ConversionError as e:
+            metrics.record_error(e.error_type)
+            raise
+        except Exception as e:
+            metrics.record_error(type(e).__name__)
+            raise
+        for stage, seconds in output.timings.items():
+            metrics.record_stage(stage, seconds)
+        return output
+
+    async def _run(self, job: ConversionJob, on_segment: Optional[Callable[[Segment], None]]) -> ConversionOutput:
+        loop = asyncio.get_running_loop()
+
+        if self.processes <= 0:
+            from converter import run_job
+            self.running += 1
+            try:
+                return await asyncio.wait_for(loop.run_in_executor(self._threads, run_job, job, on_segment), self.timeout)
+            except asyncio.TimeoutError:
+                raise ConversionTimeoutError(f"Conversion timed out after {self.timeout} seconds")
+            finally:
+                self.running -= 1
+
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            future = loop.run_in_executor(self._threads, self._dispatch, worker, job, on_segment)
+            future.add_done_callback(functools.partial(self._release, worker))
+            # Shield the dispatch so a cancelled request still returns its worker to the pool
+            (status, payload), _ = await asyncio.shield(future)
+        finally:
+            self.running -= 1
+
+        if status == "failed":
+            raise payload
+        if status == "error":
+            error_type, message, is_value_error = payload
+            if is_value_error:
+                raise ValueError(message)
+            raise ConversionError(message, error_type)
+        return payload
+
+    async def stream(self, job: ConversionJob) -> AsyncIterator[Union[Segment, ConversionOutput]]:
+        """Run a streaming conversion job, yielding segments as the worker produces them.
+
+        Args:
+            job: The job to run; its stream flag is set automatically.
+
+        Yields:
+            Segment objects in document order, then the final ConversionOutput carrying the title.
+
+        Raises:
+            ValueError, ConversionTimeoutError, ConversionError: As for run().
+        """
+        job.stream = True
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def on_segment(segment: Segment):
+            loop.call_soon_threadsafe(queue.put_nowait, segment)
+
+        task = asyncio.ensure_future(self.run(job, on_segment))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                segment = await queue.get()
+                if segment is None:
+                    break
+                yield segment
+            yield task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+
+
+# Global conversion pool
+conversion_pool = ConversionPool(
+    processes=CONVERSION_WORKERS,
+    timeout=CONVERSION_TIMEOUT,
+    max_jobs_per_worker=CONVERSION_MAX_JOBS_PER_WORKER,
+    start_method=CONVERSION_START_METHOD,
+    startup_mode=STARTUP_MODE
+)
@@ -0,0 +1,356 @@
+"""Server-side fetching of URIs for conversion with a pooled HTTP client and conditional revalidation."""
+
+import asyncio
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from models import MarkDownConfig
+from executor import ConversionJob, ConversionOutput
+from cache import cache_key
+from uploads import SpooledUpload
+from conversion import resolve_extension, conversion_options, lookup_cached
+from constants import VERSION, UPLOAD_CHUNK_SIZE
+from config import (
+    FETCH_TIMEOUT, FETCH_CONNECT_TIMEOUT, FETCH_MAX_BYTES, FETCH_MAX_REDIRECTS, FETCH_MAX_CONNECTIONS,
+    FETCH_PER_HOST_CONNECTIONS, FETCH_CACHE_MAX_ENTRIES, FETCH_CACHE_MAX_BYTES
+)
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FETCHABLE_SCHEMES = ("http", "https")
+
+# Media types whose extension mimetypes does not guess usefully
+MEDIA_TYPE_EXTENSIONS = {
+    "application/xml": "xml",
+    "text/xml": "xml",
+    "application/rss+xml": "rss",
+    "application/atom+xml": "atom",
+}
+
+
+class FetchError(Exception):
+    """Raised when a URI cannot be fetched.
+
+    Attributes:
+        status_code: The HTTP status to answer the client with.
+    """
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class FetchedEntry:
+    """What is remembered about a fetched URI.
+
+    Attributes:
+        content_hash: SHA-256 of the body, used for the result cache key.
+        extension: The file extension derived from the media type or URL path.
+        etag: The ETag validator, if the server sent one.
+        last_modified: The Last-Modified validator, if the server sent one.
+        body: The body itself, when it was small enough to keep.
+    """
+    content_hash: str
+    extension: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    body: Optional[bytes] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.body) if self.body is not None else 0
+
+
+@dataclass
+class FetchResult:
+    """The outcome of a fetch.
+
+    Attributes:
+        entry: The entry describing the current representation.
+        upload: The freshly downloaded body; None when the server answered 304.
+        revalidated: True if a cached entry was confirmed with a 304.
+    """
+    entry: FetchedEntry
+    upload: Optional[SpooledUpload] = None
+    revalidated: bool = False
+
+    @property
+    def has_body(self) -> bool:
+        return self.upload is not None or self.entry.body is not None
+
+    def job_source(self) -> Tuple[Any, str]:
+        """Get the source and source type to hand to a conversion job."""
+        if self.upload is not None:
+            return self.upload.job_source()
+        return self.entry.body, "bytes"
+
+    def close(self):
+        """Release the downloaded body."""
+        if self.upload is not None:
+            self.upload.close()
+
+
+class FetchCache:
+    """Thread-safe LRU of fetched entries keyed by URI.
+
+    Validators are kept for up to max_entries URIs; bodies are kept alongside them as
+    long as their total size stays within max_bytes, so a 304 can be converted again
+    without a download when its result is no longer cached.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, FetchedEntry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, uri: str) -> Optional[FetchedEntry]:
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is not None:
+                self._entries.move_to_end(uri)
+            return entry
+
+    def put(self, uri: str, entry: FetchedEntry):
+        if self.max_entries <= 0:
+            return
+        if entry.size > self.max_bytes:
+            entry.body = None
+        with self._lock:
+            previous = self._entries.pop(uri, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[uri] = entry
+            self._size += entry.size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def discard(self, uri: str):
+        with self._lock:
+            entry = self._entries.pop(uri, None)
+            if entry is not None:
+                self._size -= entry.size
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def is_fetchable(uri: str) -> bool:
+    """Check whether a URI is fetched by the server rather than handed to MarkItDown."""
+    return urlparse(uri.strip()).scheme.lower() in FETCHABLE_SCHEMES
+
+
+def _extension(url: httpx.URL, content_type: Optional[str]) -> Optional[str]:
+    """Derive the file extension from the media type, falling back to the URL path."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in MEDIA_TYPE_EXTENSIONS:
+        return MEDIA_TYPE_EXTENSIONS[media_type]
+    if media_type and media_type != "application/octet-stream":
+        guessed = mimetypes.guess_extension(media_type)
+        if guessed:
+            return guessed.lstrip(".")
+    return resolve_extension(url.path)
+
+
+class UriFetcher:
+    """Fetches URIs through a pooled HTTP client, revalidating cached entries.
+
+    Bodies are streamed into a SpooledUpload and aborted once they exceed max_bytes.
+    When a URI was fetched before with an ETag or Last-Modified validator, the request
+    is made conditional; a 304 reuses the cached entry, so its content hash (and the
+    converted result cached under it) stays valid without a download.
+
+    At most max_connections fetches run at once overall, and at most
+    per_host_connections against any one host.
+    """
+
+    def __init__(self, timeout: float, connect_timeout: float, max_bytes: int, max_redirects: int, max_connections: int, per_host_connections: int, cache: FetchCache, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_bytes = max_bytes
+        self.max_redirects = max_redirects
+        self.max_connections = max_connections
+        self.per_host_connections = per_host_connections
+        self.cache = cache
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        # host -> [semaphore, number of fetches holding or waiting for it]
+        self._hosts: Dict[str, list] = {}
+
+    @asynccontextmanager
+    async def _host_slot(self, uri: str):
+        """Hold one of the connections allowed for the URI's host."""
+        if self.per_host_connections <= 0:
+            yield
+            return
+        host = (urlparse(uri.strip()).hostname or "").lower()
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = [asyncio.Semaphore(self.per_host_connections), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._hosts[host]
+
+    async def start(self):
+        """Create the pooled HTTP client. Safe to call more than once."""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            follow_redirects=True,
+            max_redirects=self.max_redirects,
+            headers={"User-Agent": f"AIKit-MarkItDown/{VERSION}"},
+            transport=self.transport
+        )
+
+    async def shutdown(self):
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, uri: str, conditional: bool = True) -> FetchResult:
+        """Fetch a URI, revalidating a cached entry when there is one.
+
+        Args:
+            uri: The http(s) URI.
+            conditional: Send the cached validators, if any; False forces a full download.
+
+        Returns:
+            FetchResult: The fetched or revalidated representation; the caller must close it.
+
+        Raises:
+            FetchError: 413 if the body exceeds max_bytes, 504 on timeouts, 502 for
+                connection errors and error responses from the remote server.
+        """
+        await self.start()
+        async with self._host_slot(uri):
+            return await self._fetch(uri, conditional)
+
+    async def _fetch(self, uri: str, conditional: bool) -> FetchResult:
+        cached = self.cache.get(uri) if conditional else None
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        upload = None
+        try:
+            async with self._client.stream("GET", uri, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    metrics.record_fetch("revalidated")
+                    return FetchResult(entry=cached, revalidated=True)
+                if response.status_code >= 400:
+                    raise FetchError(f"Fetching {uri} failed with HTTP {response.status_code}")
+
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                    raise FetchError(f"Remote resource too large. Maximum size is {self.max_bytes / (1024 * 1024)}MB.", 413)
+
+                extension = _extension(response.url, response.headers.get("content-type"))
+                upload = SpooledUpload(suffix=f".{extension}" if extension else None)
+                async for chunk in response.aiter_bytes(UPLOAD_CHUNK_SIZE):
+                    if upload.size + len(chunk) > self.max_bytes:
+                        raise FetchError(f"Remote resource too large. Maximum size is {self.max_bytes / (1024 * 1024)}MB.", 413)
+                    upload.write(chunk)
+                upload.finish()
+        except FetchError:
+            metrics.record_fetch("error")
+            if upload is not None:
+                upload.close()
+            raise
+        except httpx.TimeoutException:
+            metrics.record_fetch("error")
+            if upload is not None:
+                upload.close()
+            raise FetchError(f"Timed out fetching {uri}", 504)
+        except httpx.HTTPError as e:
+            metrics.record_fetch("error")
+            if upload is not None:
+                upload.close()
+            raise FetchError(f"Failed to fetch {uri}: {str(e)}")
+
+        metrics.record_fetch("fetched")
+        entry = FetchedEntry(
+            content_hash=upload.sha256,
+            extension=extension,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified")
+        )
+        # Only representations that can be revalidated are worth remembering
+        if (entry.etag or entry.last_modified) and "no-store" not in response.headers.get("cache-control", "").lower():
+            if not upload.on_disk:
+                entry.body = upload.job_source()[0]
+            self.cache.put(uri, entry)
+        else:
+            self.cache.discard(uri)
+        return FetchResult(entry=entry, upload=upload)
+
+
+# Global URI fetcher
+uri_fetcher = UriFetcher(
+    timeout=FETCH_TIMEOUT,
+    connect_timeout=FETCH_CONNECT_TIMEOUT,
+    max_bytes=FETCH_MAX_BYTES,
+    max_redirects=FETCH_MAX_REDIRECTS,
+    max_connections=FETCH_MAX_CONNECTIONS,
+    per_host_connections=FETCH_PER_HOST_CONNECTIONS,
+    cache=FetchCache(max_entries=FETCH_CACHE_MAX_ENTRIES, max_bytes=FETCH_CACHE_MAX_BYTES)
+)
+
+
+async def fetch_for_conversion(uri: str, config: Optional[MarkDownConfig]) -> Tuple[FetchResult, str, ConversionJob, Optional[ConversionOutput]]:
+    """Fetch a URI server-side and build the conversion job for its body.
+
+    A revalidated URI whose body was too large to keep is served from the result
+    cache if possible, and downloaded again otherwise.
+
+    Args:
+        uri: The http(s) URI.
+        config: The effective MarkDownConfig.
+
+    Returns:
+        Tuple of (fetch result, cache key, job, cached result or None if not looked up or missing).
+
+    Raises:
+        FetchError: If the URI cannot be fetched.
+    """
+    fetched = await uri_fetcher.fetch(uri)
+    cached = None
+    if not fetched.has_body:
+        cached = await lookup_cached(_fetched_key(fetched, uri, config))
+        if cached is None:
+            fetched = await uri_fetcher.fetch(uri, conditional=False)
+
+    file_extension = fetched.entry.extension
+    # The URL lets MarkItDown pick site-specific converters (e.g. Wikipedia, YouTube)
+    options = {**conversion_options(file_extension), "url": uri}
+    source, source_type = fetched.job_source()
+    job = ConversionJob(source=source, source_type=source_type, file_extension=file_extension, config=config, options=options)
+    return fetched, _fetched_key(fetched, uri, config), job, cached
+
+
+def _fetched_key(fetched: FetchResult, uri: str, config: Optional[MarkDownConfig]) -> str:
+    file_extension = fetched.entry.extension
+    return cache_key(fetched.entry.content_hash, file_extension, config, {**conversion_options(file_extension), "url": uri})
@@ -0,0 +1,377 @@
+"""Asynchronous conversion jobs: a bounded in-process queue and a pluggable result store."""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from executor import conversion_pool, ConversionJob, ConversionError
+from conversion import run_cached, uri_extension
+from admission import admission_controller
+from uploads import SpooledUpload
+from fetch import fetch_for_conversion, is_fetchable
+from config import JOB_CONCURRENCY, JOB_QUEUE_SIZE, JOB_RESULT_TTL, JOB_STORE, JOB_STORE_PATH, URI_FETCH
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+@dataclass
+class JobRecord:
+    """State and, once finished, result of one conversion job."""
+    id: str
+    status: str
+    source: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+    title: Optional[str] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    cache: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def status_payload(self, queue_position: Optional[int] = None) -> Dict[str, Any]:
+        """Build the status response for the job, without the result text.
+
+        Args:
+            queue_position: Number of jobs ahead of this one, for queued jobs.
+
+        Returns:
+            Dict describing the job state and timings.
+        """
+        now = time.time()
+        payload = asdict(self)
+        payload.pop("result")
+        if self.started_at is not None:
+            payload["elapsed_seconds"] = round((self.finished_at or now) - self.started_at, 3)
+        if queue_position is not None:
+            payload["queue_position"] = queue_position
+        if self.result is not None:
+            payload["result_size"] = len(self.result)
+        return payload
+
+
+class JobStore:
+    """Base class for finished-job stores. Implementations must be thread-safe."""
+
+    def save(self, record: JobRecord):
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        raise NotImplementedError
+
+    def purge_expired(self, now: float) -> int:
+        """Delete expired records and return how many were removed."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """Keeps finished jobs in process memory; they are lost on restart."""
+
+    def __init__(self):
+        self._records: "OrderedDict[str, JobRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, record: JobRecord):
+        with self._lock:
+            self._records[record.id] = record
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            return self._records.get(job_id)
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock:
+            expired = [job_id for job_id, record in self._records.items() if record.expires_at is not None and record.expires_at <= now]
+            for job_id in expired:
+                del self._records[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """Keeps finished jobs in a local SQLite database so results survive restarts."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+
+    def save(self, record: JobRecord):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, expires_at) VALUES (?, ?, ?)",
+                (record.id, json.dumps(asdict(record)), record.expires_at)
+            )
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return JobRecord(**json.loads(row[0]))
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_job_store(kind: str, path: Optional[str] = None) -> JobStore:
+    """Create the job store selected by configuration.
+
+    Args:
+        kind: "memory" or "sqlite".
+        path: Database path for the SQLite store.
+
+    Returns:
+        JobStore: The store.
+
+    Raises:
+        ValueError: If the store kind is unknown.
+    """
+    kind = (kind or "memory").lower()
+    if kind == "memory":
+        return MemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore(path or "jobs.db")
+    raise ValueError(f"Unknown job store: {kind}. Expected 'memory' or 'sqlite'.")
+
+
+@dataclass
+class _QueuedJob:
+    record: JobRecord
+    job: ConversionJob
+    cache_key: Optional[str] = None
+    upload: Optional[SpooledUpload] = None
+
+
+class JobManager:
+    """Runs submitted conversion jobs in the background with bounded concurrency.
+
+    Jobs wait in a bounded queue and are picked up by a fixed number of runner tasks,
+    which hand them to the conversion pool. Queued and running jobs are tracked in
+    memory; finished jobs are written to the store and expire after the TTL.
+    """
+
+    def __init__(self, store_kind: str, store_path: Optional[str], concurrency: int, queue_size: int, ttl: float):
+        self.store_kind = store_kind
+        self.store_path = store_path
+        self.store: Optional[JobStore] = None
+        self.concurrency = max(concurrency, 1)
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self._queue: Optional[asyncio.Queue] = None
+        self._active: Dict[str, _QueuedJob] = {}
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+        self._tasks = []
+        self._average_duration = 10.0
+
+    @property
+    def started(self) -> bool:
+        return self._queue is not None
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for a runner."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        """Start the runner tasks and the periodic purge of expired jobs."""
+        if self.started:
+            return
+        self.store = await run_in_threadpool(create_job_store, self.store_kind, self.store_path)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._runner()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._purger()))
+        logger.info(f"Job manager started with concurrency {self.concurrency}, queue size {self.queue_size} and {self.store_kind} store")
+
+    async def shutdown(self):
+        """Stop the runners; jobs still queued or running are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for queued in self._active.values():
+            if queued.upload is not None:
+                queued.upload.close()
+        self._active.clear()
+        self._order.clear()
+        self._queue = None
+        if self.store is not None:
+            await run_in_threadpool(self.store.close)
+            self.store = None
+
+    def retry_after(self) -> int:
+        """Estimate the seconds until a queue slot frees up."""
+        return max(1, math.ceil(self._average_duration / self.concurrency))
+
+    def submit(self, source: str, job: ConversionJob, cache_key: Optional[str] = None, upload: Optional[SpooledUpload] = None) -> JobRecord:
+        """Queue a conversion job.
+
+        Args:
+            source: The file name or URI, reported back in the job status.
+            job: The conversion job.
+            cache_key: Optional result cache key for the job.
+            upload: Optional spooled upload backing the job; the manager closes it once the job ends.
+
+        Returns:
+            JobRecord: The queued job.
+
+        Raises:
+            JobQueueFullError: If the queue is full.
+        """
+        if not self.started:
+            raise RuntimeError("Job manager is not running")
+        record = JobRecord(id=uuid.uuid4().hex, status=QUEUED, source=source, created_at=time.time())
+        queued = _QueuedJob(record=record, job=job, cache_key=cache_key, upload=upload)
+        try:
+            self._queue.put_nowait(queued)
+        except asyncio.QueueFull:
+            raise JobQueueFullError(self.retry_after())
+        self._active[record.id] = queued
+        self._order[record.id] = None
+        logger.info(f"Queued job {record.id} for {source}")
+        return record
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        """Look up a job, whether active or finished and not yet expired."""
+        queued = self._active.get(job_id)
+        if queued is not None:
+            return queued.record
+        record = await run_in_threadpool(self.store.get, job_id)
+        if record is None or (record.expires_at is not None and record.expires_at <= time.time()):
+            return None
+        return record
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Number of queued jobs ahead of a queued job, or None if it is not queued."""
+        queued = self._active.get(job_id)
+        if queued is None or queued.record.status != QUEUED:
+            return None
+        position = 0
+        for other_id in self._order:
+            if other_id == job_id:
+                return position
+            if self._active[other_id].record.status == QUEUED:
+                position += 1
+        return None
+
+    async def _runner(self):
+        while True:
+            queued = await self._queue.get()
+            try:
+                await self._run(queued)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, queued: _QueuedJob):
+        record = queued.record
+        record.status = RUNNING
+        record.started_at = time.time()
+        try:
+            # Jobs wait for admission instead of failing; the job queue already bounds them
+            if queued.cache_key is not None:
+                result, cache_hit = await run_cached(queued.cache_key, queued.job, wait=True)
+                record.cache = "HIT" if cache_hit else "MISS"
+            elif URI_FETCH and is_fetchable(queued.job.source):
+                result, cache_hit = await self._run_fetched(queued.job)
+                record.cache = "HIT" if cache_hit else "MISS"
+            else:
+                async with admission_controller.slot(uri_extension(queued.job.source), wait=True):
+                    result = await conversion_pool.run(queued.job)
+            record.result = result.text_content
+            record.title = result.title
+            record.status = SUCCEEDED
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {record.id} failed: {str(e)}")
+            record.error = str(e)
+            record.error_type = e.error_type if isinstance(e, ConversionError) and e.error_type else type(e).__name__
+            record.status = FAILED
+        finally:
+            if queued.upload is not None:
+                queued.upload.close()
+
+        record.finished_at = time.time()
+        record.expires_at = record.finished_at + self.ttl
+        self._average_duration = 0.8 * self._average_duration + 0.2 * (record.finished_at - record.started_at)
+        try:
+            await run_in_threadpool(self.store.save, record)
+        except Exception as e:
+            logger.error(f"Failed to store job {record.id}: {str(e)}")
+        finally:
+            self._active.pop(record.id, None)
+            self._order.pop(record.id, None)
+        logger.info(f"Job {record.id} {record.status} in {record.finished_at - record.started_at:.2f}s")
+
+    async def _run_fetched(self, job: ConversionJob):
+        """Fetch a URI job's target server-side, the way /convert_uri does, and convert it."""
+        fetched, key, fetched_job, cached = await fetch_for_conversion(job.source, job.config)
+        try:
+            if cached is not None:
+                return cached, True
+            return await run_cached(key, fetched_job, wait=True)
+        finally:
+            fetched.close()
+
+    async def _purger(self):
+        interval = min(max(self.ttl / 10, 1), 60)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                purged = await run_in_threadpool(self.store.purge_expired, time.time())
+                if purged:
+                    logger.info(f"Purged {purged} expired jobs")
+            except Exception as e:
+                logger.warning(f"Failed to purge expired jobs: {str(e)}")
+
+
+# Global job manager
+job_manager = JobManager(
+    store_kind=JOB_STORE,
+    store_path=JOB_STORE_PATH,
+    concurrency=JOB_CONCURRENCY,
+    queue_size=JOB_QUEUE_SIZE,
+    ttl=JOB_RESULT_TTL
+)
@@ -1,14 +1,28 @@
 """Main FastAPI application for the MarkItDown server."""
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 import logging
 import sys
 import threading
+import time
 
 from routes.convert import router
 from routes.convert_uri import router as uri_router
-from constants import VERSION
+from routes.convert_batch import router as batch_router
+from routes.jobs import router as jobs_router
+from constants import VERSION, MAX_FILE_SIZE, MULTIPART_OVERHEAD
+from config import default_config, STARTUP_MODE, READY_FORMATS, COMPRESSION_ENCODINGS, COMPRESSION_MIN_SIZE
+from executor import conversion_pool
+from jobs import job_manager
+from fetch import uri_fetcher
+from docintel import docintel_service
+from admission import admission_controller
+from uploads import RequestSizeLimitMiddleware, RequestDecompressionMiddleware
+from compression import CompressionMiddleware
+import metrics
 
 
 def custom_sys_excepthook(exc_type, exc_value, exc_traceback):
@@ -40,10 +54,31 @@ def custom_threading_excepthook(args):
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan handler.
+
+    Starts the conversion worker pool, the URI fetcher, the Document Intelligence client and the job manager on startup and stops them on shutdown.
+
+    Args:
+        app: The FastAPI application.
+    """
+    await conversion_pool.start()
+    await uri_fetcher.start()
+    await docintel_service.start()
+    await job_manager.start()
+    yield
+    await job_manager.shutdown()
+    await docintel_service.shutdown()
+    await uri_fetcher.shutdown()
+    await conversion_pool.shutdown()
+
+
 app = FastAPI(
     title="AIKit MarkItDown API",
     description="API for converting various file formats to Markdown using the MarkItDown library",
-    version=VERSION
+    version=VERSION,
+    lifespan=lifespan
 )
 
 
@@ -89,6 +124,54 @@ async def exception_handling_middleware(request: Request, call_next):
         )
 
 
+async def metrics_middleware(request: Request, call_next):
+    """Middleware that records request latency, body sizes and per-stage timings.
+
+    Stage timings collected by the routes and the conversion pool while handling the
+    request are emitted once the response body has been sent, labelled with the file
+    extension and converter of the request.
+
+    Args:
+        request: The incoming request.
+        call_next: The next middleware or endpoint handler.
+
+    Returns:
+        Response: The response from the next handler, with its body instrumented.
+    """
+    started = time.perf_counter()
+    request_metrics = metrics.begin_request()
+    response = await call_next(request)
+    handled = time.perf_counter()
+
+    endpoint = request.scope.get("endpoint")
+    route = next((r.path for r in request.app.routes if endpoint is not None and getattr(r, "endpoint", None) is endpoint), "unmatched")
+    bytes_in = int(request.headers.get("content-length") or 0)
+    body_iterator = response.body_iterator
+
+    async def instrumented_body():
+        bytes_out = 0
+        try:
+            async for chunk in body_iterator:
+                bytes_out += len(chunk)
+                yield chunk
+        finally:
+            finished = time.perf_counter()
+            request_metrics.stages["serialization"] = finished - handled
+            metrics.finish_request(request_metrics, route, request.method, response.status_code, bytes_in, bytes_out, finished - started)
+
+    response.body_iterator = instrumented_body()
+    return response
+
+
+async def prometheus_metrics():
+    """Prometheus metrics endpoint.
+
+    Returns:
+        Response: The metrics in the Prometheus text exposition format.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 async def root():
     """Root endpoint that returns a welcome message.
 
@@ -106,8 +189,53 @@ async def health():
     """
     return {"status": "healthy", "version": VERSION}
 
+
+async def ready():
+    """Readiness endpoint.
+
+    Reports which converters are warm. Returns 503 until at least one conversion
+    worker has started and the converters for every format in READY_FORMATS are warm,
+    so orchestrators can hold back traffic while converters load.
+
+    Returns:
+        JSONResponse: The readiness status, worker counts and converter states.
+    """
+    converters = conversion_pool.converter_status()
+    missing = [fmt for fmt in READY_FORMATS if converters.get(metrics.converter_name(fmt, default_config)) != "warm"]
+    workers_ready = conversion_pool.processes <= 0 or conversion_pool.ready_workers > 0
+    is_ready = conversion_pool.started and workers_ready and not missing
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "starting",
+            "version": VERSION,
+            "startup_mode": STARTUP_MODE,
+            "workers": {"ready": conversion_pool.ready_workers, "total": conversion_pool.processes},
+            "converters": converters,
+            "missing_formats": missing
+        }
+    )
+
+# Request bodies are decompressed innermost, after the size limit has checked the bytes on the wire
+app.add_middleware(RequestDecompressionMiddleware, max_body_size=MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+# Innermost, so the metrics middleware counts compressed bytes
+app.add_middleware(CompressionMiddleware, encodings=COMPRESSION_ENCODINGS, minimum_size=COMPRESSION_MIN_SIZE)
+app.middleware("http")(exception_handling_middleware)
+app.middleware("http")(metrics_middleware)
+app.add_middleware(RequestSizeLimitMiddleware, max_body_size=MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+
+metrics.track_queue("conversion", lambda: conversion_pool.waiting)
+metrics.track_queue("jobs", lambda: job_manager.queued)
+metrics.track_in_flight(lambda: conversion_pool.running)
+for conversion_class in admission_controller.classes:
+    metrics.track_queue(f"admission_{conversion_class}", lambda name=conversion_class: admission_controller.waiting(name))
+
 app.include_router(router)
 app.include_router(uri_router)
+app.include_router(batch_router)
+app.include_router(jobs_router)
 
 app.add_api_route("/", root, methods=["GET"])
 app.add_api_route("/health", health, methods=["GET"])
+app.add_api_route("/ready", ready, methods=["GET"])
+app.add_api_route("/metrics", prometheus_metrics, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,222 @@
+"""Prometheus metrics and per-request stage timings for the conversion path."""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from models import MarkDownConfig
+from constants import DOCINTEL_EXTENSIONS
+
+# Buckets sized for conversions that take from milliseconds up to the conversion timeout
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Converter that MarkItDown picks for each extension; unknown extensions are reported as "other"
+CONVERTERS = {
+    "pdf": "PdfConverter",
+    "docx": "DocxConverter",
+    "xlsx": "XlsxConverter",
+    "xls": "XlsConverter",
+    "pptx": "PptxConverter",
+    "html": "HtmlConverter",
+    "htm": "HtmlConverter",
+    "csv": "CsvConverter",
+    "txt": "PlainTextConverter",
+    "md": "PlainTextConverter",
+    "json": "PlainTextConverter",
+    "ipynb": "IpynbConverter",
+    "epub": "EpubConverter",
+    "msg": "OutlookMsgConverter",
+    "xml": "RssConverter",
+    "rss": "RssConverter",
+    "atom": "RssConverter",
+    "zip": "ZipConverter",
+    "jpg": "ImageConverter",
+    "jpeg": "ImageConverter",
+    "png": "ImageConverter",
+    "wav": "AudioConverter",
+    "mp3": "AudioConverter",
+    "m4a": "AudioConverter",
+    "mp4": "AudioConverter",
+}
+
+REQUEST_LATENCY = Histogram(
+    "markitdown_request_duration_seconds",
+    "HTTP request latency, including streaming the response body.",
+    ["route", "method", "status", "extension", "converter"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "markitdown_stage_duration_seconds",
+    "Time spent in each stage of the conversion path.",
+    ["stage", "extension", "converter"],
+    buckets=LATENCY_BUCKETS
+)
+BYTES_IN = Counter("markitdown_request_bytes_total", "Request body bytes received.", ["route"])
+BYTES_OUT = Counter("markitdown_response_bytes_total", "Response body bytes sent.", ["route"])
+CONVERSION_ERRORS = Counter("markitdown_conversion_errors_total", "Failed conversions by exception type.", ["error_type"])
+CACHE_REQUESTS = Counter("markitdown_cache_requests_total", "Result cache lookups.", ["result"])
+QUEUE_DEPTH = Gauge("markitdown_queue_depth", "Conversions waiting to start.", ["queue"])
+IN_FLIGHT = Gauge("markitdown_conversions_in_flight", "Conversions currently running.")
+ADMISSION_REJECTIONS = Counter("markitdown_admission_rejections_total", "Conversions rejected with 503 by conversion class.", ["conversion_class"])
+DOCINTEL_RETRIES = Counter("markitdown_docintel_retries_total", "Retried Document Intelligence requests by response status (or transport).", ["status"])
+FETCH_REQUESTS = Counter("markitdown_fetch_requests_total", "Server-side URI fetches by outcome (fetched, revalidated, error).", ["result"])
+COALESCED = Counter("markitdown_coalesced_conversions_total", "Conversions that joined an identical conversion already running.")
+CACHE_HIT_RATIO = Gauge("markitdown_cache_hit_ratio", "Share of result cache lookups that were hits since startup.")
+
+
+@dataclass
+class RequestMetrics:
+    """Labels and stage timings collected while one request is handled."""
+    extension: str = ""
+    converter: str = ""
+    stages: Dict[str, float] = field(default_factory=dict)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def converter_name(file_extension: Optional[str], config: Optional[MarkDownConfig] = None) -> str:
+    """Name the converter used for an extension, as a bounded metric label.
+
+    Args:
+        file_extension: The file extension, without the leading dot.
+        config: The effective config; Document Intelligence takes over supported formats when configured.
+
+    Returns:
+        The converter class name, or "other".
+    """
+    extension = (file_extension or "").lower().lstrip(".")
+    if config is not None and config.docintel_endpoint and extension in DOCINTEL_EXTENSIONS:
+        return "DocumentIntelligenceConverter"
+    return CONVERTERS.get(extension, "other")
+
+
+def begin_request() -> RequestMetrics:
+    """Start collecting metrics for the current request."""
+    request_metrics = RequestMetrics()
+    _current.set(request_metrics)
+    return request_metrics
+
+
+def set_labels(file_extension: Optional[str], config: Optional[MarkDownConfig] = None):
+    """Attach the file extension and converter to the current request's metrics.
+
+    Args:
+        file_extension: The file extension, without the leading dot.
+        config: The effective config for the conversion.
+    """
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return
+    extension = (file_extension or "").lower().lstrip(".")
+    request_metrics.extension = extension if extension in CONVERTERS else ("other" if extension else "")
+    request_metrics.converter = converter_name(file_extension, config)
+
+
+def record_stage(stage: str, seconds: float):
+    """Record time spent in a stage.
+
+    Inside a request the timing is kept until the request finishes, so it is emitted
+    with the request's labels; outside a request (background jobs) it is observed directly.
+
+    Args:
+        stage: The stage name.
+        seconds: The time spent.
+    """
+    request_metrics = _current.get()
+    if request_metrics is None:
+        STAGE_LATENCY.labels(stage, "", "").observe(seconds)
+        return
+    request_metrics.stages[stage] = request_metrics.stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as a stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def finish_request(request_metrics: RequestMetrics, route: str, method: str, status: int, bytes_in: int, bytes_out: int, duration: float):
+    """Emit the metrics collected for a finished request.
+
+    Args:
+        request_metrics: The metrics returned by begin_request().
+        route: The route path template.
+        method: The HTTP method.
+        status: The response status code.
+        bytes_in: Request body size.
+        bytes_out: Response body size.
+        duration: Total request time in seconds.
+    """
+    extension, converter = request_metrics.extension, request_metrics.converter
+    REQUEST_LATENCY.labels(route, method, str(status), extension, converter).observe(duration)
+    for name, seconds in request_metrics.stages.items():
+        STAGE_LATENCY.labels(name, extension, converter).observe(seconds)
+    BYTES_IN.labels(route).inc(bytes_in)
+    BYTES_OUT.labels(route).inc(bytes_out)
+
+
+def record_error(error_type: str):
+    """Count a failed conversion by exception type."""
+    CONVERSION_ERRORS.labels(error_type).inc()
+
+
+def record_rejection(conversion_class: str):
+    """Count a conversion rejected by admission control."""
+    ADMISSION_REJECTIONS.labels(conversion_class).inc()
+
+
+def record_coalesced():
+    """Count a conversion that joined an identical running one."""
+    COALESCED.inc()
+
+
+def record_fetch(result: str):
+    """Count a server-side URI fetch by outcome."""
+    FETCH_REQUESTS.labels(result).inc()
+
+
+def record_docintel_retry(status):
+    """Count a retried Document Intelligence request."""
+    DOCINTEL_RETRIES.labels(str(status)).inc()
+
+
+_cache_lookups = {"hit": 0, "miss": 0}
+
+
+def record_cache(hit: bool):
+    """Count a result cache lookup."""
+    result = "hit" if hit else "miss"
+    _cache_lookups[result] += 1
+    CACHE_REQUESTS.labels(result).inc()
+
+
+def _cache_hit_ratio() -> float:
+    total = _cache_lookups["hit"] + _cache_lookups["miss"]
+    return _cache_lookups["hit"] / total if total else 0.0
+
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratio)
+
+
+def track_queue(name: str, depth: Callable[[], float]):
+    """Report the depth of a queue, read when metrics are scraped.
+
+    Args:
+        name: The queue label (e.g. "conversion", "jobs").
+        depth: Callable returning the current number of waiting items.
+    """
+    QUEUE_DEPTH.labels(name).set_function(depth)
+
+
+def track_in_flight(count: Callable[[], float]):
+    """Report the number of running conversions, read when metrics are scraped."""
+    IN_FLIGHT.set_function(count)
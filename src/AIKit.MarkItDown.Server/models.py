@@ -22,7 +22,29 @@ class MarkDownResult(BaseModel):
     metadata: Dict[str, Any] = {}
 
 
+class MarkDownChunk(BaseModel):
+    """A chunk of converted Markdown, for retrieval and embedding pipelines."""
+    index: int
+    text: str
+    heading_path: List[str] = []
+    origin: Dict[str, Any] = {}
+    start: int
+    end: int
+    tokens: int
+
+
+class ChunkedMarkDownResult(MarkDownResult):
+    """Result model for Markdown conversion output split into chunks."""
+    chunks: List[MarkDownChunk] = []
+
+
 class ConvertUriRequest(BaseModel):
     """Request model for URI conversion."""
     uri: str
-    config: Optional[MarkDownConfig] = None
\ No newline at end of file
+    config: Optional[MarkDownConfig] = None
+
+
+class ConvertUriBatchRequest(BaseModel):
+    """Request model for batch URI conversion."""
+    uris: List[str]
+    config: Optional[MarkDownConfig] = None
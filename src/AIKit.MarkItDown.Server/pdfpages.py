@@ -0,0 +1,210 @@
+"""Page-parallel PDF conversion: large PDFs are split into page ranges converted on separate workers."""
+
+import asyncio
+import io
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, BinaryIO, Callable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from executor import ConversionJob, ConversionOutput
+from config import PDF_FANOUT, PDF_FANOUT_MIN_PAGES
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PdfRangeOutput(ConversionOutput):
+    """The extraction of one page range, as returned by a worker.
+
+    MarkItDown's PdfConverter renders every page with pdfplumber and, if no page of the
+    whole document holds form-style content, replaces that with pdfminer's text of the
+    document. A range therefore reports both, and the pages are reassembled once every
+    range is known.
+
+    Attributes:
+        text_content: The pdfplumber rendering of the range's pages, joined by blank lines.
+        has_forms: Whether any page of the range holds form-style content.
+        plain_text: pdfminer's text of the range if it has no form pages, else None.
+        failed: Whether extraction raised, in which case MarkItDown falls back to pdfminer
+            for the whole document.
+    """
+    has_forms: bool = False
+    plain_text: Optional[str] = None
+    failed: bool = False
+
+
+def pdf_page_count(stream: BinaryIO) -> Optional[int]:
+    """Read the page count from a PDF's page tree without parsing its pages.
+
+    Returns:
+        The page count, or None if it cannot be read.
+    """
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    try:
+        document = PDFDocument(PDFParser(stream))
+        return int(resolve1(resolve1(document.catalog["Pages"])["Count"]))
+    except Exception as e:
+        logger.warning(f"Could not read the PDF page count: {str(e)}")
+        return None
+
+
+def page_ranges(page_count: int, fanout: int) -> List[Tuple[int, int]]:
+    """Split pages 1..page_count into at most fanout contiguous, near-equal ranges.
+
+    Returns:
+        Inclusive (first, last) page numbers, in page order.
+    """
+    fanout = max(min(fanout, page_count), 1)
+    size, extra = divmod(page_count, fanout)
+    ranges, first = [], 1
+    for index in range(fanout):
+        last = first + size - 1 + (1 if index < extra else 0)
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+
+def convert_page_range(job: ConversionJob) -> PdfRangeOutput:
+    """Extract one page range of a PDF the way MarkItDown's PdfConverter extracts pages.
+
+    Runs inside a conversion worker.
+
+    Args:
+        job: A job whose page_range is set; its source is PDF bytes or a path.
+
+    Returns:
+        PdfRangeOutput: The range's pdfplumber and, if needed, pdfminer text.
+    """
+    import pdfminer.high_level
+    import pdfplumber
+    from markitdown.converters._pdf_converter import _extract_form_content_from_words
+
+    first, last = job.page_range
+    started = time.perf_counter()
+    stream = io.BytesIO(job.source) if job.source_type == "bytes" else open(job.source, "rb")
+    with stream:
+        chunks: List[str] = []
+        has_forms = False
+        try:
+            with pdfplumber.open(stream, pages=list(range(first, last + 1))) as pdf:
+                for page in pdf.pages:
+                    try:
+                        content = _extract_form_content_from_words(page)
+                        if content is not None:
+                            has_forms = True
+                            if content.strip():
+                                chunks.append(content)
+                        else:
+                            text = page.extract_text()
+                            if text and text.strip():
+                                chunks.append(text.strip())
+                    finally:
+                        page.close()
+        except Exception as e:
+            logger.warning(f"Extracting pages {first}-{last} failed: {str(e)}")
+            return PdfRangeOutput(text_content="", failed=True)
+
+        plain_text = None
+        if not has_forms:
+            stream.seek(0)
+            plain_text = pdfminer.high_level.extract_text(stream, page_numbers=set(range(first - 1, last)))
+    return PdfRangeOutput(
+        text_content="\n\n".join(chunks),
+        has_forms=has_forms,
+        plain_text=plain_text,
+        timings={"conversion": time.perf_counter() - started}
+    )
+
+
+def assemble_ranges(parts: List[PdfRangeOutput]) -> Optional[str]:
+    """Reassemble page ranges into the Markdown MarkItDown produces for the whole document.
+
+    Returns:
+        The Markdown, or None if MarkItDown would have fallen back to a whole-document
+        pdfminer pass (an extraction failure or an empty result).
+    """
+    from markitdown.converters._pdf_converter import _merge_partial_numbering_lines
+    from segments import _normalize_markdown
+
+    if any(part.failed for part in parts):
+        return None
+    if any(part.has_forms for part in parts):
+        markdown = "\n\n".join(part.text_content for part in parts if part.text_content).strip()
+    else:
+        markdown = "".join(part.plain_text or "" for part in parts)
+    if not markdown:
+        return None
+    return _normalize_markdown(_merge_partial_numbering_lines(markdown))
+
+
+class PdfFanout:
+    """Converts large PDFs as page ranges on several conversion workers at once.
+
+    A PDF with at least min_pages pages is split into up to fanout ranges, never more
+    than the workers idle at the time, which are extracted in parallel and stitched
+    back in page order into the same Markdown as a single-worker conversion. Smaller
+    PDFs, streaming and partial conversions, and documents that need MarkItDown's
+    fallback extraction are converted by one worker as usual.
+    """
+
+    def __init__(self, fanout: int, min_pages: int):
+        self.fanout = fanout
+        self.min_pages = min_pages
+
+    def handles(self, job: ConversionJob) -> bool:
+        """Whether a job may be split into page ranges."""
+        return (
+            self.fanout > 1
+            and job.page_range is None
+            and not job.stream
+            and job.selection is None
+            and job.source_type in ("bytes", "path")
+            and (job.file_extension or "").lower().lstrip(".") == "pdf"
+            and not (job.config is not None and job.config.docintel_endpoint)
+        )
+
+    async def convert(self, job: ConversionJob, run: Callable[[ConversionJob], Awaitable[ConversionOutput]], idle_workers: int) -> ConversionOutput:
+        """Convert a PDF, across page ranges when it is large enough.
+
+        Args:
+            job: A job for which handles() is True.
+            run: Runs a single job on a worker.
+            idle_workers: Workers currently free to take a range.
+
+        Returns:
+            ConversionOutput: The converted Markdown.
+        """
+        fanout = min(self.fanout, idle_workers)
+        page_count = await run_in_threadpool(_source_page_count, job) if fanout > 1 else None
+        if not page_count or page_count < max(self.min_pages, 2):
+            return await run(job)
+
+        ranges = page_ranges(page_count, fanout)
+        logger.info(f"Converting {page_count} PDF pages as {len(ranges)} parallel page ranges")
+        started = time.perf_counter()
+        jobs = [ConversionJob(source=job.source, source_type=job.source_type, file_extension=job.file_extension, config=job.config, options=job.options, page_range=pages) for pages in ranges]
+        parts = await asyncio.gather(*(run(range_job) for range_job in jobs))
+        markdown = await run_in_threadpool(assemble_ranges, parts)
+        metrics.record_stage("pdf_fanout", time.perf_counter() - started)
+        if markdown is None:
+            logger.info("Page ranges need MarkItDown's fallback extraction, converting the whole PDF")
+            return await run(job)
+        return ConversionOutput(text_content=markdown)
+
+
+def _source_page_count(job: ConversionJob) -> Optional[int]:
+    if job.source_type == "bytes":
+        return pdf_page_count(io.BytesIO(job.source))
+    with open(job.source, "rb") as f:
+        return pdf_page_count(f)
+
+
+# Global page-parallel PDF converter
+pdf_fanout = PdfFanout(fanout=PDF_FANOUT, min_pages=PDF_FANOUT_MIN_PAGES)
@@ -1,17 +1,25 @@
 """Route for file conversion endpoint."""
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Header, Query
 from fastapi.responses import Response
-import io
+from starlette.concurrency import run_in_threadpool
 import logging
-import json
-from models import MarkDownConfig
-from typing import Optional
-from utils import build_conversion_kwargs, merge_configs
-from config import default_config
-from converter import md
+from typing import Any, Dict, List, Optional, Tuple
+from utils import validate_config, merge_configs, parse_config
+from config import default_config, BATCH_MAX_FILES, BATCH_MAX_ARCHIVE_BYTES
+from executor import conversion_pool, ConversionJob, ConversionOutput, ConversionTimeoutError, Segment
+from cache import cache_key, etag_matches
+from conversion import resolve_extension, conversion_options, run_cached, lookup_cached, stream_mode, cached_events, admitted_events, streaming_response, result_format, result_response
+from admission import AdmissionRejectedError
+import metrics
 from constants import MAX_FILE_SIZE
 from auth import get_api_key
+from uploads import spool_upload
+from archives import ARCHIVE_EXTENSIONS, archive_kind, iter_archive_members
+from routes.convert_batch import archive_events
+from selection import parse_selection
+from chunking import MarkdownChunker, chunk_settings, chunk_document
+from models import MarkDownResult, ChunkedMarkDownResult
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,6 +32,17 @@ async def convert_file(
     file: UploadFile = File(...),
     extension: str = Form(None),
     config: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
+    slides: Optional[str] = Form(None),
+    sheets: Optional[str] = Form(None),
+    max_chars: Optional[int] = Form(None),
+    max_rows: Optional[int] = Form(None),
+    stream: bool = Query(False),
+    output: str = Query("markdown"),
+    chunk_tokens: Optional[int] = Query(None),
+    chunk_overlap: Optional[int] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
     api_key: str = Depends(get_api_key)
 ):
     """Convert an uploaded file to Markdown format.
@@ -32,61 +51,169 @@ async def convert_file(
         file: The file to convert.
         extension: Optional file extension override.
         config: Optional JSON string configuration for the conversion (overrides defaults from .env).
+        pages: Optional PDF page ranges to convert, e.g. "1-5" or "1,3,10-".
+        slides: Optional PPTX slide ranges to convert.
+        sheets: Optional comma-separated XLSX sheet names to convert.
+        max_chars: Optional cap on the Markdown produced; conversion stops once it is reached.
+        max_rows: Optional cap on the data rows converted per XLSX sheet or CSV file.
+        stream: Stream the Markdown with chunked transfer encoding as pages, sheets or slides are converted.
+        output: "markdown" for the Markdown document, or "chunks" for a JSON result split into
+            heading- and size-bounded chunks; streamed, chunks are sent as NDJSON "chunk" events.
+        chunk_tokens: Approximate maximum tokens per chunk (defaults to CHUNK_TOKENS).
+        chunk_overlap: Approximate tokens shared by consecutive chunks (defaults to CHUNK_OVERLAP).
+        if_none_match: Optional ETag from a previous response; returns 304 if it still matches.
+        accept: Accept header; "application/x-ndjson" streams segment events ending with a "done"
+            event that carries the title and metadata. "application/json" or "application/msgpack"
+            returns a MarkDownResult envelope instead of bare Markdown.
 
     Returns:
-        Markdown content as plain text response.
+        Markdown content as plain text or a MarkDownResult envelope with ETag and X-Cache headers,
+        a ChunkedMarkDownResult, or a streaming response.
 
     Raises:
-        HTTPException: For validation errors or conversion failures.
+        HTTPException: For validation errors or conversion failures, or 503 with Retry-After
+            when conversions of this file's class are saturated.
     """
     logger.info(f"Convert endpoint called with file: {file.filename}, extension: {extension}")
     if not file.filename:
         logger.warning("No file provided in convert request")
         raise HTTPException(status_code=400, detail="No file provided")
 
+    upload = None
     try:
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
-        logger.info(f"File size: {file_size_mb:.2f} MB")
-        if len(content) > MAX_FILE_SIZE:
-            logger.warning(f"File too large: {file_size_mb:.2f} MB")
-            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024)}MB.")
-
-        file_extension = extension or (file.filename.split('.')[-1].lower() if '.' in file.filename else None)
+        file_extension = resolve_extension(file.filename, extension)
         logger.info(f"File extension: {file_extension}")
 
-        # Parse config if provided
-        config_obj = None
-        if config:
+        # Partial conversions and chunking are validated before the upload is read
+        selection = parse_selection(file_extension, pages, slides, sheets, max_chars, max_rows)
+        if output not in ("markdown", "chunks"):
+            raise ValueError(f"Unsupported output '{output}'. Use 'markdown' or 'chunks'.")
+        chunking = chunk_settings(chunk_tokens, chunk_overlap) if output == "chunks" else None
+        fmt = result_format(accept)
+        if chunking and fmt == "markdown":
+            fmt = "json"
+
+        metrics.set_labels(file_extension)
+
+        # Read the upload in chunks, aborting as soon as it exceeds the limit and spilling large files to disk
+        with metrics.stage("upload_read"):
+            upload = await spool_upload(file, MAX_FILE_SIZE, suffix=f".{file_extension}" if file_extension else None)
+        logger.info(f"File size: {upload.size / (1024 * 1024):.2f} MB")
+
+        with metrics.stage("config_merge"):
+            # Parse config if provided
             try:
-                config_dict = json.loads(config)
-                if config_dict is not None:
-                    config_obj = MarkDownConfig(**config_dict)
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=422, detail="Invalid JSON in config field")
-            except Exception as e:
-                raise HTTPException(status_code=422, detail=f"Invalid config: {str(e)}")
-
-        # Merge default config with request config
-        effective_config = merge_configs(default_config, config_obj)
-
-        # Use BytesIO for stream
-        stream = io.BytesIO(content)
-        kwargs = {}
-        if file_extension == 'pdf':
-            kwargs['check_extractable'] = False
-        if effective_config:
-            kwargs.update(build_conversion_kwargs(effective_config))
-
-        result = md.convert_stream(stream, file_extension=file_extension, **kwargs)
-        logger.info(f"Conversion successful for file: {file.filename}")
-
-        return Response(content=result.text_content, media_type="text/markdown")
+                config_obj = parse_config(config)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+
+            # Merge default config with request config
+            effective_config = merge_configs(default_config, config_obj)
+
+            options = conversion_options(file_extension)
+            if effective_config:
+                validate_config(effective_config)
+        metrics.set_labels(file_extension, effective_config)
+
+        # Identical uploads with the same effective config share one cached result
+        key = cache_key(upload.sha256, file_extension, effective_config, options, selection)
+        representation = key + (f"-chunks-{chunking[0]}-{chunking[1]}" if chunking else "") + ("" if fmt == "markdown" else f"-{fmt}")
+        etag = f'"{representation}"'
+        if etag_matches(if_none_match, etag):
+            logger.info(f"ETag matched for file: {file.filename}")
+            return Response(status_code=304, headers={"ETag": etag})
+
+        mode = stream_mode(stream, accept)
+        chunker = MarkdownChunker(*chunking, file_extension=file_extension) if chunking else None
+
+        if file_extension in ARCHIVE_EXTENSIONS:
+            archive_stream = upload.open()
+            if archive_kind(archive_stream) is not None:
+                # Members are extracted one at a time and converted in parallel instead of in one worker
+                members = []
+                entries = iter_archive_members(archive_stream, BATCH_MAX_FILES, BATCH_MAX_ARCHIVE_BYTES, MAX_FILE_SIZE)
+                # Only max_chars applies to archives; the selection is part of the key and ETag, so it must shape the output
+                max_output = selection.max_chars if selection else None
+                events = archive_events(file.filename, entries, effective_config, members, max_chars=max_output)
+                archive_upload, upload = upload, None
+
+                def close_archive():
+                    archive_stream.close()
+                    archive_upload.close()
+
+                if mode:
+                    response = await streaming_response(events, mode, headers={"ETag": etag, "X-Cache": "MISS"}, on_close=close_archive, chunker=chunker)
+                    logger.info(f"Streaming archive conversion started for file: {file.filename}")
+                    return response
+                try:
+                    segments = [event async for event in events if isinstance(event, Segment)]
+                finally:
+                    close_archive()
+                text_content = "\n\n".join(s.markdown for s in segments if s.markdown)
+                if max_output:
+                    text_content = text_content[:max_output]
+                converted = [m for m in members if m["status"] == "ok"]
+                # An archive with nothing converted was never served from the cache
+                cache_hit = bool(converted) and all(m.get("cache") == "HIT" for m in converted)
+                logger.info(f"Archive conversion finished for file: {file.filename}: {len(converted)}/{len(members)} members converted")
+                return await _result_response(ConversionOutput(text_content=text_content), file_extension, chunking, fmt, {"ETag": etag, "X-Cache": "HIT" if cache_hit else "MISS"}, members=members)
+            archive_stream.close()
+
+        # Run the conversion in the worker pool to keep the event loop responsive
+        source, source_type = upload.job_source()
+        job = ConversionJob(source=source, source_type=source_type, file_extension=file_extension, config=effective_config, options=options, selection=selection)
+
+        if mode:
+            # Streamed conversions are not coalesced: segments go to this response only as they are produced
+            cached = await lookup_cached(key)
+            events = cached_events(cached) if cached is not None else admitted_events(conversion_pool.stream(job), file_extension)
+            # The response body now owns the upload and closes it when the stream ends
+            response = await streaming_response(events, mode, headers={"ETag": etag, "X-Cache": "HIT" if cached else "MISS"}, on_close=upload.close, chunker=chunker)
+            upload = None
+            logger.info(f"Streaming conversion started for file: {file.filename}")
+            return response
+
+        result, cache_hit = await run_cached(key, job)
+        logger.info(f"Conversion {'served from cache' if cache_hit else 'successful'} for file: {file.filename}")
+
+        return await _result_response(result, file_extension, chunking, fmt, {"ETag": etag, "X-Cache": "HIT" if cache_hit else "MISS"})
+    except HTTPException:
+        raise
+    except AdmissionRejectedError as e:
+        logger.warning(f"Conversion rejected for file {file.filename}: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         logger.warning(f"Validation error for file {file.filename}: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    except ConversionTimeoutError as e:
+        logger.error(f"Conversion timed out for file {file.filename}: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Conversion failed for file {file.filename}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
     finally:
+        if upload is not None:
+            upload.close()
         await file.close()
+
+
+async def _result_response(result: ConversionOutput, file_extension: Optional[str], chunking: Optional[Tuple[int, int]], fmt: str, headers: Dict[str, str], members: Optional[List[Dict[str, Any]]] = None) -> Response:
+    """Build the response for a complete conversion, chunking it if requested.
+
+    Args:
+        result: The converted document.
+        file_extension: The file extension of the source.
+        chunking: (chunk_tokens, chunk_overlap), or None for a plain result.
+        fmt: The result format returned by result_format().
+        headers: Response headers.
+        members: Per-member records of an archive, added to the metadata.
+    """
+    metadata: Dict[str, Any] = {"extension": file_extension}
+    if members is not None:
+        metadata["members"] = members
+    if chunking:
+        with metrics.stage("chunking"):
+            chunks = await run_in_threadpool(chunk_document, result.text_content, file_extension, *chunking)
+        metadata.update({"chunks": len(chunks), "chunk_tokens": chunking[0], "chunk_overlap": chunking[1]})
+        return result_response(ChunkedMarkDownResult(text=result.text_content, title=result.title, metadata=metadata, chunks=chunks), fmt, headers)
+    return result_response(MarkDownResult(text=result.text_content, title=result.title, metadata=metadata), fmt, headers)
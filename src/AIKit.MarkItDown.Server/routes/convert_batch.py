@@ -0,0 +1,448 @@
+"""Routes for batch file and URI conversion endpoints."""
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+from models import MarkDownConfig, ConvertUriBatchRequest
+from utils import validate_config, merge_configs, parse_config
+from config import default_config, BATCH_CONCURRENCY, BATCH_MAX_FILES, BATCH_MAX_ARCHIVE_BYTES, BATCH_MAX_URIS, BATCH_URI_CONCURRENCY, URI_FETCH
+from executor import conversion_pool, ConversionJob, ConversionOutput, Segment
+from cache import cache_key
+from conversion import resolve_extension, conversion_options, run_cached, uri_extension, NDJSON_MEDIA_TYPE
+from admission import admission_controller
+from fetch import fetch_for_conversion, is_fetchable
+from constants import MAX_FILE_SIZE
+from auth import get_api_key
+from uploads import spool_upload, SpooledUpload
+from archives import archive_kind, iter_archive_members
+import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_DONE = object()
+
+
+async def convert_entry(name: str, upload: SpooledUpload, effective_config: MarkDownConfig) -> Dict[str, Any]:
+    """Convert one batch entry and build its result record.
+
+    Errors are captured in the record so one bad file does not fail the batch.
+
+    Args:
+        name: The file name or archive member path.
+        upload: The spooled file content.
+        effective_config: The shared config for the batch.
+
+    Returns:
+        Dict with filename, status and either markdown/title or error.
+    """
+    file_extension = resolve_extension(name)
+    options = conversion_options(file_extension)
+    key = cache_key(upload.sha256, file_extension, effective_config, options)
+    source, source_type = upload.job_source()
+    job = ConversionJob(source=source, source_type=source_type, file_extension=file_extension, config=effective_config, options=options)
+    try:
+        # Batches are bounded by their own concurrency, so wait for admission rather than fail
+        result, cache_hit = await run_cached(key, job, wait=True)
+    except Exception as e:
+        logger.warning(f"Batch conversion failed for {name}: {str(e)}")
+        return {"filename": name, "status": "error", "error": str(e)}
+    return {
+        "filename": name,
+        "status": "ok",
+        "markdown": result.text_content,
+        "title": result.title,
+        "cache": "HIT" if cache_hit else "MISS"
+    }
+
+
+async def iter_entry_results(entries: Iterator, effective_config: MarkDownConfig, concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """Convert entries concurrently and yield their result records as each one finishes.
+
+    Entries are pulled from the (possibly blocking) iterator only when a conversion slot
+    is free, so archive members are extracted lazily.
+
+    Args:
+        entries: Iterator of (name, upload, error) tuples. Uploads are closed once converted.
+        effective_config: The shared config for all entries.
+        concurrency: Maximum number of in-flight conversions.
+
+    Yields:
+        Dict: One record per entry, with its index in the iterator, in completion order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+
+    async def convert_one(index: int, name: str, upload: SpooledUpload):
+        started = time.perf_counter()
+        try:
+            record = await convert_entry(name, upload, effective_config)
+        finally:
+            upload.close()
+            semaphore.release()
+        record["index"] = index
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        await results.put(record)
+
+    async def produce():
+        index = 0
+        try:
+            while True:
+                await semaphore.acquire()
+                entry = await run_in_threadpool(next, entries, None)
+                if entry is None:
+                    semaphore.release()
+                    break
+                name, upload, error = entry
+                if error is not None:
+                    semaphore.release()
+                    await results.put({"index": index, "filename": name, "status": "error", "error": error, "duration_ms": 0.0})
+                else:
+                    task = asyncio.create_task(convert_one(index, name, upload))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                index += 1
+            await asyncio.gather(*list(tasks))
+        except Exception as e:
+            logger.error(f"Batch producer failed: {str(e)}")
+            await results.put({"index": index, "filename": None, "status": "error", "error": str(e), "duration_ms": 0.0})
+        finally:
+            await results.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            record = await results.get()
+            if record is _DONE:
+                break
+            yield record
+    finally:
+        # The client may disconnect mid-stream; stop pulling entries and drop in-flight work
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+        close = getattr(entries, "close", None)
+        if close is not None:
+            try:
+                await run_in_threadpool(close)
+            except ValueError:
+                # The producer is still extracting in a thread; closing the archive stream stops it
+                pass
+
+
+async def stream_ndjson_results(entries: Iterator, effective_config: MarkDownConfig, concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[str]:
+    """Convert entries concurrently and yield NDJSON records as each one finishes.
+
+    Args:
+        entries: Iterator of (name, upload, error) tuples. Uploads are closed once converted.
+        effective_config: The shared config for all entries.
+        concurrency: Maximum number of in-flight conversions.
+
+    Yields:
+        str: One JSON record per line.
+    """
+    results = iter_entry_results(entries, effective_config, concurrency)
+    try:
+        async for record in results:
+            yield json.dumps(record) + "\n"
+    finally:
+        await results.aclose()
+
+
+async def archive_events(filename: str, entries: Iterator, effective_config: MarkDownConfig, members: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY, max_chars: Optional[int] = None) -> AsyncIterator[Union[Segment, ConversionOutput]]:
+    """Convert the members of an archive in parallel and emit them as one document.
+
+    The Markdown has the layout of MarkItDown's ZIP converter: a "Content from the zip
+    file" line followed by a "## File: <name>" section per member, in archive order.
+    Members are converted concurrently but emitted in order as soon as every member
+    before them has finished; members that fail or have no converter are left out of
+    the Markdown, as the ZIP converter does, and reported in members. Once max_chars
+    characters were emitted, the remaining members are neither converted nor reported.
+
+    Args:
+        filename: The name of the archive.
+        entries: Iterator of (name, upload, error) tuples from iter_archive_members().
+        effective_config: The shared config for all members.
+        members: Receives one record per member (filename, status, error or cache,
+            duration_ms), in archive order.
+        concurrency: Maximum number of in-flight member conversions.
+        max_chars: Optional cap on the Markdown emitted.
+
+    Yields:
+        Segment objects followed by the final ConversionOutput.
+    """
+    remaining = max_chars
+    heading = f"Content from the zip file `{filename}`:"
+    if remaining is not None:
+        heading = heading[:remaining]
+        remaining -= len(heading)
+    yield Segment(kind="archive", index=1, label=filename, markdown=heading)
+    finished: Dict[int, Dict[str, Any]] = {}
+    position = 0
+    results = iter_entry_results(entries, effective_config, concurrency)
+    try:
+        async for record in results:
+            finished[record["index"]] = record
+            while position in finished and (remaining is None or remaining > 0):
+                record = finished.pop(position)
+                position += 1
+                markdown = record.pop("markdown", None)
+                record.pop("title", None)
+                record.pop("index", None)
+                members.append(record)
+                if record["status"] == "ok":
+                    markdown = f"## File: {record['filename']}\n\n{markdown.strip()}"
+                    if remaining is not None:
+                        markdown = markdown[:remaining]
+                        remaining -= len(markdown)
+                    yield Segment(kind="file", index=position, label=record["filename"], markdown=markdown)
+            if remaining is not None and remaining <= 0:
+                # The cap is reached: members still converting are cancelled when results is closed
+                break
+    finally:
+        await results.aclose()
+    yield ConversionOutput(text_content="")
+
+
+def _uploaded_entries(uploads: List[tuple]) -> Iterator:
+    for name, upload in uploads:
+        yield name, upload, None
+
+
+@router.post("/convert/batch", tags=["Conversion"], summary="Convert many files to Markdown")
+async def convert_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    config: Optional[str] = Form(None),
+    api_key: str = Depends(get_api_key)
+):
+    """Convert many uploaded files, or the members of a ZIP/tar archive, to Markdown.
+
+    Files are converted concurrently with one shared config. Each result is streamed
+    back as an NDJSON record (filename, status, markdown, title, duration_ms) as soon
+    as it finishes, so a slow or failing file neither blocks nor fails the others.
+
+    Args:
+        files: The files to convert.
+        archive: Optional ZIP or tar archive whose members are converted.
+        config: Optional JSON string configuration shared by all files (overrides defaults from .env).
+
+    Returns:
+        StreamingResponse of application/x-ndjson records.
+
+    Raises:
+        HTTPException: For validation errors.
+    """
+    files = [f for f in (files or []) if f.filename]
+    logger.info(f"Batch convert endpoint called with {len(files)} files, archive: {archive.filename if archive else None}")
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {BATCH_MAX_FILES}.")
+
+    try:
+        effective_config = merge_configs(default_config, parse_config(config))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        if effective_config:
+            validate_config(effective_config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    spooled = []
+    archive_upload = None
+    archive_stream = None
+    try:
+        for file in files:
+            file_extension = resolve_extension(file.filename)
+            with metrics.stage("upload_read"):
+                spooled.append((file.filename, await spool_upload(file, MAX_FILE_SIZE, suffix=f".{file_extension}" if file_extension else None)))
+            await file.close()
+
+        entries = _uploaded_entries(spooled)
+        if archive is not None:
+            with metrics.stage("upload_read"):
+                archive_upload = await spool_upload(archive, MAX_FILE_SIZE)
+            archive_stream = archive_upload.open()
+            if archive_kind(archive_stream) is None:
+                raise HTTPException(status_code=400, detail="Unsupported archive format. Expected a ZIP or tar archive.")
+            members = iter_archive_members(archive_stream, BATCH_MAX_FILES, BATCH_MAX_ARCHIVE_BYTES, MAX_FILE_SIZE)
+            entries = _chain_entries(entries, members)
+    except BaseException:
+        _close_all(spooled, archive_stream, archive_upload)
+        raise
+
+    async def body():
+        try:
+            async for line in stream_ndjson_results(entries, effective_config):
+                yield line
+        finally:
+            _close_all(spooled, archive_stream, archive_upload)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+async def convert_uri_entry(uri: str, effective_config: MarkDownConfig, conversions: asyncio.Semaphore) -> Dict[str, Any]:
+    """Fetch and convert one URI of a batch and build its result record.
+
+    Errors are captured in the record so one bad URI does not fail the batch.
+
+    Args:
+        uri: The URI to convert.
+        effective_config: The shared config for the batch.
+        conversions: Bounds the conversions running at once across the batch.
+
+    Returns:
+        Dict with uri, status, fetch details and either markdown/title or error.
+    """
+    fetched = None
+    record: Dict[str, Any] = {"uri": uri}
+    try:
+        if URI_FETCH and is_fetchable(uri):
+            started = time.perf_counter()
+            fetched, key, job, cached = await fetch_for_conversion(uri, effective_config)
+            record["fetch"] = "revalidated" if fetched.revalidated else "fetched"
+            record["fetch_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if cached is not None:
+                result, cache_hit = cached, True
+            else:
+                async with conversions:
+                    # Batches are bounded by their own concurrency, so wait for admission rather than fail
+                    result, cache_hit = await run_cached(key, job, wait=True)
+        else:
+            job = ConversionJob(source=uri, source_type="uri", config=effective_config)
+            async with conversions:
+                async with admission_controller.slot(uri_extension(uri), wait=True):
+                    result = await conversion_pool.run(job)
+            cache_hit = False
+    except Exception as e:
+        logger.warning(f"Batch conversion failed for {uri}: {str(e)}")
+        record.update({"status": "error", "error": str(e)})
+        return record
+    finally:
+        if fetched is not None:
+            fetched.close()
+    record.update({"status": "ok", "markdown": result.text_content, "title": result.title, "cache": "HIT" if cache_hit else "MISS"})
+    return record
+
+
+async def stream_uri_results(uris: List[str], effective_config: MarkDownConfig, concurrency: int = BATCH_URI_CONCURRENCY, conversion_concurrency: int = BATCH_CONCURRENCY):
+    """Fetch and convert URIs concurrently and yield NDJSON records as each one finishes.
+
+    At most concurrency URIs are being fetched or waiting for conversion at once, which
+    bounds the bodies held in memory; the fetcher adds its per-host limit on top.
+
+    Args:
+        uris: The URIs to convert.
+        effective_config: The shared config for all URIs.
+        concurrency: Maximum number of URIs in flight.
+        conversion_concurrency: Maximum number of conversions running at once.
+
+    Yields:
+        str: One JSON record per line.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    conversions = asyncio.Semaphore(conversion_concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+
+    async def convert_one(index: int, uri: str):
+        started = time.perf_counter()
+        try:
+            record = await convert_uri_entry(uri, effective_config, conversions)
+        finally:
+            semaphore.release()
+        record["index"] = index
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        await results.put(record)
+
+    async def produce():
+        try:
+            for index, uri in enumerate(uris):
+                await semaphore.acquire()
+                task = asyncio.create_task(convert_one(index, uri))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*list(tasks))
+        finally:
+            await results.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            record = await results.get()
+            if record is _DONE:
+                break
+            yield json.dumps(record) + "\n"
+    finally:
+        # The client may disconnect mid-stream; drop in-flight fetches and conversions
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+@router.post("/convert_uri/batch", tags=["Conversion"], summary="Convert many URIs to Markdown")
+async def convert_uri_batch(
+    request: ConvertUriBatchRequest,
+    api_key: str = Depends(get_api_key)
+):
+    """Convert many URIs to Markdown with one shared config.
+
+    URIs are fetched concurrently, within a global cap and a per-host connection limit,
+    and converted in parallel. Each result is streamed back as an NDJSON record (uri,
+    status, markdown, title, fetch, fetch_ms, duration_ms) as soon as it finishes, so a
+    slow or failing URI neither blocks nor fails the others.
+
+    Args:
+        request: The URIs and optional config (overrides defaults from .env).
+
+    Returns:
+        StreamingResponse of application/x-ndjson records.
+
+    Raises:
+        HTTPException: For validation errors.
+    """
+    uris = [uri.strip() for uri in request.uris if uri and uri.strip()]
+    logger.info(f"Batch URI convert endpoint called with {len(uris)} URIs")
+    if not uris:
+        raise HTTPException(status_code=400, detail="No URIs provided")
+    if len(uris) > BATCH_MAX_URIS:
+        raise HTTPException(status_code=400, detail=f"Too many URIs. Maximum is {BATCH_MAX_URIS}.")
+
+    try:
+        effective_config = merge_configs(default_config, request.config)
+        if effective_config:
+            validate_config(effective_config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(stream_uri_results(uris, effective_config), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _chain_entries(*iterators: Iterator) -> Iterator:
+    try:
+        for iterator in iterators:
+            yield from iterator
+    finally:
+        for iterator in iterators:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+
+def _close_all(spooled: List[tuple], archive_stream, archive_upload: Optional[SpooledUpload]):
+    for _, upload in spooled:
+        upload.close()
+    if archive_stream is not None:
+        archive_stream.close()
+    if archive_upload is not None:
+        archive_upload.close()
@@ -1,13 +1,18 @@
 """Route for URI conversion endpoint."""
 
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
 import logging
-from models import  ConvertUriRequest
-from utils import build_conversion_kwargs, merge_configs
-from config import default_config
-from converter import md
+from typing import Optional
+from models import  ConvertUriRequest, MarkDownResult
+from utils import validate_config, merge_configs
+from config import default_config, URI_FETCH
+from executor import conversion_pool, ConversionJob, ConversionTimeoutError
 from auth import get_api_key
+from conversion import uri_extension, uri_key, run_cached, lookup_cached, stream_mode, cached_events, admitted_events, streaming_response, result_format, result_response
+from admission import admission_controller, AdmissionRejectedError
+from fetch import fetch_for_conversion, is_fetchable, FetchError
+from singleflight import conversion_flights
+import metrics
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -16,36 +21,101 @@ router = APIRouter()
 
 
 @router.post("/convert_uri", tags=["Conversion"], summary="Convert URI to Markdown")
-async def convert_uri(request: ConvertUriRequest, api_key: str = Depends(get_api_key)):
+async def convert_uri(
+    request: ConvertUriRequest,
+    stream: bool = Query(False),
+    accept: Optional[str] = Header(None),
+    api_key: str = Depends(get_api_key)
+):
     """Convert a URI to Markdown format.
 
     Args:
         request: The request containing URI and optional config (overrides defaults from .env).
+        stream: Stream the Markdown with chunked transfer encoding.
+        accept: Accept header; "application/x-ndjson" streams segment events ending with a "done" event,
+            "application/json" or "application/msgpack" returns a MarkDownResult envelope.
+
+    http(s) URIs are fetched by the server and revalidated with ETag/Last-Modified on
+    repeat requests, so an unchanged resource is answered from the result cache
+    (X-Cache: HIT, X-Fetch: revalidated). Other URIs are handed to MarkItDown.
 
     Returns:
-        Markdown content as plain text response.
+        Markdown content as plain text or a MarkDownResult envelope, or a streaming response.
 
     Raises:
-        HTTPException: For validation errors or conversion failures.
+        HTTPException: For validation errors, fetch or conversion failures, or 503 with
+            Retry-After when conversions of this URI's class are saturated.
     """
     logger.info(f"Convert URI endpoint called with URI: {request.uri}")
 
+    fetched = None
     try:
-        # Merge default config with request config
-        effective_config = merge_configs(default_config, request.config)
+        with metrics.stage("config_merge"):
+            # Merge default config with request config
+            effective_config = merge_configs(default_config, request.config)
+
+            if effective_config:
+                validate_config(effective_config)
+
+        mode = stream_mode(stream, accept)
+        fmt = result_format(accept)
+
+        if URI_FETCH and is_fetchable(request.uri):
+            with metrics.stage("fetch"):
+                fetched, key, job, cached = await fetch_for_conversion(request.uri, effective_config)
+            file_extension = job.file_extension
+            metrics.set_labels(file_extension, effective_config)
+            fetch_status = "revalidated" if fetched.revalidated else "fetched"
+
+            if mode:
+                cached = cached or await lookup_cached(key)
+                events = cached_events(cached) if cached is not None else admitted_events(conversion_pool.stream(job), file_extension)
+                # The response body now owns the fetched body and closes it when the stream ends
+                response = await streaming_response(events, mode, headers={"X-Cache": "HIT" if cached else "MISS", "X-Fetch": fetch_status}, on_close=fetched.close)
+                fetched = None
+                return response
+
+            if cached is not None:
+                result, cache_hit = cached, True
+            else:
+                result, cache_hit = await run_cached(key, job)
+            logger.info(f"URI conversion {'served from cache' if cache_hit else 'successful'} for: {request.uri} ({fetch_status})")
+            envelope = MarkDownResult(text=result.text_content, title=result.title, metadata={"extension": file_extension, "uri": request.uri})
+            return result_response(envelope, fmt, {"X-Cache": "HIT" if cache_hit else "MISS", "X-Fetch": fetch_status})
+
+        # Run the conversion in the worker pool to keep the event loop responsive
+        job = ConversionJob(source=request.uri, source_type="uri", config=effective_config)
+
+        file_extension = uri_extension(request.uri)
+        if mode:
+            return await streaming_response(admitted_events(conversion_pool.stream(job), file_extension), mode)
 
-        kwargs = {}
-        if effective_config:
-            kwargs.update(build_conversion_kwargs(effective_config))
+        async def convert():
+            async with admission_controller.slot(file_extension):
+                return await conversion_pool.run(job)
 
-        result = md.convert(request.uri, **kwargs)
+        result = await conversion_flights.run(uri_key(request.uri, effective_config), convert)
         logger.info(f"URI conversion successful for: {request.uri}")
 
-        return Response(content=result.text_content, media_type="text/markdown")
+        return result_response(MarkDownResult(text=result.text_content, title=result.title, metadata={"extension": file_extension, "uri": request.uri}), fmt)
+    except HTTPException:
+        raise
+    except FetchError as e:
+        logger.warning(f"Fetching URI {request.uri} failed: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except AdmissionRejectedError as e:
+        logger.warning(f"URI conversion rejected for {request.uri}: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         logger.warning(f"Validation error for URI {request.uri}: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    except ConversionTimeoutError as e:
+        logger.error(f"URI conversion timed out for {request.uri}: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"URI conversion failed for {request.uri}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
+    finally:
+        if fetched is not None:
+            fetched.close()
 
@@ -0,0 +1,190 @@
+"""Routes for asynchronous conversion jobs."""
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Request
+from fastapi.responses import JSONResponse, Response
+import logging
+from typing import Optional
+from pydantic import ValidationError
+from models import ConvertUriRequest
+from utils import validate_config, merge_configs, parse_config
+from config import default_config
+from executor import ConversionJob
+from cache import cache_key
+from conversion import resolve_extension, conversion_options
+from constants import MAX_FILE_SIZE
+from auth import get_api_key
+from uploads import spool_upload
+from jobs import job_manager, JobRecord, JobQueueFullError, SUCCEEDED
+import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _accepted(record: JobRecord) -> JSONResponse:
+    """Build the 202 response for a newly queued job."""
+    status_url = f"/jobs/{record.id}"
+    return JSONResponse(
+        status_code=202,
+        content={"id": record.id, "status": record.status, "status_url": status_url, "result_url": f"{status_url}/result"},
+        headers={"Location": status_url}
+    )
+
+
+def _queue_full(e: JobQueueFullError) -> HTTPException:
+    logger.warning(f"Job queue full, retry after {e.retry_after}s")
+    return HTTPException(status_code=429, detail="Job queue is full. Try again later.", headers={"Retry-After": str(e.retry_after)})
+
+
+@router.post("/jobs", tags=["Jobs"], summary="Queue a file or URI conversion job", status_code=202)
+async def create_file_job(
+    request: Request,
+    file: UploadFile = File(None),
+    extension: str = Form(None),
+    config: Optional[str] = Form(None),
+    api_key: str = Depends(get_api_key)
+):
+    """Queue an uploaded file or a URI for conversion and return the job id right away.
+
+    Takes the same form fields as /convert, or, sent as application/json, the same
+    body as /convert_uri.
+
+    Args:
+        request: The request, read as a /convert_uri body when it is JSON.
+        file: The file to convert.
+        extension: Optional file extension override.
+        config: Optional JSON string configuration for the conversion (overrides defaults from .env).
+
+    Returns:
+        JSONResponse: 202 with the job id and its status and result URLs.
+
+    Raises:
+        HTTPException: For validation errors, or 429 with Retry-After when the queue is full.
+    """
+    if "application/json" in request.headers.get("content-type", "").lower():
+        try:
+            body = ConvertUriRequest.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+        return _submit_uri_job(body)
+    if file is None:
+        raise HTTPException(status_code=422, detail="Send a file as multipart/form-data or a URI as application/json")
+
+    logger.info(f"Create job endpoint called with file: {file.filename}, extension: {extension}")
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+
+    upload = None
+    try:
+        file_extension = resolve_extension(file.filename, extension)
+        metrics.set_labels(file_extension)
+        with metrics.stage("upload_read"):
+            upload = await spool_upload(file, MAX_FILE_SIZE, suffix=f".{file_extension}" if file_extension else None)
+
+        try:
+            config_obj = parse_config(config)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        effective_config = merge_configs(default_config, config_obj)
+        options = conversion_options(file_extension)
+        if effective_config:
+            validate_config(effective_config)
+
+        key = cache_key(upload.sha256, file_extension, effective_config, options)
+        source, source_type = upload.job_source()
+        job = ConversionJob(source=source, source_type=source_type, file_extension=file_extension, config=effective_config, options=options)
+
+        record = job_manager.submit(file.filename, job, cache_key=key, upload=upload)
+        # The job now owns the upload and closes it when it finishes
+        upload = None
+        return _accepted(record)
+    except HTTPException:
+        raise
+    except JobQueueFullError as e:
+        raise _queue_full(e)
+    except ValueError as e:
+        logger.warning(f"Validation error for file {file.filename}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if upload is not None:
+            upload.close()
+        await file.close()
+
+
+@router.post("/jobs/uri", tags=["Jobs"], summary="Queue a URI conversion job", status_code=202)
+async def create_uri_job(request: ConvertUriRequest, api_key: str = Depends(get_api_key)):
+    """Queue a URI for conversion and return the job id right away.
+
+    Takes the same body as /convert_uri; equivalent to posting it to /jobs as JSON.
+
+    Args:
+        request: The request containing URI and optional config (overrides defaults from .env).
+
+    Returns:
+        JSONResponse: 202 with the job id and its status and result URLs.
+
+    Raises:
+        HTTPException: For validation errors, or 429 with Retry-After when the queue is full.
+    """
+    return _submit_uri_job(request)
+
+
+def _submit_uri_job(request: ConvertUriRequest) -> JSONResponse:
+    logger.info(f"Create URI job endpoint called with URI: {request.uri}")
+    try:
+        effective_config = merge_configs(default_config, request.config)
+        if effective_config:
+            validate_config(effective_config)
+
+        job = ConversionJob(source=request.uri, source_type="uri", config=effective_config)
+        return _accepted(job_manager.submit(request.uri, job))
+    except JobQueueFullError as e:
+        raise _queue_full(e)
+    except ValueError as e:
+        logger.warning(f"Validation error for URI {request.uri}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/jobs/{job_id}", tags=["Jobs"], summary="Get job status")
+async def get_job(job_id: str, api_key: str = Depends(get_api_key)):
+    """Report the state of a job.
+
+    Args:
+        job_id: The job id returned when the job was queued.
+
+    Returns:
+        dict: Status, timings, queue position while queued, and error details if it failed.
+
+    Raises:
+        HTTPException: 404 if the job is unknown or expired.
+    """
+    record = await job_manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return record.status_payload(job_manager.queue_position(job_id))
+
+
+@router.get("/jobs/{job_id}/result", tags=["Jobs"], summary="Get job result")
+async def get_job_result(job_id: str, api_key: str = Depends(get_api_key)):
+    """Return the Markdown produced by a finished job.
+
+    Args:
+        job_id: The job id returned when the job was queued.
+
+    Returns:
+        Markdown content as plain text response.
+
+    Raises:
+        HTTPException: 404 if the job is unknown or expired, 409 if it has not succeeded.
+    """
+    record = await job_manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if record.status != SUCCEEDED:
+        detail = f"Job failed: {record.error}" if record.finished else f"Job is {record.status}"
+        raise HTTPException(status_code=409, detail=detail)
+    headers = {"X-Cache": record.cache} if record.cache else None
+    return Response(content=record.result, media_type="text/markdown", headers=headers)
@@ -0,0 +1,190 @@
+"""Segmented conversion that emits pages, sheets and slides as they are converted."""
+
+import re
+from functools import partial
+from typing import Any, BinaryIO, Callable, Iterator, Optional, Tuple
+
+import pptx
+from markitdown import MarkItDown
+from markitdown.converters import PptxConverter
+
+from executor import Segment
+from selection import DocumentSelection
+from tabular import iter_xlsx_tables, iter_csv_tables
+from transcription import segmented_audio, iter_audio_segments
+
+
+def normalize_extension(file_extension: Optional[str]) -> Optional[str]:
+    """Normalize an extension to the lower-case, dot-prefixed form used by MarkItDown."""
+    if not file_extension:
+        return None
+    return "." + file_extension.lower().lstrip(".")
+
+
+def iter_pdf_pages(file_stream: BinaryIO, selection: Optional[DocumentSelection] = None, **kwargs: Any) -> Iterator[Segment]:
+    """Yield one segment per PDF page.
+
+    Uses the same per-page extraction as MarkItDown's PdfConverter: form-style pages
+    are rendered as aligned tables, other pages as plain text. With a page selection,
+    unselected pages are never parsed.
+    """
+    import pdfplumber
+    from markitdown.converters._pdf_converter import _extract_form_content_from_words, _merge_partial_numbering_lines
+
+    selected = selection.pages if selection else None
+    # pdfplumber only loads the listed pages, which avoids walking a long page tree for "first N pages"
+    wanted = [number for number in range(1, selected.last + 1) if number in selected] if selected and selected.last else None
+    with pdfplumber.open(file_stream, pages=wanted) as pdf:
+        for page in pdf.pages:
+            index = page.page_number
+            if selected and index not in selected:
+                page.close()
+                continue
+            try:
+                content = _extract_form_content_from_words(page)
+                if content is None:
+                    content = page.extract_text() or ""
+            finally:
+                page.close()
+            yield Segment(kind="page", index=index, markdown=_merge_partial_numbering_lines(content.strip()))
+
+
+class _SlideConverter(PptxConverter):
+    """PptxConverter that renders one slide at a time."""
+
+    def iter_slides(self, file_stream: BinaryIO, selection: Optional[DocumentSelection] = None, **kwargs: Any) -> Iterator[Segment]:
+        selected = selection.slides if selection else None
+        presentation = pptx.Presentation(file_stream)
+        for index, slide in enumerate(presentation.slides, start=1):
+            if selected and selected.last and index > selected.last:
+                break
+            if selected and index not in selected:
+                continue
+            yield Segment(kind="slide", index=index, markdown=self._convert_slide(slide, index, **kwargs))
+
+    def iter_images(self, file_stream: BinaryIO, selection: Optional[DocumentSelection] = None) -> Iterator[Tuple[bytes, Optional[str]]]:
+        """Yield (blob, content type) for every picture of the selected slides, in slide order."""
+        selected = selection.slides if selection else None
+        presentation = pptx.Presentation(file_stream)
+
+        def pictures(shapes):
+            for shape in shapes:
+                if self._is_picture(shape):
+                    blob, content_type, _ = self._get_image_info(shape)
+                    if blob is not None:
+                        yield blob, content_type
+                if shape.shape_type == pptx.enum.shapes.MSO_SHAPE_TYPE.GROUP:
+                    yield from pictures(shape.shapes)
+
+        for index, slide in enumerate(presentation.slides, start=1):
+            if selected and selected.last and index > selected.last:
+                break
+            if selected and index not in selected:
+                continue
+            yield from pictures(slide.shapes)
+
+    def _convert_slide(self, slide, slide_num: int, **kwargs: Any) -> str:
+        md_content = f"<!-- Slide number: {slide_num} -->\n"
+        title = slide.shapes.title
+
+        def sort_key(shape):
+            return (float("-inf") if shape.top is None else shape.top, float("-inf") if shape.left is None else shape.left)
+
+        def get_shape_content(shape):
+            nonlocal md_content
+            if self._is_picture(shape):
+                md_content += self._convert_picture_to_markdown(shape, **kwargs)
+            if self._is_table(shape):
+                md_content += self._convert_table_to_markdown(shape.table, **kwargs)
+            if shape.has_chart:
+                md_content += self._convert_chart_to_markdown(shape.chart)
+            elif shape.has_text_frame:
+                text = shape.text or ""
+                if shape == title:
+                    if text.strip():
+                        md_content += "# " + text.lstrip() + "\n"
+                else:
+                    md_content += text + "\n"
+            if shape.shape_type == pptx.enum.shapes.MSO_SHAPE_TYPE.GROUP:
+                for subshape in sorted(shape.shapes, key=sort_key):
+                    get_shape_content(subshape)
+
+        for shape in sorted(slide.shapes, key=sort_key):
+            get_shape_content(shape)
+        md_content = md_content.strip()
+
+        if slide.has_notes_slide:
+            notes_frame = slide.notes_slide.notes_text_frame
+            notes_text = (notes_frame.text or "") if notes_frame is not None else ""
+            if notes_text.strip():
+                md_content += "\n\n### Notes:\n" + notes_text
+        return md_content.strip()
+
+
+def iter_pptx_slides(file_stream: BinaryIO, selection: Optional[DocumentSelection] = None, **kwargs: Any) -> Iterator[Segment]:
+    """Yield one segment per slide, skipping unselected slides."""
+    yield from _SlideConverter().iter_slides(file_stream, selection=selection, **kwargs)
+
+
+def iter_pptx_images(file_stream: BinaryIO, selection: Optional[DocumentSelection] = None) -> Iterator[Tuple[bytes, Optional[str]]]:
+    """Yield (blob, content type) for the pictures of the selected slides."""
+    yield from _SlideConverter().iter_images(file_stream, selection=selection)
+
+
+# Formats that can be converted segment by segment
+SEGMENTERS = {
+    ".pdf": iter_pdf_pages,
+    ".xlsx": iter_xlsx_tables,
+    ".csv": iter_csv_tables,
+    ".pptx": iter_pptx_slides,
+}
+
+
+def _normalize_markdown(markdown: str) -> str:
+    """Apply MarkItDown's whitespace normalization to a segment."""
+    markdown = "\n".join(line.rstrip() for line in re.split(r"\r?\n", markdown))
+    return re.sub(r"\n{3,}", "\n\n", markdown)
+
+
+def convert_segments(md: MarkItDown, file_stream: BinaryIO, file_extension: Optional[str], emit: Callable[[Segment], None], selection: Optional[DocumentSelection] = None, **kwargs: Any) -> Optional[str]:
+    """Convert a stream, emitting segments as they are produced.
+
+    Formats without a segmenter are converted as a whole and emitted as one
+    "document" segment. Audio is transcribed in parallel segments when enabled. Segmenters skip unselected pages, slides and sheets, and
+    conversion stops as soon as the selection's output cap is reached.
+
+    Args:
+        md: The MarkItDown instance used for formats without a segmenter.
+        file_stream: A seekable binary stream.
+        file_extension: The file extension hint.
+        emit: Called with each segment, in document order.
+        selection: Optional part of the document to convert and output cap.
+        **kwargs: Conversion options.
+
+    Returns:
+        The document title, if the converter found one.
+    """
+    remaining = selection.max_chars if selection else None
+    segmenter = SEGMENTERS.get(normalize_extension(file_extension))
+    if segmenter is None and segmented_audio(file_extension):
+        segmenter = partial(iter_audio_segments, file_extension=file_extension)
+    if segmenter is None:
+        result = md.convert_stream(file_stream, file_extension=file_extension, **kwargs)
+        markdown = result.text_content if remaining is None else result.text_content[:remaining]
+        emit(Segment(kind="document", index=1, markdown=markdown))
+        return result.title
+
+    segments = segmenter(file_stream, selection=selection, **kwargs)
+    try:
+        for segment in segments:
+            segment.markdown = _normalize_markdown(segment.markdown)
+            if remaining is not None:
+                segment.markdown = segment.markdown[:remaining]
+                remaining -= len(segment.markdown)
+            emit(segment)
+            if remaining is not None and remaining <= 0:
+                break
+    finally:
+        # Stop the segmenter right away so the rest of the document is never parsed
+        segments.close()
+    return None
@@ -0,0 +1,137 @@
+"""Partial conversion: page, slide and sheet selections and output size and row caps."""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Which selection applies to which file extension
+SELECTION_EXTENSIONS = {
+    "pages": ("pdf",),
+    "slides": ("pptx",),
+    "sheets": ("xlsx",),
+    "max_rows": ("xlsx", "csv"),
+}
+
+
+@dataclass
+class PageRanges:
+    """A set of 1-based page (or slide) numbers given as inclusive ranges.
+
+    Attributes:
+        ranges: (start, end) pairs; end is None for an open range such as "10-".
+    """
+    ranges: List[Tuple[int, Optional[int]]]
+
+    def __contains__(self, number: int) -> bool:
+        return any(start <= number and (end is None or number <= end) for start, end in self.ranges)
+
+    @property
+    def last(self) -> Optional[int]:
+        """The highest selected number, or None if a range is open-ended."""
+        if any(end is None for _, end in self.ranges):
+            return None
+        return max(end for _, end in self.ranges)
+
+    def __str__(self) -> str:
+        return ",".join(f"{start}-{'' if end is None else end}" for start, end in self.ranges)
+
+
+@dataclass
+class DocumentSelection:
+    """The part of a document to convert.
+
+    Attributes:
+        pages: PDF pages to convert.
+        slides: PPTX slides to convert.
+        sheets: XLSX sheet names to convert, in workbook order.
+        max_chars: Stop converting once this many characters of Markdown were produced.
+        max_rows: Convert at most this many data rows of each XLSX sheet or CSV file.
+    """
+    pages: Optional[PageRanges] = None
+    slides: Optional[PageRanges] = None
+    sheets: Optional[List[str]] = field(default=None)
+    max_chars: Optional[int] = None
+    max_rows: Optional[int] = None
+
+    def cache_fields(self) -> Dict[str, Any]:
+        """Describe the selection for the result cache key."""
+        return {
+            "pages": str(self.pages) if self.pages else None,
+            "slides": str(self.slides) if self.slides else None,
+            "sheets": self.sheets,
+            "max_chars": self.max_chars,
+            "max_rows": self.max_rows
+        }
+
+
+def parse_ranges(value: str, name: str = "pages") -> PageRanges:
+    """Parse a range list such as "1-3,7,10-".
+
+    Args:
+        value: Comma-separated numbers and ranges, 1-based and inclusive.
+        name: The parameter name, for error messages.
+
+    Returns:
+        PageRanges: The parsed ranges.
+
+    Raises:
+        ValueError: If the value is malformed.
+    """
+    ranges = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition("-")
+        try:
+            first = int(start)
+            last = (int(end) if end.strip() else None) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid {name} range '{part}'. Use numbers and ranges like 1-3,7,10-.")
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid {name} range '{part}'. Numbers start at 1 and ranges must not be reversed.")
+        ranges.append((first, last))
+    if not ranges:
+        raise ValueError(f"Empty {name} selection")
+    return PageRanges(ranges)
+
+
+def parse_selection(file_extension: Optional[str], pages: Optional[str] = None, slides: Optional[str] = None, sheets: Optional[str] = None, max_chars: Optional[int] = None, max_rows: Optional[int] = None) -> Optional[DocumentSelection]:
+    """Build the selection for a conversion from request parameters.
+
+    Args:
+        file_extension: The file extension of the document.
+        pages: PDF page ranges, e.g. "1-5".
+        slides: PPTX slide ranges, e.g. "2,4-6".
+        sheets: Comma-separated XLSX sheet names.
+        max_chars: Output cap in characters.
+        max_rows: Data row cap per XLSX sheet or CSV file.
+
+    Returns:
+        DocumentSelection, or None if nothing was selected.
+
+    Raises:
+        ValueError: If a parameter is malformed or does not apply to the file type.
+    """
+    extension = (file_extension or "").lower().lstrip(".")
+    given = {"pages": pages, "slides": slides, "sheets": sheets}
+    for name, value in given.items():
+        if value and extension not in SELECTION_EXTENSIONS[name]:
+            raise ValueError(f"'{name}' applies to {', '.join(SELECTION_EXTENSIONS[name])} files only")
+    if max_chars is not None and max_chars < 1:
+        raise ValueError("'max_chars' must be a positive number")
+    if max_rows is not None:
+        if extension not in SELECTION_EXTENSIONS["max_rows"]:
+            raise ValueError(f"'max_rows' applies to {', '.join(SELECTION_EXTENSIONS['max_rows'])} files only")
+        if max_rows < 1:
+            raise ValueError("'max_rows' must be a positive number")
+
+    if not any(given.values()) and max_chars is None and max_rows is None:
+        return None
+    sheet_names = [name.strip() for name in sheets.split(",") if name.strip()] if sheets else None
+    return DocumentSelection(
+        pages=parse_ranges(pages, "pages") if pages else None,
+        slides=parse_ranges(slides, "slides") if slides else None,
+        sheets=sheet_names or None,
+        max_chars=max_chars,
+        max_rows=max_rows
+    )
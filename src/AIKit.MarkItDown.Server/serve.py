@@ -0,0 +1,383 @@
+"""Preload-and-fork launcher: the MarkItDown stack is imported once and server workers are forked from it.
+
+Run with `python serve.py` instead of `uvicorn main:app` to serve with several worker
+processes that share the preloaded modules copy-on-write.
+"""
+
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("serve")
+
+# Seconds between heartbeats of a worker, and the longest wait between supervision passes
+HEARTBEAT_INTERVAL = 1.0
+# Seconds between checks of the workers' memory
+MEMORY_CHECK_INTERVAL = 5.0
+# Longest delay before forking again a worker that keeps failing to start
+MAX_RESPAWN_DELAY = 30.0
+# Seconds a stopping worker gets on top of the graceful timeout before it is killed
+KILL_MARGIN = 5.0
+
+
+def private_memory(pid: int) -> Optional[int]:
+    """Bytes of memory private to a process, not shared with its parent (Linux only).
+
+    Pages of the preloaded stack still shared copy-on-write are not counted, so this
+    is what a worker adds on top of the parent, and what stopping it frees.
+
+    Returns:
+        Private_Clean + Private_Dirty of /proc/<pid>/smaps_rollup, or None if unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            return sum(int(line.split()[1]) * 1024 for line in f if line.startswith(("Private_Clean:", "Private_Dirty:")))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclass
+class _Worker:
+    """A forked server worker, as tracked by the supervisor.
+
+    Attributes:
+        slot: The worker's position; a replacement takes over the slot of the worker it replaces.
+        pid: The process id.
+        heartbeat: Read end of the worker's heartbeat pipe.
+        started_at: When the worker was forked (monotonic).
+        last_seen: When the last heartbeat arrived (monotonic).
+        ready: Whether the worker has started serving.
+        retiring: Whether a replacement was forked; the worker is stopped once it serves.
+        stopping_since: When the worker was asked to stop, if it was.
+        killed: Whether the worker was killed.
+    """
+    slot: int
+    pid: int
+    heartbeat: int
+    started_at: float
+    last_seen: float
+    ready: bool = False
+    retiring: bool = False
+    stopping_since: Optional[float] = None
+    killed: bool = False
+
+    @property
+    def serving(self) -> bool:
+        return self.ready and not self.retiring and not self.killed
+
+
+def _run_worker(app, sock: socket.socket, heartbeat: int, graceful_timeout: float):
+    """Serve the application on the shared socket until the worker is told to stop.
+
+    Runs in a forked worker. Once the server has started, a heartbeat byte is written
+    every HEARTBEAT_INTERVAL; the worker stops by itself if the supervisor is gone.
+    """
+    import asyncio
+    import uvicorn
+
+    config = uvicorn.Config(app, timeout_graceful_shutdown=graceful_timeout)
+    server = uvicorn.Server(config)
+
+    async def beat():
+        while not server.started:
+            await asyncio.sleep(0.05)
+        while not server.should_exit:
+            try:
+                os.write(heartbeat, b".")
+            except BlockingIOError:
+                pass
+            except BrokenPipeError:
+                logger.warning("Supervisor exited, stopping the server worker")
+                server.should_exit = True
+                return
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def serve():
+        task = asyncio.create_task(beat())
+        try:
+            await server.serve(sockets=[sock])
+        finally:
+            task.cancel()
+
+    os.set_blocking(heartbeat, False)
+    config.setup_event_loop()
+    asyncio.run(serve())
+
+
+class Supervisor:
+    """Forks server workers from the preloaded parent and keeps them healthy.
+
+    - A worker that exits unexpectedly is forked again; one that keeps failing to
+      start is retried with an increasing delay.
+    - A worker whose event loop misses heartbeats for heartbeat_timeout seconds, or
+      that does not start serving within startup_timeout, is killed and replaced.
+    - A worker whose private memory exceeds max_memory is recycled: a replacement is
+      forked and, once it serves, the old worker stops accepting connections and
+      finishes its requests within graceful_timeout.
+    - SIGHUP recycles every worker that way, one at a time (a rolling restart).
+      SIGTERM and SIGINT stop all workers gracefully.
+
+    Workers are forked from the parent as it was after preloading, so a rolling
+    restart sheds memory and stuck state but does not load new code.
+    """
+
+    def __init__(self, app, sock: socket.socket, workers: int, max_memory: int, heartbeat_timeout: float, graceful_timeout: float, startup_timeout: float):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.max_memory = max_memory
+        self.heartbeat_timeout = heartbeat_timeout
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self._workers: Dict[int, _Worker] = {}
+        self._failures: Dict[int, int] = {}
+        self._respawn_at: Dict[int, float] = {}
+        self._rolling: List[int] = []
+        self._stopping = False
+        self._next_memory_check = 0.0
+        self._wakeup_read, self._wakeup_write = os.pipe()
+
+    def run(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT."""
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        signal.set_wakeup_fd(self._wakeup_write)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+
+        for slot in range(self.workers):
+            self._spawn(slot)
+        logger.info(f"Supervising {self.workers} server workers (pid {os.getpid()}); send SIGHUP for a rolling restart")
+        while not self._stopping:
+            self._wait()
+            self._reap()
+            self._supervise(time.monotonic())
+        self._shutdown()
+
+    def _spawn(self, slot: int):
+        heartbeat_read, heartbeat_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.close(heartbeat_read)
+                self._prepare_child()
+                _run_worker(self.app, self.sock, heartbeat_write, self.graceful_timeout)
+                code = 0
+            except BaseException:
+                logger.exception(f"Server worker {slot} failed")
+            finally:
+                # Skip the parent's exit handlers and any conversion threads still running
+                os._exit(code)
+
+        os.close(heartbeat_write)
+        os.set_blocking(heartbeat_read, False)
+        now = time.monotonic()
+        self._workers[pid] = _Worker(slot=slot, pid=pid, heartbeat=heartbeat_read, started_at=now, last_seen=now)
+        logger.info(f"Forked server worker {slot} (pid {pid})")
+
+    def _prepare_child(self):
+        gc.enable()
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+        for worker in self._workers.values():
+            if worker.heartbeat >= 0:
+                os.close(worker.heartbeat)
+
+    def _wait(self):
+        """Wait for heartbeats or a signal, for at most HEARTBEAT_INTERVAL."""
+        by_fd = {worker.heartbeat: worker for worker in self._workers.values() if worker.heartbeat >= 0}
+        readable, _, _ = select.select([self._wakeup_read, *by_fd], [], [], HEARTBEAT_INTERVAL)
+        now = time.monotonic()
+        for fd in readable:
+            if fd == self._wakeup_read:
+                _drain(fd)
+                continue
+            worker = by_fd[fd]
+            if not _drain(fd):
+                # The worker closed its end; it is reaped once it has exited
+                os.close(fd)
+                worker.heartbeat = -1
+                continue
+            worker.last_seen = now
+            if not worker.ready:
+                worker.ready = True
+                self._failures.pop(worker.slot, None)
+                logger.info(f"Server worker {worker.slot} (pid {worker.pid}) is serving after {now - worker.started_at:.1f}s")
+                for old in self._workers.values():
+                    if old.slot == worker.slot and old.retiring and old.stopping_since is None:
+                        self._stop(old)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.heartbeat >= 0:
+                os.close(worker.heartbeat)
+            code = os.waitstatus_to_exitcode(status)
+            if worker.retiring or self._stopping:
+                logger.info(f"Server worker {worker.slot} (pid {pid}) stopped")
+            elif worker.ready:
+                logger.warning(f"Server worker {worker.slot} (pid {pid}) exited with status {code}, forking a new one")
+                self._spawn(worker.slot)
+            else:
+                failures = self._failures[worker.slot] = self._failures.get(worker.slot, 0) + 1
+                delay = min(2.0 ** (failures - 1), MAX_RESPAWN_DELAY)
+                logger.warning(f"Server worker {worker.slot} (pid {pid}) exited with status {code} before serving, retrying in {delay:.0f}s")
+                self._respawn_at[worker.slot] = time.monotonic() + delay
+
+    def _supervise(self, now: float):
+        for slot, due in list(self._respawn_at.items()):
+            if now >= due:
+                del self._respawn_at[slot]
+                self._spawn(slot)
+
+        for worker in list(self._workers.values()):
+            if worker.killed:
+                continue
+            if worker.stopping_since is not None:
+                if now - worker.stopping_since > self.graceful_timeout + KILL_MARGIN:
+                    self._kill(worker, f"did not stop within {self.graceful_timeout + KILL_MARGIN:.0f}s")
+            elif not worker.ready:
+                if now - worker.started_at > self.startup_timeout:
+                    self._kill(worker, f"did not start serving within {self.startup_timeout:.0f}s")
+            elif now - worker.last_seen > self.heartbeat_timeout:
+                self._kill(worker, f"sent no heartbeat for {now - worker.last_seen:.0f}s")
+
+        if self.max_memory > 0 and now >= self._next_memory_check:
+            self._next_memory_check = now + MEMORY_CHECK_INTERVAL
+            if not self._replacing():
+                for worker in list(self._workers.values()):
+                    memory = private_memory(worker.pid) if worker.serving else None
+                    if memory is not None and memory > self.max_memory:
+                        logger.warning(f"Server worker {worker.slot} (pid {worker.pid}) uses {memory / 2**20:.0f} MB of private memory (limit {self.max_memory / 2**20:.0f} MB), recycling it")
+                        self._recycle(worker)
+                        break
+
+        if self._rolling and not self._replacing():
+            slot = self._rolling.pop(0)
+            worker = next((w for w in self._workers.values() if w.slot == slot and w.serving), None)
+            if worker is not None:
+                logger.info(f"Rolling restart: replacing server worker {slot} (pid {worker.pid})")
+                self._recycle(worker)
+
+    def _replacing(self) -> bool:
+        """Whether a replacement is in progress; workers are replaced one at a time."""
+        return any(worker.retiring for worker in self._workers.values())
+
+    def _recycle(self, worker: _Worker):
+        worker.retiring = True
+        self._spawn(worker.slot)
+
+    def _stop(self, worker: _Worker):
+        worker.stopping_since = time.monotonic()
+        _signal(worker.pid, signal.SIGTERM)
+
+    def _kill(self, worker: _Worker, reason: str):
+        logger.warning(f"Server worker {worker.slot} (pid {worker.pid}) {reason}, killing it")
+        worker.killed = True
+        _signal(worker.pid, signal.SIGKILL)
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_restart(self, signum, frame):
+        if not self._stopping:
+            self._rolling = sorted({worker.slot for worker in self._workers.values() if worker.serving})
+            logger.info(f"Rolling restart of {len(self._rolling)} server workers requested")
+
+    def _shutdown(self):
+        """Stop every worker gracefully, killing those that do not stop in time."""
+        logger.info(f"Stopping {len(self._workers)} server workers")
+        for worker in self._workers.values():
+            if worker.stopping_since is None:
+                self._stop(worker)
+        deadline = time.monotonic() + self.graceful_timeout + KILL_MARGIN
+        while self._workers and time.monotonic() < deadline:
+            time.sleep(0.1)
+            self._reap()
+        for worker in list(self._workers.values()):
+            self._kill(worker, "did not stop in time")
+            os.waitpid(worker.pid, 0)
+        logger.info("Server workers stopped")
+
+
+def _drain(fd: int) -> bool:
+    """Read everything available from a non-blocking pipe; False once it is closed."""
+    try:
+        while True:
+            data = os.read(fd, 4096)
+            if not data:
+                return False
+            if len(data) < 4096:
+                return True
+    except BlockingIOError:
+        return True
+
+
+def _signal(pid: int, signum: int):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def main():
+    """Preload the MarkItDown stack, bind the port and supervise the forked server workers."""
+    # Server workers convert in-process, on the stack preloaded here; a pool of
+    # spawned conversion processes per worker would import it all over again
+    os.environ["CONVERSION_WORKERS"] = "0"
+    # Objects created while preloading are frozen before forking, so garbage
+    # collections in the workers do not touch (and copy) the shared pages
+    gc.disable()
+
+    started = time.perf_counter()
+    from main import app
+    from converter import preload
+    from config import SERVER_WORKERS, SERVER_HOST, SERVER_PORT, SERVER_MAX_MEMORY_MB, SERVER_HEARTBEAT_TIMEOUT, SERVER_GRACEFUL_TIMEOUT
+    from constants import WORKER_STARTUP_TIMEOUT
+
+    preload()
+    logger.info(f"Preloaded the MarkItDown stack in {time.perf_counter() - started:.1f}s")
+    if threading.active_count() > 1:
+        logger.warning(f"{threading.active_count() - 1} threads were started while preloading; they do not exist in forked workers")
+
+    family = socket.AF_INET6 if ":" in SERVER_HOST else socket.AF_INET
+    sock = socket.create_server((SERVER_HOST, SERVER_PORT), family=family, backlog=2048)
+    logger.info(f"Listening on {SERVER_HOST}:{SERVER_PORT}")
+    gc.freeze()
+    try:
+        Supervisor(
+            app,
+            sock,
+            workers=max(SERVER_WORKERS, 1),
+            max_memory=SERVER_MAX_MEMORY_MB * 1024 * 1024,
+            heartbeat_timeout=SERVER_HEARTBEAT_TIMEOUT,
+            graceful_timeout=SERVER_GRACEFUL_TIMEOUT,
+            startup_timeout=WORKER_STARTUP_TIMEOUT
+        ).run()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Single-flight coalescing: concurrent identical conversions share one run."""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from config import CONVERSION_COALESCING
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Caller:
+    """A caller waiting on a flight, with the call it would run itself."""
+
+    def __init__(self, call: Callable[[], Awaitable[Any]], handoff: bool):
+        self.call = call
+        self.handoff = handoff
+
+
+class _Flight:
+    """One running call and the callers sharing its outcome."""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.callers: List[_Caller] = []
+        self.runner: Optional[_Caller] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, caller: _Caller):
+        """Run a caller's call on behalf of every caller of the flight."""
+        self.runner = caller
+        self.task = asyncio.ensure_future(self._run(caller.call))
+
+    async def _run(self, call: Callable[[], Awaitable[Any]]):
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # Cancelled because every caller left, or to hand the flight to another caller
+            raise
+        except BaseException as e:
+            if not self.future.done():
+                self.future.set_exception(e)
+        else:
+            if not self.future.done():
+                self.future.set_result(result)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers arriving meanwhile share it.
+
+    The first caller of a key starts its call in a task of its own, and every caller
+    of the key, the first included, waits for that task's result or exception. A
+    caller that is cancelled, for instance because its client disconnected, only stops
+    waiting: the call goes on for the others and is cancelled once nobody waits for it.
+    If the call depends on its own caller (handoff, e.g. a job reading the caller's
+    spooled upload, which is removed when that request ends), it is restarted with the
+    call of the next waiting caller instead.
+
+    The key is dropped as soon as the call finishes, so later callers start afresh
+    (and find the result in the result cache, if enabled).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    @property
+    def in_flight(self) -> int:
+        """Number of keys with a call running."""
+        return len(self._flights)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]], handoff: bool = False) -> Any:
+        """Run call, or join the call already running for key.
+
+        Args:
+            key: Identifies identical calls.
+            call: Produces the result; only run if no call for key is running, or when
+                the flight is handed off to this caller.
+            handoff: Whether the call depends on this caller and must not outlive it.
+
+        Returns:
+            The result of the call run for key.
+
+        Raises:
+            Exception: Whatever the call raised, for every caller sharing it.
+        """
+        if not self.enabled:
+            return await call()
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.get_running_loop().create_future())
+            flight.future.add_done_callback(lambda _: self._finish(key, flight))
+        else:
+            metrics.record_coalesced()
+        caller = _Caller(call, handoff)
+        flight.callers.append(caller)
+        if flight.task is None:
+            flight.start(caller)
+
+        try:
+            return await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            if not flight.future.done():
+                self._leave(flight, caller)
+            raise
+        finally:
+            if caller in flight.callers:
+                flight.callers.remove(caller)
+
+    def _leave(self, flight: _Flight, caller: _Caller):
+        """Handle a caller that stopped waiting before the call finished."""
+        flight.callers.remove(caller)
+        if not flight.callers:
+            flight.task.cancel()
+            flight.future.cancel()
+        elif flight.runner is caller and caller.handoff:
+            logger.info(f"Caller of a shared conversion left, restarting it for {len(flight.callers)} waiting callers")
+            flight.task.cancel()
+            flight.start(flight.callers[0])
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+# Global coalescing of identical conversions
+conversion_flights = SingleFlight(enabled=CONVERSION_COALESCING)
@@ -0,0 +1,245 @@
+"""Streaming XLSX and CSV conversion: rows are read lazily and rendered as Markdown tables as they go."""
+
+import csv
+import io
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from markitdown import DocumentConverter, DocumentConverterResult, StreamInfo
+from markitdown.converters._csv_converter import _escape_table_cell
+
+from executor import Segment
+from selection import DocumentSelection
+from config import TABULAR_BLOCK_ROWS
+
+XLSX_EXTENSIONS = (".xlsx",)
+XLSX_MIME_TYPE_PREFIXES = ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",)
+CSV_EXTENSIONS = (".csv",)
+CSV_MIME_TYPE_PREFIXES = ("text/csv", "application/csv")
+
+# Bytes of a CSV file used to detect its encoding
+CHARSET_SAMPLE_SIZE = 64 * 1024
+
+
+def _table_row(cells: List[str]) -> str:
+    return "| " + " | ".join(cells) + " |"
+
+
+def table_blocks(header: List[str], rows: Iterator[List[str]], block_rows: int = TABULAR_BLOCK_ROWS, max_rows: Optional[int] = None) -> Iterator[str]:
+    """Render a header and rows as Markdown tables of at most block_rows rows each.
+
+    Every table repeats the header row, so each block reads on its own.
+
+    Args:
+        header: The escaped header cells.
+        rows: The escaped cells of each data row, already padded to the header width.
+        block_rows: Data rows per table; 0 renders one table.
+        max_rows: Stop after this many data rows.
+
+    Yields:
+        str: One Markdown table per block.
+    """
+    head = _table_row(header) + "\n" + _table_row(["---"] * len(header))
+    lines: List[str] = []
+    count = 0
+    for row in rows:
+        if max_rows is not None and count >= max_rows:
+            break
+        lines.append(_table_row(row))
+        count += 1
+        if block_rows and len(lines) >= block_rows:
+            yield head + "\n" + "\n".join(lines)
+            lines = []
+    if lines or count == 0:
+        yield head + "".join("\n" + line for line in lines)
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    return _escape_table_cell(str(value))
+
+
+def _pad(cells: List[str], width: int) -> List[str]:
+    # Cells beyond the header width are kept at the end of their row
+    return cells + [""] * (width - len(cells))
+
+
+def _sheet_rows(worksheet) -> Iterator[List[str]]:
+    """Yield the cells of a worksheet's rows without leading, trailing or trailing-cell blanks."""
+    pending = 0
+    started = False
+    for values in worksheet.iter_rows(values_only=True):
+        cells = [_cell(value) for value in values]
+        while cells and cells[-1] == "":
+            cells.pop()
+        if not cells:
+            pending += started
+            continue
+        # Blank rows are held back until a later row shows they are not trailing
+        for _ in range(pending):
+            yield []
+        pending = 0
+        started = True
+        yield cells
+
+
+def iter_xlsx_tables(file_stream: BinaryIO, selection: Optional[DocumentSelection] = None, **kwargs: Any) -> Iterator[Segment]:
+    """Yield the worksheets of a workbook as Markdown tables, reading rows lazily.
+
+    The workbook is opened in read-only mode, so rows are parsed as they are rendered
+    and memory stays flat whatever the sheet size. The first non-blank row of a sheet
+    is its header. With a sheet selection, unselected sheets are never parsed.
+
+    Yields:
+        "sheet" segments; the first of each sheet starts with a "## <name>" heading and
+        long sheets continue in further segments of TABULAR_BLOCK_ROWS rows.
+
+    Raises:
+        ValueError: If a selected sheet does not exist.
+    """
+    import openpyxl
+
+    selected = selection.sheets if selection else None
+    max_rows = selection.max_rows if selection else None
+    workbook = openpyxl.load_workbook(file_stream, read_only=True, data_only=True)
+    try:
+        names = [worksheet.title for worksheet in workbook.worksheets]
+        if selected:
+            missing = [name for name in selected if name not in names]
+            if missing:
+                raise ValueError(f"Sheets not found: {', '.join(missing)}")
+        for index, worksheet in enumerate(workbook.worksheets, start=1):
+            name = worksheet.title
+            if selected and name not in selected:
+                continue
+            rows = _sheet_rows(worksheet)
+            header = next(rows, None)
+            if header is None:
+                yield Segment(kind="sheet", index=index, label=name, markdown=f"## {name}")
+                continue
+            width = len(header)
+            heading = f"## {name}\n"
+            for block in table_blocks(header, (_pad(cells, width) for cells in rows), max_rows=max_rows):
+                yield Segment(kind="sheet", index=index, label=name, markdown=heading + block)
+                heading = ""
+    finally:
+        workbook.close()
+
+
+def _csv_encoding(file_stream: BinaryIO, charset: Optional[str]) -> str:
+    """Pick the encoding of a CSV stream, detecting it from a sample when not given."""
+    if not charset:
+        from charset_normalizer import from_bytes
+
+        position = file_stream.tell()
+        detected = from_bytes(file_stream.read(CHARSET_SAMPLE_SIZE)).best()
+        file_stream.seek(position)
+        charset = detected.encoding if detected is not None else "utf-8"
+    charset = charset.lower().replace("_", "-")
+    # Excel prepends a UTF-8 BOM to CSV exports; it must not end up in the first header cell
+    return "utf-8-sig" if charset in ("ascii", "utf-8", "utf8") else charset
+
+
+def _csv_bounds(file_stream: BinaryIO, encoding: str) -> Optional[Tuple[int, int, int, int]]:
+    """Scan a CSV once for the rows MarkItDown's CSV converter keeps.
+
+    Returns:
+        (header row, first data row, last data row, width) as row numbers and column
+        count, or None if the file has no rows.
+    """
+    header = first = last = None
+    width = 0
+    text = io.TextIOWrapper(file_stream, encoding=encoding, errors="replace", newline="")
+    try:
+        for number, row in enumerate(csv.reader(text)):
+            if not row:
+                continue
+            if header is None:
+                header = number
+            elif first is None:
+                first = number
+            last = number
+            width = max(width, len(row))
+    finally:
+        text.detach()
+    if header is None:
+        return None
+    return header, first if first is not None else header + 1, last, width
+
+
+def iter_csv_tables(file_stream: BinaryIO, selection: Optional[DocumentSelection] = None, charset: Optional[str] = None, **kwargs: Any) -> Iterator[Segment]:
+    """Yield a CSV file as Markdown tables, parsing it incrementally.
+
+    The file is read twice, once to find its width and outer blank rows and once to
+    render it, so memory stays flat whatever its size. The table matches MarkItDown's
+    CSV converter, split into blocks of TABULAR_BLOCK_ROWS rows.
+
+    Yields:
+        One "table" segment per block.
+    """
+    max_rows = selection.max_rows if selection else None
+    encoding = _csv_encoding(file_stream, charset)
+    start = file_stream.tell()
+    bounds = _csv_bounds(file_stream, encoding)
+    if bounds is None:
+        return
+    header_number, first, last, width = bounds
+    file_stream.seek(start)
+
+    text = io.TextIOWrapper(file_stream, encoding=encoding, errors="replace", newline="")
+    try:
+        rows = enumerate(csv.reader(text))
+        header = next(_pad([_escape_table_cell(cell) for cell in row], width) for number, row in rows if number == header_number)
+
+        def body() -> Iterator[List[str]]:
+            for number, row in rows:
+                if number > last:
+                    break
+                if number >= first:
+                    yield _pad([_escape_table_cell(cell) for cell in row], width)
+
+        for index, block in enumerate(table_blocks(header, body(), max_rows=max_rows), start=1):
+            yield Segment(kind="table", index=index, markdown=block)
+    finally:
+        text.detach()
+
+
+class TabularConverter(DocumentConverter):
+    """Converts XLSX and CSV files without loading them into DataFrames.
+
+    Registered ahead of MarkItDown's XlsxConverter and CsvConverter. Rows are read
+    lazily and rendered block by block; see iter_xlsx_tables() and iter_csv_tables().
+    """
+
+    def accepts(self, file_stream: BinaryIO, stream_info: StreamInfo, **kwargs: Any) -> bool:
+        return _tabular_kind(stream_info) is not None
+
+    def convert(self, file_stream: BinaryIO, stream_info: StreamInfo, **kwargs: Any) -> DocumentConverterResult:
+        if _tabular_kind(stream_info) == "xlsx":
+            segments = iter_xlsx_tables(file_stream)
+        else:
+            segments = iter_csv_tables(file_stream, charset=stream_info.charset)
+        return DocumentConverterResult(markdown="\n\n".join(segment.markdown for segment in segments).strip())
+
+
+def _tabular_kind(stream_info: StreamInfo) -> Optional[str]:
+    mimetype = (stream_info.mimetype or "").lower()
+    extension = (stream_info.extension or "").lower()
+    if extension in XLSX_EXTENSIONS or mimetype.startswith(XLSX_MIME_TYPE_PREFIXES):
+        return "xlsx"
+    if extension in CSV_EXTENSIONS or mimetype.startswith(CSV_MIME_TYPE_PREFIXES):
+        return "csv"
+    return None
+
+
+def tabular_file(file_extension: Optional[str]) -> bool:
+    """Whether files with this extension are converted by the streaming tabular converter."""
+    extension = "." + (file_extension or "").lower().lstrip(".")
+    return extension in XLSX_EXTENSIONS or extension in CSV_EXTENSIONS
+
+
+def tabular_settings() -> Dict[str, Any]:
+    """Describe the tabular settings for the result cache key of XLSX and CSV files."""
+    return {
+        "block_rows": TABULAR_BLOCK_ROWS
+    }
@@ -0,0 +1,22 @@
+"""Shared test setup.
+
+Run from src/AIKit.MarkItDown.Server:
+
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+
+Remote services (HTTP origins, OpenAI-compatible and Document Intelligence
+endpoints) are replaced by local stand-ins, so the tests run offline.
+"""
+
+import os
+import sys
+
+# Convert in-process and keep every cache in memory, before config.py reads the environment
+os.environ.setdefault("CONVERSION_WORKERS", "0")
+os.environ.setdefault("STARTUP_MODE", "lazy")
+os.environ.setdefault("CACHE_DIR", "")
+os.environ.setdefault("CAPTION_CACHE_PATH", "")
+os.environ.setdefault("API_KEY", "")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,46 @@
+"""Tests for ZIP archives uploaded to /convert."""
+
+import asyncio
+import io
+import zipfile
+from typing import Dict, List
+
+import httpx
+import pytest
+
+
+def archive(members: Dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, text in members.items():
+            zf.writestr(name, text)
+    return buffer.getvalue()
+
+
+def convert(document: bytes, data: Dict[str, str], params: Dict[str, str]) -> List[httpx.Response]:
+    from main import app
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://server.test") as client:
+                return await client.post("/convert", files={"file": ("notes.zip", document)}, data=data, params=params)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("params", [{}, {"stream": "true"}])
+def test_max_chars_caps_archive_markdown(params):
+    document = archive({f"part{index}.txt": f"Member {index} " + "text " * 40 for index in range(4)})
+
+    full = convert(document, {}, params)
+    capped = convert(document, {"max_chars": "120"}, params)
+
+    assert full.status_code == 200 and capped.status_code == 200
+    assert len(full.text) > 300
+    if params:
+        # As in other streamed conversions, the cap counts segment Markdown, not the separators between segments
+        assert full.text.startswith(capped.text)
+        assert len(capped.text) == 120 + len("\n\n")
+    else:
+        assert capped.text == full.text[:120]
+        assert capped.headers["etag"] != full.headers["etag"]
@@ -0,0 +1,42 @@
+"""Tests for result cache and coalescing keys."""
+
+import pytest
+
+import tabular
+import transcription
+from cache import cache_key
+from conversion import flight_key, uri_key
+from models import MarkDownConfig
+
+
+def test_tabular_block_rows_are_part_of_the_key(monkeypatch):
+    config = MarkDownConfig()
+    xlsx, csv, pdf = (cache_key("hash", extension, config) for extension in ("xlsx", ".csv", "pdf"))
+
+    monkeypatch.setattr(tabular, "TABULAR_BLOCK_ROWS", 50)
+
+    assert cache_key("hash", "xlsx", config) != xlsx
+    assert cache_key("hash", ".csv", config) != csv
+    assert cache_key("hash", "pdf", config) == pdf
+
+
+@pytest.mark.parametrize("setting, value", [("TRANSCRIBE_OVERLAP_MS", 1), ("TRANSCRIBE_MIN_SILENCE_MS", 1), ("TRANSCRIBE_SILENCE_DB", 1)])
+def test_segmentation_settings_are_part_of_the_key(monkeypatch, setting, value):
+    monkeypatch.setattr(transcription, "TRANSCRIBE_SEGMENTED", True)
+    config = MarkDownConfig()
+    wav = cache_key("hash", "wav", config)
+
+    monkeypatch.setattr(transcription, setting, value)
+
+    assert cache_key("hash", "wav", config) != wav
+
+
+def test_coalescing_key_separates_credentials():
+    alice, bob = MarkDownConfig(llm_api_key="alice-key"), MarkDownConfig(llm_api_key="bob-key")
+    # The cache key only records that a key is set
+    assert cache_key("hash", "pptx", alice) == cache_key("hash", "pptx", bob)
+
+    assert flight_key(cache_key("hash", "pptx", alice), alice) != flight_key(cache_key("hash", "pptx", bob), bob)
+    assert flight_key(cache_key("hash", "pptx", alice), alice) == flight_key(cache_key("hash", "pptx", alice), MarkDownConfig(llm_api_key="alice-key"))
+    assert uri_key("https://example.test/a.pdf", MarkDownConfig(docintel_key="one")) != uri_key("https://example.test/a.pdf", MarkDownConfig(docintel_key="two"))
+    assert "alice-key" not in flight_key(cache_key("hash", "pptx", alice), alice)
@@ -0,0 +1,170 @@
+"""Tests for memoized image descriptions against a local fake OpenAI-compatible endpoint."""
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import httpx
+import openai
+import pytest
+
+from captions import CaptionCache, CaptioningClient
+
+
+class FakeOpenAI:
+    """A local OpenAI-compatible chat completions endpoint describing images by content.
+
+    Each image is described as "Description of <first 8 hex digits of its SHA-256>",
+    or, when failing is set, every request is answered with a 400 error, which the
+    OpenAI client does not retry.
+    """
+
+    def __init__(self):
+        self.calls: List[Tuple[str, str, str]] = []
+        self.failing = False
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if fake.failing:
+                    self._reply(400, {"error": {"message": "model unavailable", "type": "invalid_request_error"}})
+                    return
+                prompt = image = None
+                for part in body["messages"][0]["content"]:
+                    if part["type"] == "text":
+                        prompt = part["text"]
+                    else:
+                        image = base64.b64decode(part["image_url"]["url"].split(",", 1)[1])
+                digest = hashlib.sha256(image).hexdigest()[:8]
+                fake.calls.append((body["model"], prompt, digest))
+                self._reply(200, {
+                    "id": "chatcmpl-test",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f"Description of {digest}"}}]
+                })
+
+            def _reply(self, status: int, payload: Dict):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_openai():
+    fake = FakeOpenAI()
+    yield fake
+    fake.close()
+
+
+def png(color: Tuple[int, int, int]) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def short_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:8]
+
+
+def pptx(images: List[bytes]) -> bytes:
+    """Build a presentation with one picture per slide."""
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    presentation = Presentation()
+    for image in images:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+        slide.shapes.add_picture(io.BytesIO(image), Inches(1), Inches(1))
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def image_request(image: bytes) -> List[Dict]:
+    data_uri = f"data:image/png;base64,{base64.b64encode(image).decode('utf-8')}"
+    return [{"role": "user", "content": [{"type": "text", "text": "Describe it."}, {"type": "image_url", "image_url": {"url": data_uri}}]}]
+
+
+def test_descriptions_are_memoized(fake_openai):
+    client = CaptioningClient(openai.OpenAI(api_key="test-key", base_url=fake_openai.base_url), cache=CaptionCache(max_entries=100))
+    image = png((255, 0, 0))
+
+    first = client.chat.completions.create(model="vision", messages=image_request(image))
+    second = client.chat.completions.create(model="vision", messages=image_request(image))
+
+    assert first.choices[0].message.content == f"Description of {short_hash(image)}"
+    assert second.choices[0].message.content == first.choices[0].message.content
+    assert fake_openai.calls == [("vision", "Describe it.", short_hash(image))]
+
+
+def test_failed_description_is_not_cached(fake_openai):
+    client = CaptioningClient(openai.OpenAI(api_key="test-key", base_url=fake_openai.base_url, max_retries=0), cache=CaptionCache(max_entries=100))
+    image = png((0, 255, 0))
+
+    fake_openai.failing = True
+    with pytest.raises(openai.BadRequestError):
+        client.chat.completions.create(model="vision", messages=image_request(image))
+
+    fake_openai.failing = False
+    response = client.chat.completions.create(model="vision", messages=image_request(image))
+
+    assert response.choices[0].message.content == f"Description of {short_hash(image)}"
+    assert len(fake_openai.calls) == 1
+
+
+async def convert(document: bytes, config: Dict) -> httpx.Response:
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://server.test") as client:
+            return await client.post("/convert", files={"file": ("slides.pptx", document)}, data={"config": json.dumps(config)})
+
+
+def test_convert_describes_pptx_images(fake_openai, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", fake_openai.base_url)
+    blue, yellow = png((0, 0, 255)), png((255, 255, 0))
+
+    response = asyncio.run(convert(pptx([blue, yellow, blue]), {"llm_api_key": "convert-key", "llm_model": "vision", "keep_data_uris": False}))
+
+    assert response.status_code == 200
+    assert response.text.count(f"Description of {short_hash(blue)}") == 2
+    assert response.text.count(f"Description of {short_hash(yellow)}") == 1
+    # The repeated image is described once
+    assert sorted(digest for _, _, digest in fake_openai.calls) == sorted([short_hash(blue), short_hash(yellow)])
+    assert {prompt for _, prompt, _ in fake_openai.calls} == {"Write a detailed caption for this image."}
+
+
+def test_convert_falls_back_when_descriptions_fail(fake_openai, monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", fake_openai.base_url)
+    fake_openai.failing = True
+
+    response = asyncio.run(convert(pptx([png((255, 0, 255))]), {"llm_api_key": "failing-key", "llm_model": "vision", "keep_data_uris": False}))
+
+    assert response.status_code == 200
+    assert "Description of" not in response.text
+    # MarkItDown keeps the picture with its alt text instead of a description
+    assert "![image.png](Picture1.jpg)" in response.text
@@ -0,0 +1,215 @@
+"""Tests for managed Document Intelligence calls against a stub analyze endpoint."""
+
+import asyncio
+from typing import Callable, List, Optional
+
+import httpx
+import pytest
+
+import docintel
+from docintel import DocIntelError, DocIntelService
+from executor import ConversionJob, ConversionPool, ConversionTimeoutError
+from models import MarkDownConfig
+
+ENDPOINT = "https://docintel.test"
+KEY = "stub-key"
+OPERATION = f"{ENDPOINT}/documentintelligence/documentModels/prebuilt-layout/analyzeResults/op-1"
+
+
+class StubAnalyze:
+    """A stand-in for the prebuilt-layout analyze endpoint.
+
+    The analyze POST is answered from post_responses in turn (202 with an
+    Operation-Location once they run out), and each poll from poll_states in turn
+    (the last state repeats).
+    """
+
+    def __init__(self, post_responses: Optional[List[Callable[[], httpx.Response]]] = None, poll_states: Optional[List[str]] = None, content: str = "# Title\n\nBody"):
+        self.post_responses = list(post_responses or [])
+        self.poll_states = list(poll_states or ["succeeded"])
+        self.content = content
+        self.requests: List[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.method == "POST":
+            if self.post_responses:
+                return self.post_responses.pop(0)()
+            return httpx.Response(202, headers={"Operation-Location": OPERATION})
+        status = self.poll_states.pop(0) if len(self.poll_states) > 1 else self.poll_states[0]
+        payload = {"status": status}
+        if status == "succeeded":
+            payload["analyzeResult"] = {"content": self.content}
+        elif status == "failed":
+            payload["error"] = {"code": "InvalidContent", "message": "The file is corrupted."}
+        return httpx.Response(200, json=payload)
+
+    @property
+    def posts(self) -> int:
+        return sum(request.method == "POST" for request in self.requests)
+
+    @property
+    def polls(self) -> int:
+        return sum(request.method == "GET" for request in self.requests)
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> List[float]:
+    """Record the delays the service sleeps for, without actually waiting."""
+    recorded: List[float] = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        recorded.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(docintel.asyncio, "sleep", sleep)
+    return recorded
+
+
+def make_service(stub: StubAnalyze, max_retries: int = 3, retry_max: float = 30, page_batch: int = 0) -> DocIntelService:
+    # No jitter, so the recorded delays are exact
+    return DocIntelService(
+        api_version="2024-11-30",
+        max_concurrency=2,
+        max_retries=max_retries,
+        retry_base=0,
+        retry_max=retry_max,
+        poll_interval=0.5,
+        page_batch=page_batch,
+        timeout=5,
+        transport=httpx.MockTransport(stub)
+    )
+
+
+def analyze(service: DocIntelService, extension: str = "pdf") -> str:
+    async def run():
+        await service.start()
+        try:
+            return await service.analyze(ENDPOINT, KEY, b"%PDF-1.7 stub", extension)
+        finally:
+            await service.shutdown()
+
+    return asyncio.run(run())
+
+
+def test_polls_until_the_analysis_succeeds(sleeps):
+    stub = StubAnalyze(poll_states=["notStarted", "running", "succeeded"], content="<!-- PageHeader=\"x\" -->\n# Title\n\nBody")
+
+    markdown = analyze(make_service(stub))
+
+    assert markdown.strip() == "# Title\n\nBody"
+    assert (stub.posts, stub.polls) == (1, 3)
+    assert sleeps == [0.5, 0.5, 0.5]
+    post = stub.requests[0]
+    assert post.url.path == "/documentintelligence/documentModels/prebuilt-layout:analyze"
+    assert post.url.params["outputContentFormat"] == "markdown"
+    assert post.url.params["features"] == docintel.OCR_FEATURES
+    assert post.headers["Ocp-Apim-Subscription-Key"] == KEY
+    assert all(request.headers["Ocp-Apim-Subscription-Key"] == KEY for request in stub.requests[1:])
+
+
+def test_office_formats_are_analyzed_without_ocr_features(sleeps):
+    stub = StubAnalyze()
+
+    analyze(make_service(stub), extension="docx")
+
+    assert "features" not in stub.requests[0].url.params
+
+
+def test_failed_analysis_raises(sleeps):
+    stub = StubAnalyze(poll_states=["running", "failed"])
+
+    with pytest.raises(DocIntelError, match="InvalidContent"):
+        analyze(make_service(stub))
+
+
+def test_throttling_and_server_errors_are_retried_honouring_retry_after(sleeps):
+    stub = StubAnalyze(post_responses=[
+        lambda: httpx.Response(429, headers={"Retry-After": "3"}, json={"error": {"code": "429", "message": "Rate limit"}}),
+        lambda: httpx.Response(503, headers={"Retry-After": "1"}),
+        # Retry-After beyond retry_max is capped
+        lambda: httpx.Response(500, headers={"Retry-After": "120"}),
+    ])
+
+    markdown = analyze(make_service(stub, retry_max=10))
+
+    assert markdown == "# Title\n\nBody"
+    assert stub.posts == 4
+    assert sleeps[:3] == [3, 1, 10]
+
+
+def test_poll_is_retried_too(sleeps):
+    stub = StubAnalyze(content="done")
+    failed_polls = [httpx.Response(502)]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET" and failed_polls:
+            return failed_polls.pop()
+        return stub(request)
+
+    service = make_service(stub)
+    service.transport = httpx.MockTransport(handler)
+
+    assert analyze(service) == "done"
+    assert stub.polls == 1
+
+
+def test_retries_are_limited(sleeps):
+    stub = StubAnalyze(post_responses=[lambda: httpx.Response(503)] * 10)
+
+    with pytest.raises(DocIntelError) as raised:
+        analyze(make_service(stub, max_retries=2))
+
+    assert raised.value.status_code == 503
+    assert "after 3 attempts" in str(raised.value)
+    assert stub.posts == 3
+    assert len(sleeps) == 2
+
+
+def test_request_timeouts_are_retried_then_fail(sleeps):
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        raise httpx.ReadTimeout("read timed out", request=request)
+
+    service = make_service(StubAnalyze(), max_retries=1)
+    service.transport = httpx.MockTransport(handler)
+
+    with pytest.raises(DocIntelError) as raised:
+        analyze(service)
+
+    assert raised.value.status_code is None
+    assert "ReadTimeout" in str(raised.value)
+    assert len(attempts) == 2
+
+
+def test_rejected_document_is_a_validation_error(sleeps):
+    stub = StubAnalyze(post_responses=[lambda: httpx.Response(400, json={"error": {"code": "InvalidRequest", "message": "Unsupported"}})])
+
+    with pytest.raises(ValueError, match="rejected the document"):
+        analyze(make_service(stub))
+
+    assert stub.posts == 1
+
+
+def test_analysis_that_never_finishes_times_out(monkeypatch):
+    stub = StubAnalyze(poll_states=["running"])
+    monkeypatch.setattr(docintel.docintel_service, "transport", httpx.MockTransport(stub))
+    monkeypatch.setattr(docintel.docintel_service, "poll_interval", 0.01)
+    pool = ConversionPool(processes=0, timeout=0.5, max_jobs_per_worker=1, start_method="spawn", startup_mode="lazy")
+    job = ConversionJob(source=b"%PDF-1.7 stub", source_type="bytes", file_extension="pdf", config=MarkDownConfig(docintel_endpoint=ENDPOINT, docintel_key=KEY))
+
+    async def run():
+        await docintel.docintel_service.shutdown()
+        try:
+            return await pool.run(job)
+        finally:
+            await docintel.docintel_service.shutdown()
+            await pool.shutdown()
+
+    with pytest.raises(ConversionTimeoutError):
+        asyncio.run(run())
+
+    assert stub.polls > 1
@@ -0,0 +1,221 @@
+"""Tests for server-side URI fetching against a stand-in HTTP origin."""
+
+import asyncio
+from typing import Callable, Dict, List
+
+import httpx
+import pytest
+
+import fetch
+from fetch import FetchCache, FetchError, UriFetcher
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+def make_fetcher(handler: Callable, per_host_connections: int = 4, max_bytes: int = 1024 * 1024) -> UriFetcher:
+    return UriFetcher(
+        timeout=5,
+        connect_timeout=5,
+        max_bytes=max_bytes,
+        max_redirects=5,
+        max_connections=10,
+        per_host_connections=per_host_connections,
+        cache=FetchCache(max_entries=100, max_bytes=1024 * 1024),
+        transport=httpx.MockTransport(handler)
+    )
+
+
+class Origin:
+    """A stand-in origin serving one text document with ETag and Last-Modified validators."""
+
+    def __init__(self, body: bytes = b"hello world"):
+        self.body = body
+        self.requests: List[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers.get("if-none-match") == ETAG:
+            return httpx.Response(304, headers={"ETag": ETAG})
+        return httpx.Response(200, content=self.body, headers={"Content-Type": "text/plain", "ETag": ETAG, "Last-Modified": LAST_MODIFIED})
+
+
+async def fetch_once(fetcher: UriFetcher, uri: str, conditional: bool = True) -> fetch.FetchResult:
+    result = await fetcher.fetch(uri, conditional)
+    result.close()
+    return result
+
+
+def test_fetch_then_revalidate_sends_validators():
+    origin = Origin()
+    fetcher = make_fetcher(origin)
+
+    async def run():
+        try:
+            first = await fetch_once(fetcher, "http://origin.test/doc.txt")
+            second = await fetch_once(fetcher, "http://origin.test/doc.txt")
+        finally:
+            await fetcher.shutdown()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert not first.revalidated
+    assert first.entry.extension == "txt"
+    assert "if-none-match" not in origin.requests[0].headers
+    assert origin.requests[1].headers["if-none-match"] == ETAG
+    assert origin.requests[1].headers["if-modified-since"] == LAST_MODIFIED
+    assert second.revalidated
+    assert second.entry.content_hash == first.entry.content_hash
+
+
+def test_not_modified_reuses_cached_body():
+    fetcher = make_fetcher(Origin(b"cached body"))
+
+    async def run():
+        try:
+            await fetch_once(fetcher, "http://origin.test/doc.txt")
+            return await fetch_once(fetcher, "http://origin.test/doc.txt")
+        finally:
+            await fetcher.shutdown()
+
+    result = asyncio.run(run())
+
+    assert result.revalidated
+    assert result.upload is None
+    assert result.has_body
+    assert result.job_source() == (b"cached body", "bytes")
+
+
+def test_unconditional_fetch_downloads_again():
+    origin = Origin()
+    fetcher = make_fetcher(origin)
+
+    async def run():
+        try:
+            await fetch_once(fetcher, "http://origin.test/doc.txt")
+            return await fetch_once(fetcher, "http://origin.test/doc.txt", conditional=False)
+        finally:
+            await fetcher.shutdown()
+
+    result = asyncio.run(run())
+
+    assert not result.revalidated
+    assert "if-none-match" not in origin.requests[1].headers
+
+
+def test_response_without_validators_is_not_remembered():
+    fetcher = make_fetcher(lambda request: httpx.Response(200, content=b"volatile", headers={"Content-Type": "text/plain"}))
+
+    async def run():
+        try:
+            await fetch_once(fetcher, "http://origin.test/doc.txt")
+        finally:
+            await fetcher.shutdown()
+
+    asyncio.run(run())
+
+    assert len(fetcher.cache) == 0
+
+
+def test_per_host_concurrency_limit():
+    running: Dict[str, int] = {}
+    peak: Dict[str, int] = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        running[host] = running.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), running[host])
+        await asyncio.sleep(0.05)
+        running[host] -= 1
+        return httpx.Response(200, content=b"x", headers={"Content-Type": "text/plain"})
+
+    fetcher = make_fetcher(handler, per_host_connections=2)
+
+    async def run():
+        try:
+            uris = [f"http://{host}/{index}.txt" for host in ("a.test", "b.test") for index in range(6)]
+            await asyncio.gather(*(fetch_once(fetcher, uri) for uri in uris))
+        finally:
+            await fetcher.shutdown()
+
+    asyncio.run(run())
+
+    assert peak == {"a.test": 2, "b.test": 2}
+    # Host slots are dropped once no fetch holds or waits for them
+    assert fetcher._hosts == {}
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def _raise(error: Exception) -> Callable:
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise error
+    return handler
+
+
+@pytest.mark.parametrize("handler, status_code", [
+    (lambda request: httpx.Response(404), 502),
+    (lambda request: httpx.Response(500), 502),
+    (_raise(httpx.ReadTimeout("read timed out")), 504),
+    (_raise(httpx.ConnectTimeout("connect timed out")), 504),
+    (_raise(httpx.ConnectError("connection refused")), 502),
+    (lambda request: httpx.Response(200, content=b"x" * 2048, headers={"Content-Length": "2048"}), 413),
+    # A body without Content-Length is cut off once it grows past the limit
+    (lambda request: httpx.Response(200, content=_chunks(b"x" * 600, b"x" * 600)), 413),
+])
+def test_error_mapping(handler: Callable, status_code: int):
+    fetcher = make_fetcher(handler, max_bytes=1024)
+
+    async def run():
+        try:
+            await fetcher.fetch("http://origin.test/doc.txt")
+        finally:
+            await fetcher.shutdown()
+
+    with pytest.raises(FetchError) as raised:
+        asyncio.run(run())
+
+    assert raised.value.status_code == status_code
+
+
+def test_convert_uri_revalidates_and_serves_from_cache(monkeypatch):
+    from main import app
+
+    origin = Origin(b"# Title\n\nBody text")
+    monkeypatch.setattr(fetch.uri_fetcher, "transport", httpx.MockTransport(origin))
+    monkeypatch.setattr(fetch.uri_fetcher, "cache", FetchCache(max_entries=100, max_bytes=1024 * 1024))
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://server.test") as client:
+                # A query string no other test uses keeps the result cache key unique
+                body = {"uri": "http://origin.test/convert-uri-test.txt?case=revalidate"}
+                return [await client.post("/convert_uri", json=body) for _ in range(2)]
+
+    first, second = asyncio.run(run())
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert (first.headers["x-fetch"], first.headers["x-cache"]) == ("fetched", "MISS")
+    assert (second.headers["x-fetch"], second.headers["x-cache"]) == ("revalidated", "HIT")
+    assert second.text == first.text
+    assert "Body text" in first.text
+    assert origin.requests[1].headers["if-none-match"] == ETAG
+
+
+def test_convert_uri_maps_fetch_errors(monkeypatch):
+    from main import app
+
+    monkeypatch.setattr(fetch.uri_fetcher, "transport", httpx.MockTransport(lambda request: httpx.Response(404)))
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://server.test") as client:
+                return await client.post("/convert_uri", json={"uri": "http://origin.test/missing.txt"})
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 502
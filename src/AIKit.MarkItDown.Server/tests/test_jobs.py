@@ -0,0 +1,180 @@
+"""Tests for asynchronous conversion jobs."""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict
+
+import httpx
+import pytest
+
+import fetch
+import jobs
+from executor import ConversionOutput
+from fetch import FetchCache
+from jobs import JobRecord, MemoryJobStore, SQLiteJobStore, SUCCEEDED, job_manager
+
+
+def with_client(test: Callable[[httpx.AsyncClient], Awaitable]):
+    from main import app
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://server.test") as client:
+                return await test(client)
+
+    return asyncio.run(run())
+
+
+async def wait_finished(client: httpx.AsyncClient, job_id: str) -> Dict:
+    for _ in range(200):
+        status = (await client.get(f"/jobs/{job_id}")).json()
+        if status["status"] in ("succeeded", "failed"):
+            return status
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+class BlockedConversions:
+    """Replaces run_cached in the job runners with conversions that finish once released."""
+
+    def __init__(self, monkeypatch):
+        self.released = None
+        monkeypatch.setattr(jobs, "run_cached", self.run_cached)
+
+    async def run_cached(self, key, job, wait=False):
+        if self.released is None:
+            self.released = asyncio.Event()
+        await self.released.wait()
+        return ConversionOutput(text_content="converted"), False
+
+    def release(self):
+        if self.released is not None:
+            self.released.set()
+
+
+def test_file_job_runs_to_completion():
+    async def test(client):
+        accepted = await client.post("/jobs", files={"file": ("note.txt", b"queued conversion")})
+        status = await wait_finished(client, accepted.json()["id"])
+        result = await client.get(accepted.json()["result_url"])
+        return accepted, status, result
+
+    accepted, status, result = with_client(test)
+
+    assert accepted.status_code == 202
+    assert accepted.headers["location"] == accepted.json()["status_url"]
+    assert status["status"] == "succeeded"
+    assert status["result_size"] == len("queued conversion")
+    assert result.text == "queued conversion"
+    assert result.headers["x-cache"] in ("HIT", "MISS")
+
+
+def test_uri_job_is_fetched_server_side(monkeypatch):
+    requests = []
+
+    def origin(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=b"# Remote\n\nFetched for a job", headers={"Content-Type": "text/plain", "ETag": '"v1"'})
+
+    monkeypatch.setattr(fetch.uri_fetcher, "transport", httpx.MockTransport(origin))
+    monkeypatch.setattr(fetch.uri_fetcher, "cache", FetchCache(max_entries=100, max_bytes=1024 * 1024))
+
+    async def test(client):
+        accepted = await client.post("/jobs", json={"uri": "http://origin.test/job.txt?case=jobs"})
+        await wait_finished(client, accepted.json()["id"])
+        return await client.get(accepted.json()["result_url"])
+
+    result = with_client(test)
+
+    assert result.status_code == 200
+    assert "Fetched for a job" in result.text
+    assert len(requests) == 1
+
+
+def test_result_before_completion_is_a_conflict(monkeypatch):
+    conversions = BlockedConversions(monkeypatch)
+
+    async def test(client):
+        accepted = await client.post("/jobs", files={"file": ("note.txt", b"waiting")})
+        await asyncio.sleep(0.05)
+        status = await client.get(accepted.json()["status_url"])
+        early = await client.get(accepted.json()["result_url"])
+        conversions.release()
+        await wait_finished(client, accepted.json()["id"])
+        late = await client.get(accepted.json()["result_url"])
+        return status, early, late
+
+    status, early, late = with_client(test)
+
+    assert status.json()["status"] == "running"
+    assert (early.status_code, early.json()["detail"]) == (409, "Job is running")
+    assert (late.status_code, late.text) == (200, "converted")
+
+
+def test_full_queue_is_rejected_with_retry_after(monkeypatch):
+    conversions = BlockedConversions(monkeypatch)
+    monkeypatch.setattr(job_manager, "concurrency", 1)
+    monkeypatch.setattr(job_manager, "queue_size", 1)
+
+    async def test(client):
+        running = await client.post("/jobs", files={"file": ("one.txt", b"one")})
+        # Let the single runner take the first job off the queue
+        await asyncio.sleep(0.05)
+        queued = await client.post("/jobs", files={"file": ("two.txt", b"two")})
+        rejected = await client.post("/jobs", files={"file": ("three.txt", b"three")})
+        position = (await client.get(queued.json()["status_url"])).json()
+        conversions.release()
+        return running, queued, rejected, position
+
+    running, queued, rejected, position = with_client(test)
+
+    assert (running.status_code, queued.status_code) == (202, 202)
+    assert position["status"] == "queued" and position["queue_position"] == 0
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) >= 1
+
+
+def test_expired_job_is_gone(monkeypatch):
+    monkeypatch.setattr(job_manager, "ttl", 0.1)
+
+    async def test(client):
+        accepted = await client.post("/jobs", files={"file": ("note.txt", b"short-lived")})
+        await wait_finished(client, accepted.json()["id"])
+        await asyncio.sleep(0.2)
+        return await client.get(accepted.json()["status_url"]), await client.get(accepted.json()["result_url"])
+
+    status, result = with_client(test)
+
+    assert status.status_code == 404
+    assert result.status_code == 404
+
+
+def record(job_id: str, expires_at: float) -> JobRecord:
+    return JobRecord(id=job_id, status=SUCCEEDED, source="note.txt", created_at=time.time(), expires_at=expires_at, result="# Result")
+
+
+@pytest.mark.parametrize("make_store", [lambda tmp_path: MemoryJobStore(), lambda tmp_path: SQLiteJobStore(str(tmp_path / "jobs.db"))])
+def test_purge_removes_expired_records(tmp_path, make_store):
+    store = make_store(tmp_path)
+    now = time.time()
+    store.save(record("expired", now - 1))
+    store.save(record("current", now + 60))
+
+    assert store.purge_expired(now) == 1
+    assert store.get("expired") is None
+    assert store.get("current").result == "# Result"
+    store.close()
+
+
+def test_sqlite_store_survives_reopening(tmp_path):
+    path = str(tmp_path / "nested" / "jobs.db")
+    expires_at = time.time() + 60
+    store = SQLiteJobStore(path)
+    store.save(record("kept", expires_at))
+    store.close()
+
+    reopened = SQLiteJobStore(path)
+    kept = reopened.get("kept")
+    reopened.close()
+
+    assert (kept.id, kept.status, kept.result, kept.expires_at) == ("kept", SUCCEEDED, "# Result", expires_at)
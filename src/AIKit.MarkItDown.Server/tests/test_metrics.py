@@ -0,0 +1,13 @@
+"""Tests for metric labels."""
+
+import pytest
+
+from metrics import converter_name
+from models import MarkDownConfig
+
+
+@pytest.mark.parametrize("extension, converter", [("pdf", "DocumentIntelligenceConverter"), ("pptx", "DocumentIntelligenceConverter"), ("html", "HtmlConverter"), ("htm", "HtmlConverter")])
+def test_document_intelligence_label_follows_its_file_types(extension, converter):
+    config = MarkDownConfig(docintel_endpoint="https://docintel.test", docintel_key="key")
+
+    assert converter_name(extension, config) == converter
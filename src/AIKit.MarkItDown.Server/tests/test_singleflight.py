@@ -0,0 +1,157 @@
+"""Tests for coalescing identical concurrent conversions."""
+
+import asyncio
+from typing import List
+
+import pytest
+
+import conversion
+from cache import cache_key
+from conversion import flight_key, run_cached
+from executor import ConversionJob, ConversionOutput
+from models import MarkDownConfig
+from singleflight import SingleFlight
+
+
+class Gate:
+    """A call that counts its runs and finishes once released."""
+
+    def __init__(self, result="done", error: Exception = None):
+        self.result = result
+        self.error = error
+        self.runs = 0
+        self.cancelled = 0
+        self.released = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        try:
+            await self.released.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def settle():
+    # Let the callers and the flight task reach their awaits
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_callers_share_one_run():
+    async def run():
+        flights = SingleFlight()
+        gate = Gate()
+        callers = [asyncio.ensure_future(flights.run("key", gate)) for _ in range(5)]
+        await settle()
+        assert "key" in flights
+        gate.released.set()
+        results = await asyncio.gather(*callers)
+        return flights, gate, results
+
+    flights, gate, results = asyncio.run(run())
+
+    assert results == ["done"] * 5
+    assert gate.runs == 1
+    # The key is dropped once the call finished
+    assert flights.in_flight == 0
+
+
+def test_error_reaches_every_caller():
+    error = RuntimeError("conversion failed")
+
+    async def run():
+        flights = SingleFlight()
+        gate = Gate(error=error)
+        callers = [asyncio.ensure_future(flights.run("key", gate)) for _ in range(3)]
+        await settle()
+        gate.released.set()
+        return gate, await asyncio.gather(*callers, return_exceptions=True)
+
+    gate, outcomes = asyncio.run(run())
+
+    assert outcomes == [error] * 3
+    assert gate.runs == 1
+
+
+@pytest.mark.parametrize("handoff", [False, True])
+def test_follower_gets_the_result_when_the_leader_leaves(handoff):
+    async def run():
+        flights = SingleFlight()
+        leader_call, follower_call = Gate("leader"), Gate("follower")
+        leader = asyncio.ensure_future(flights.run("key", leader_call, handoff=handoff))
+        await settle()
+        follower = asyncio.ensure_future(flights.run("key", follower_call, handoff=handoff))
+        await settle()
+        leader.cancel()
+        await settle()
+        leader_call.released.set()
+        follower_call.released.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return leader_call, follower_call, await follower
+
+    leader_call, follower_call, result = asyncio.run(run())
+
+    if handoff:
+        # The leader's call depended on the leader, so it is restarted with the follower's
+        assert (leader_call.cancelled, follower_call.runs, result) == (1, 1, "follower")
+    else:
+        assert (leader_call.cancelled, follower_call.runs, result) == (0, 0, "leader")
+
+
+def test_call_is_cancelled_once_every_caller_left():
+    async def run():
+        flights = SingleFlight()
+        gate = Gate()
+        callers = [asyncio.ensure_future(flights.run("key", gate)) for _ in range(2)]
+        await settle()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await settle()
+        return flights, gate
+
+    flights, gate = asyncio.run(run())
+
+    assert gate.cancelled == 1
+    assert flights.in_flight == 0
+
+
+class FakePool:
+    """Stands in for the conversion pool, counting the jobs it runs."""
+
+    def __init__(self):
+        self.jobs: List[ConversionJob] = []
+        self.released = asyncio.Event()
+
+    async def run(self, job: ConversionJob) -> ConversionOutput:
+        self.jobs.append(job)
+        await self.released.wait()
+        return ConversionOutput(text_content=f"converted with {job.config.llm_api_key}")
+
+
+def test_callers_with_different_credentials_are_not_coalesced(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(conversion, "conversion_pool", pool)
+    configs = [MarkDownConfig(llm_api_key=key) for key in ("alice-key", "alice-key", "bob-key")]
+
+    async def run():
+        calls = []
+        for config in configs:
+            job = ConversionJob(source=b"same bytes", source_type="bytes", file_extension="txt", config=config)
+            calls.append(asyncio.ensure_future(run_cached(cache_key("credentials-test", "txt", config), job)))
+        await settle()
+        pool.released.set()
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(run())
+
+    # The cache key is the same for all three; only the two callers with the same key share a run
+    assert len({cache_key("credentials-test", "txt", config) for config in configs}) == 1
+    assert len({flight_key(cache_key("credentials-test", "txt", config), config) for config in configs}) == 2
+    assert len(pool.jobs) == 2
+    assert [result.text_content for result, _ in results] == ["converted with alice-key", "converted with alice-key", "converted with bob-key"]
@@ -0,0 +1,71 @@
+"""Tests for compressed request bodies."""
+
+import asyncio
+import gzip
+import os
+
+import httpx
+import pytest
+
+zstandard = pytest.importorskip("zstandard")
+
+from constants import UPLOAD_CHUNK_SIZE
+from uploads import _ZstdDecoder
+
+
+def multipart(text: bytes) -> httpx.Request:
+    return httpx.Request("POST", "http://server.test/convert", files={"file": ("note.txt", text)})
+
+
+def post_compressed(body: bytes, content_type: str, encoding: str) -> httpx.Response:
+    from main import app
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://server.test") as client:
+                return await client.post("/convert", content=body, headers={"Content-Type": content_type, "Content-Encoding": encoding})
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("zstd", lambda data: zstandard.ZstdCompressor().compress(data)),
+    ("gzip", gzip.compress),
+])
+def test_compressed_body_is_converted(encoding, compress):
+    request = multipart(b"compressed request body " + encoding.encode())
+    body = request.read()
+
+    response = post_compressed(compress(body), request.headers["Content-Type"], encoding)
+
+    assert response.status_code == 200
+    assert response.text == "compressed request body " + encoding
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("zstd", lambda data: zstandard.ZstdCompressor().compress(data)),
+    ("gzip", gzip.compress),
+])
+def test_truncated_body_is_rejected(encoding, compress):
+    request = multipart(os.urandom(64 * 1024))
+    compressed = compress(request.read())
+
+    response = post_compressed(compressed[:len(compressed) * 2 // 3], request.headers["Content-Type"], encoding)
+
+    assert response.status_code == 400
+    assert "truncated" in response.json()["detail"]
+
+
+def test_zstd_is_decoded_in_bounded_pieces():
+    # Two frames, the first expanding 30000-fold
+    data = bytes(20 * UPLOAD_CHUNK_SIZE) + os.urandom(300 * 1024)
+    compressor = zstandard.ZstdCompressor()
+    stream = compressor.compress(data[:20 * UPLOAD_CHUNK_SIZE]) + compressor.compress(data[20 * UPLOAD_CHUNK_SIZE:])
+    decoder = _ZstdDecoder()
+
+    pieces = []
+    for start in range(0, len(stream), 64 * 1024):
+        pieces.extend(decoder.decode(stream[start:start + 64 * 1024], start + 64 * 1024 >= len(stream)))
+
+    assert b"".join(pieces) == data
+    assert max(len(piece) for piece in pieces) == UPLOAD_CHUNK_SIZE
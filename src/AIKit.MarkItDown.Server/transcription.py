@@ -0,0 +1,266 @@
+"""Segmented audio transcription: recordings are cut at silences and transcribed in parallel."""
+
+import importlib.util
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from executor import Segment
+from config import (
+    TRANSCRIBE_SEGMENTED, TRANSCRIBE_BACKEND, TRANSCRIBE_MODEL, TRANSCRIBE_LANGUAGE, TRANSCRIBE_SEGMENT_SECONDS,
+    TRANSCRIBE_OVERLAP_MS, TRANSCRIBE_MIN_SILENCE_MS, TRANSCRIBE_SILENCE_DB, TRANSCRIBE_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+# Audio formats MarkItDown's AudioConverter transcribes, with their pydub format names
+AUDIO_FORMATS = {"wav": "wav", "mp3": "mp3", "m4a": "mp4", "mp4": "mp4"}
+
+# Transcription backends; all but "google" run locally without network access
+TRANSCRIBE_BACKENDS = ("google", "sphinx", "faster_whisper")
+
+# Offline backends tried by "auto", in order of preference, with the module each needs
+OFFLINE_BACKENDS = (("faster_whisper", "faster_whisper"), ("sphinx", "pocketsphinx"))
+
+# Metadata fields MarkItDown's AudioConverter puts above the transcript
+METADATA_FIELDS = (
+    "Title", "Artist", "Author", "Band", "Album", "Genre", "Track", "DateTimeOriginal",
+    "CreateDate", "NumChannels", "SampleRate", "AvgBytesPerSec", "BitsPerSample"
+)
+
+# Loudness is measured over frames of this length when looking for silences
+FRAME_MS = 20
+
+# Words compared when removing text repeated across the overlap of two segments
+MAX_OVERLAP_WORDS = 8
+
+
+def segmented_audio(file_extension: Optional[str]) -> bool:
+    """Whether files with this extension are transcribed segment by segment."""
+    return TRANSCRIBE_SEGMENTED and (file_extension or "").lower().lstrip(".") in AUDIO_FORMATS
+
+
+def resolve_backend(backend: str) -> str:
+    """Resolve "auto" to the first installed offline backend, falling back to "google".
+
+    Args:
+        backend: A name from TRANSCRIBE_BACKENDS, or "auto".
+
+    Returns:
+        The backend to transcribe with.
+    """
+    if backend != "auto":
+        return backend
+    for name, module in OFFLINE_BACKENDS:
+        if importlib.util.find_spec(module) is not None:
+            return name
+    return "google"
+
+
+# The backend used by segmented transcription
+BACKEND = resolve_backend(TRANSCRIBE_BACKEND)
+if TRANSCRIBE_SEGMENTED and BACKEND == "google":
+    logger.warning("Segmented transcription uses the online Google Web Speech API; install pocketsphinx or faster-whisper to transcribe offline")
+
+
+def format_timestamp(ms: int) -> str:
+    """Format milliseconds as HH:MM:SS."""
+    seconds = ms // 1000
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def plan_segments(loudness: List[float], frame_ms: int, duration_ms: int, max_ms: int, min_silence_ms: int, threshold: float) -> List[Tuple[int, int]]:
+    """Cut a recording into segments of at most max_ms, preferring the middle of silences.
+
+    Args:
+        loudness: dBFS of each consecutive frame.
+        frame_ms: Length of a frame.
+        duration_ms: Length of the recording.
+        max_ms: Maximum segment length.
+        min_silence_ms: Shortest quiet stretch counted as a silence.
+        threshold: Frames quieter than this many dBFS are quiet.
+
+    Returns:
+        (start, end) milliseconds of each segment, in order and without gaps. A segment
+        is only cut inside speech when no silence falls in the second half of its span.
+    """
+    cuts = []
+    run_start = None
+    min_frames = max(min_silence_ms // frame_ms, 1)
+    for index, level in enumerate(list(loudness) + [0.0]):
+        if level < threshold and index < len(loudness):
+            if run_start is None:
+                run_start = index
+        elif run_start is not None:
+            if index - run_start >= min_frames:
+                cuts.append((run_start + index) * frame_ms // 2)
+            run_start = None
+
+    segments = []
+    start = 0
+    position = 0
+    while duration_ms - start > max_ms:
+        limit = start + max_ms
+        while position < len(cuts) and cuts[position] <= start:
+            position += 1
+        candidates = [cut for cut in cuts[position:] if start + max_ms // 2 < cut <= limit]
+        end = candidates[-1] if candidates else limit
+        segments.append((start, end))
+        start = end
+    segments.append((start, duration_ms))
+    return segments
+
+
+def merge_overlap(previous: str, text: str) -> str:
+    """Drop the words at the start of text that repeat the end of previous."""
+    before = previous.split()[-MAX_OVERLAP_WORDS:]
+    words = text.split()
+    for size in range(min(len(before), len(words)), 0, -1):
+        if [w.lower().strip(".,!?") for w in before[-size:]] == [w.lower().strip(".,!?") for w in words[:size]]:
+            return " ".join(words[size:])
+    return text
+
+
+_local_model = None
+_local_model_lock = threading.Lock()
+
+
+def _faster_whisper_model():
+    # Loaded once per worker process and shared by its transcription threads
+    global _local_model
+    with _local_model_lock:
+        if _local_model is None:
+            from faster_whisper import WhisperModel
+            _local_model = WhisperModel(TRANSCRIBE_MODEL, device="cpu", compute_type="int8", num_workers=max(TRANSCRIBE_CONCURRENCY, 1))
+        return _local_model
+
+
+def transcribe_segment(audio: Any, backend: str = BACKEND, language: Optional[str] = TRANSCRIBE_LANGUAGE) -> str:
+    """Transcribe a mono pydub AudioSegment.
+
+    Args:
+        audio: The audio to transcribe.
+        backend: One of TRANSCRIBE_BACKENDS.
+        language: Recognition language, e.g. "en-US"; "faster_whisper" uses its first
+            part and detects the language when it is empty.
+
+    Returns:
+        The transcript, or "" if no speech was recognized.
+
+    Raises:
+        RuntimeError: If the backend is unknown.
+    """
+    import speech_recognition as sr
+
+    if backend not in TRANSCRIBE_BACKENDS:
+        raise RuntimeError(f"Unknown transcription backend '{backend}'. Use auto or one of: {', '.join(TRANSCRIBE_BACKENDS)}.")
+    if backend == "faster_whisper":
+        import numpy as np
+        samples = audio.set_frame_rate(16000).set_sample_width(2)
+        data = np.frombuffer(samples.raw_data, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = _faster_whisper_model().transcribe(data, language=(language or "").split("-")[0] or None)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    recognizer = sr.Recognizer()
+    data = sr.AudioData(audio.raw_data, audio.frame_rate, audio.sample_width)
+    try:
+        if backend == "sphinx":
+            return recognizer.recognize_sphinx(data, language=language or "en-US").strip()
+        return recognizer.recognize_google(data, language=language or "en-US").strip()
+    except sr.UnknownValueError:
+        return ""
+
+
+def _load_audio(file_stream: BinaryIO, audio_format: str) -> Any:
+    import pydub
+    return pydub.AudioSegment.from_file(file_stream, format=audio_format).set_channels(1)
+
+
+def _loudness(audio: Any) -> List[float]:
+    """dBFS of each FRAME_MS frame of a mono recording."""
+    import numpy as np
+
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float64)
+    frame = max(audio.frame_rate * FRAME_MS // 1000, 1)
+    count = len(samples) // frame
+    if count == 0:
+        return []
+    rms = np.sqrt(np.mean(samples[:count * frame].reshape(count, frame) ** 2, axis=1))
+    full_scale = float(1 << (8 * audio.sample_width - 1))
+    return (20 * np.log10(np.maximum(rms, 1e-9) / full_scale)).tolist()
+
+
+def _metadata_markdown(file_stream: BinaryIO, exiftool_path: Optional[str]) -> str:
+    from markitdown.converters._exiftool import exiftool_metadata
+
+    position = file_stream.tell()
+    try:
+        metadata = exiftool_metadata(file_stream, exiftool_path=exiftool_path) or {}
+    finally:
+        file_stream.seek(position)
+    return "".join(f"{name}: {metadata[name]}\n" for name in METADATA_FIELDS if name in metadata)
+
+
+def iter_audio_segments(file_stream: BinaryIO, file_extension: Optional[str], selection=None, transcribe: Callable[[Any], str] = transcribe_segment, **kwargs: Any) -> Iterator[Segment]:
+    """Transcribe a recording in parallel segments, yielding them in order as they finish.
+
+    The recording is cut at silences into segments of at most TRANSCRIBE_SEGMENT_SECONDS,
+    each padded with TRANSCRIBE_OVERLAP_MS of its neighbours so words at a cut are not
+    lost; text repeated across a padding is dropped when the segments are merged. Up to
+    TRANSCRIBE_CONCURRENCY segments are transcribed at once. The first segment holds
+    the metadata and transcript heading of MarkItDown's AudioConverter; each following
+    one is a transcript line prefixed with its start time.
+
+    Args:
+        file_stream: The recording.
+        file_extension: Its extension, one of AUDIO_FORMATS.
+        selection: Unused; audio has no pages to select.
+        transcribe: Transcribes one audio segment.
+        **kwargs: Conversion options; exiftool_path is used for metadata.
+
+    Yields:
+        A "document" segment with the heading, then one "audio" segment per transcribed
+        part, labelled with its time span.
+    """
+    audio_format = AUDIO_FORMATS[(file_extension or "").lower().lstrip(".")]
+    header = _metadata_markdown(file_stream, kwargs.get("exiftool_path"))
+    audio = _load_audio(file_stream, audio_format)
+    yield Segment(kind="document", index=1, markdown=(header + "\n\n### Audio Transcript:").strip())
+
+    threshold = audio.dBFS - TRANSCRIBE_SILENCE_DB if audio.rms else 0.0
+    spans = plan_segments(_loudness(audio), FRAME_MS, len(audio), max(int(TRANSCRIBE_SEGMENT_SECONDS * 1000), 1000), TRANSCRIBE_MIN_SILENCE_MS, threshold)
+    logger.info(f"Transcribing {len(audio) / 1000:.0f}s of audio as {len(spans)} segments")
+
+    def run(start: int, end: int) -> str:
+        return transcribe(audio[max(start - TRANSCRIBE_OVERLAP_MS, 0):min(end + TRANSCRIBE_OVERLAP_MS, len(audio))])
+
+    executor = ThreadPoolExecutor(max_workers=max(min(TRANSCRIBE_CONCURRENCY, len(spans)), 1), thread_name_prefix="transcribe")
+    try:
+        futures = [executor.submit(run, start, end) for start, end in spans]
+        previous = ""
+        spoken = False
+        for index, ((start, end), future) in enumerate(zip(spans, futures), start=2):
+            text = merge_overlap(previous, future.result()) if previous else future.result()
+            previous = text or previous
+            if text:
+                spoken = True
+                yield Segment(kind="audio", index=index, label=f"{format_timestamp(start)}-{format_timestamp(end)}", markdown=f"[{format_timestamp(start)}] {text}")
+        if not spoken:
+            yield Segment(kind="audio", index=len(spans) + 2, markdown="[No speech detected]")
+    finally:
+        # A stopped conversion drops the segments not started yet
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def transcription_settings() -> Dict[str, Any]:
+    """Describe the transcription settings for the result cache key of audio files."""
+    return {
+        "backend": BACKEND,
+        "model": TRANSCRIBE_MODEL if BACKEND == "faster_whisper" else None,
+        "language": TRANSCRIBE_LANGUAGE,
+        "segment_seconds": TRANSCRIBE_SEGMENT_SECONDS,
+        "overlap_ms": TRANSCRIBE_OVERLAP_MS,
+        "min_silence_ms": TRANSCRIBE_MIN_SILENCE_MS,
+        "silence_db": TRANSCRIBE_SILENCE_DB
+    }
@@ -0,0 +1,379 @@
+"""Upload handling: incremental size limits and spooling of request bodies to disk."""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import zlib
+from typing import Any, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from constants import MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE
+from config import UPLOAD_SPOOL_THRESHOLD
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def file_too_large_detail(max_size: int = MAX_FILE_SIZE) -> str:
+    """Build the error message returned for oversized uploads."""
+    return f"File too large. Maximum size is {max_size / (1024 * 1024)}MB."
+
+
+class SpooledUpload:
+    """An upload buffered in memory up to a threshold and spilled to a temp file beyond it.
+
+    The SHA-256 digest and size are computed while writing, so the upload never has
+    to be held in memory as a whole.
+    """
+
+    def __init__(self, threshold: int = UPLOAD_SPOOL_THRESHOLD, suffix: Optional[str] = None):
+        self.threshold = threshold
+        self.suffix = suffix
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+        self._hash = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    def write(self, chunk: bytes):
+        """Append a chunk, spilling to disk once the threshold is crossed."""
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self.size > self.threshold:
+            fd, self.path = tempfile.mkstemp(prefix="markitdown-", suffix=self.suffix or "")
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def finish(self):
+        """Flush buffered data once the whole upload has been written."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def job_source(self) -> Tuple[Any, str]:
+        """Get the source and source type to hand to a conversion job.
+
+        Returns:
+            Tuple of (source, source_type): a file path for spilled uploads, bytes otherwise.
+        """
+        if self.on_disk:
+            return self.path, "path"
+        return self._buffer.getvalue(), "bytes"
+
+    def open(self):
+        """Open a seekable binary stream over the upload."""
+        if self.on_disk:
+            return open(self.path, "rb")
+        return io.BytesIO(self._buffer.getbuffer())
+
+    def close(self):
+        """Release the buffer and delete the temp file, if any."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._buffer = None
+
+
+async def spool_upload(file: UploadFile, max_size: int = MAX_FILE_SIZE, suffix: Optional[str] = None) -> SpooledUpload:
+    """Read an upload in chunks into a SpooledUpload, enforcing the size limit as it goes.
+
+    Args:
+        file: The uploaded file.
+        max_size: Maximum allowed size in bytes.
+        suffix: Optional suffix for the temp file (e.g. ".pdf").
+
+    Returns:
+        SpooledUpload: The spooled upload; the caller must close it.
+
+    Raises:
+        HTTPException: 413 as soon as the upload exceeds max_size.
+    """
+    upload = SpooledUpload(suffix=suffix)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if upload.size + len(chunk) > max_size:
+                logger.warning(f"Upload {file.filename} exceeds {max_size} bytes, aborting")
+                raise HTTPException(status_code=413, detail=file_too_large_detail(max_size))
+            upload.write(chunk)
+        upload.finish()
+    except BaseException:
+        upload.close()
+        raise
+    return upload
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class RequestSizeLimitMiddleware:
+    """ASGI middleware that rejects request bodies larger than a limit with 413.
+
+    Requests announcing a larger Content-Length are rejected before any of the body is
+    read; chunked bodies are counted while they stream in and aborted once the limit
+    is crossed.
+    """
+
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    if int(value) > self.max_body_size:
+                        await self._reject(send)
+                        return
+                except ValueError:
+                    pass
+
+        received = 0
+        exceeded = False
+        responded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def limited_send(message):
+            nonlocal responded
+            # Once the limit is crossed, whatever error the app produces is replaced by a 413
+            if exceeded:
+                if message["type"] == "http.response.start" and not responded:
+                    await self._reject(send)
+                    responded = True
+                return
+            if message["type"] == "http.response.start":
+                responded = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except _BodyTooLarge:
+            if responded:
+                return
+            await self._reject(send)
+        if exceeded:
+            logger.warning(f"Request body to {scope.get('path')} exceeded {self.max_body_size} bytes, aborted")
+
+    async def _reject(self, send):
+        await _send_error(send, 413, file_too_large_detail())
+
+
+class _InvalidBody(Exception):
+    pass
+
+
+class _ZlibDecoder:
+    """Inflates gzip or zlib (HTTP "deflate") data, at most UPLOAD_CHUNK_SIZE bytes at a time."""
+
+    def __init__(self, wbits: int):
+        self._wbits = wbits
+        self._decompressor = zlib.decompressobj(wbits)
+
+    def decode(self, data: bytes, final: bool) -> Iterator[bytes]:
+        while data:
+            chunk = self._decompressor.decompress(data, UPLOAD_CHUNK_SIZE)
+            data = self._decompressor.unconsumed_tail
+            if self._decompressor.eof and self._decompressor.unused_data:
+                # Concatenated gzip members make up one body
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(self._wbits)
+            if chunk:
+                yield chunk
+        if final:
+            chunk = self._decompressor.flush()
+            if chunk:
+                yield chunk
+            if not self._decompressor.eof:
+                raise zlib.error("Compressed request body is truncated")
+
+
+# zstd expands input at most about 32768-fold (an RLE block of 4 bytes regenerates 128 KB),
+# so decompressing this much input at a time produces at most 8 MB
+_ZSTD_INPUT_SIZE = 256
+
+
+class _ZstdDecoder:
+    """Decompresses zstd data, at most UPLOAD_CHUNK_SIZE bytes at a time."""
+
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decode(self, data: bytes, final: bool) -> Iterator[bytes]:
+        # zstandard's decompressobj has no output limit, so the input is fed in small pieces
+        output = bytearray()
+        view = memoryview(data)
+        for position in range(0, len(view), _ZSTD_INPUT_SIZE):
+            piece = view[position:position + _ZSTD_INPUT_SIZE]
+            while piece:
+                if self._decompressor.eof:
+                    # Concatenated frames make up one body
+                    self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+                output += self._decompressor.decompress(piece)
+                piece = self._decompressor.unused_data if self._decompressor.eof else b""
+                while len(output) >= UPLOAD_CHUNK_SIZE:
+                    yield bytes(output[:UPLOAD_CHUNK_SIZE])
+                    del output[:UPLOAD_CHUNK_SIZE]
+        if output:
+            yield bytes(output)
+        if final and not self._decompressor.eof:
+            raise ValueError("Compressed request body is truncated")
+
+
+def request_encodings() -> List[str]:
+    """The request Content-Encodings this process can decompress."""
+    encodings = ["gzip", "deflate"]
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+class RequestDecompressionMiddleware:
+    """ASGI middleware that decompresses request bodies sent with a Content-Encoding.
+
+    gzip, deflate and (with the zstandard package) zstd bodies are decompressed as they
+    stream in, so the app sees a plain body. The decompressed size is counted as it is
+    produced and the request is aborted with 413 once it exceeds max_body_size, which
+    stops small bodies that expand into huge ones. Other codings are rejected with 415
+    and corrupt data with 400.
+    """
+
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.encodings = request_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-encoding":
+                encoding = value.decode("latin-1").strip().lower()
+        if encoding in (None, "", "identity"):
+            await self.app(scope, receive, send)
+            return
+        if encoding not in self.encodings:
+            await _send_error(send, 415, f"Unsupported Content-Encoding '{encoding}'. Supported: {', '.join(self.encodings)}.")
+            return
+
+        if encoding == "zstd":
+            decoder = _ZstdDecoder()
+        else:
+            decoder = _ZlibDecoder(31 if encoding == "gzip" else zlib.MAX_WBITS)
+        # The app sees the decompressed body, whose length is not known up front
+        scope = dict(scope)
+        scope["headers"] = [(k, v) for k, v in scope.get("headers", []) if k not in (b"content-encoding", b"content-length")]
+
+        pieces: Optional[Iterator[bytes]] = None
+        finished = False
+        received = 0
+        failure: Optional[Tuple[int, str]] = None
+        responded = False
+
+        async def decompressing_receive():
+            nonlocal pieces, finished, received, failure
+            while True:
+                if pieces is not None:
+                    try:
+                        piece = next(pieces, None)
+                    except _BodyTooLarge:
+                        failure = (413, file_too_large_detail())
+                        raise
+                    except (zlib.error, ValueError) as e:
+                        failure = (400, f"Invalid {encoding} request body: {str(e)}")
+                        raise _InvalidBody()
+                    except Exception as e:
+                        if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                            failure = (400, f"Invalid {encoding} request body: {str(e)}")
+                            raise _InvalidBody()
+                        raise
+                    if piece is not None:
+                        received += len(piece)
+                        if received > self.max_body_size:
+                            failure = (413, file_too_large_detail())
+                            raise _BodyTooLarge()
+                        return {"type": "http.request", "body": piece, "more_body": True}
+                    pieces = None
+                    if finished:
+                        return {"type": "http.request", "body": b"", "more_body": False}
+                message = await receive()
+                if message["type"] != "http.request":
+                    return message
+                finished = not message.get("more_body", False)
+                pieces = decoder.decode(message.get("body", b""), finished)
+
+        async def guarded_send(message):
+            nonlocal responded
+            # Once the body is rejected, whatever error the app produces is replaced
+            if failure is not None:
+                if message["type"] == "http.response.start" and not responded:
+                    await _send_error(send, *failure)
+                    responded = True
+                return
+            if message["type"] == "http.response.start":
+                responded = True
+            await send(message)
+
+        try:
+            await self.app(scope, decompressing_receive, guarded_send)
+        except (_BodyTooLarge, _InvalidBody):
+            if not responded:
+                await _send_error(send, *failure)
+                responded = True
+        if failure is not None:
+            logger.warning(f"Rejected {encoding} request body to {scope.get('path')}: {failure[1]}")
+
+
+async def _send_error(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii")), (b"connection", b"close")]
+    })
+    await send({"type": "http.response.body", "body": body})
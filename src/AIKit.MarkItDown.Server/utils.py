@@ -1,8 +1,10 @@
 """Utility functions for configuration validation and kwargs building."""
 
-import openai
+import json
 from models import MarkDownConfig
-from typing import Dict, Any
+from clients import get_openai_client
+from captions import CaptioningClient
+from typing import Dict, Any, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,6 +27,32 @@ def validate_config(config: MarkDownConfig):
         raise ValueError("Both llm_model and llm_api_key must be provided together.")
 
 
+def parse_config(config: Optional[str]) -> Optional[MarkDownConfig]:
+    """Parse a JSON config form field into a MarkDownConfig.
+
+    Args:
+        config: The JSON string from the request, or None.
+
+    Returns:
+        MarkDownConfig or None if no config was provided.
+
+    Raises:
+        ValueError: If the JSON or the config values are invalid.
+    """
+    if not config:
+        return None
+    try:
+        config_dict = json.loads(config)
+    except json.JSONDecodeError:
+        raise ValueError("Invalid JSON in config field")
+    if config_dict is None:
+        return None
+    try:
+        return MarkDownConfig(**config_dict)
+    except Exception as e:
+        raise ValueError(f"Invalid config: {str(e)}")
+
+
 def merge_configs(default_config: MarkDownConfig, request_config: MarkDownConfig = None) -> MarkDownConfig:
     """Merge request config with default config, allowing overrides.
 
@@ -60,25 +88,24 @@ def merge_configs(default_config: MarkDownConfig, request_config: MarkDownConfig
     return merged
 
 
-def build_conversion_kwargs(config: MarkDownConfig) -> Dict[str, Any]:
-    """Build kwargs dict from MarkDownConfig for markitdown conversion.
+def build_instance_kwargs(config: MarkDownConfig) -> Dict[str, Any]:
+    """Build the MarkItDown constructor kwargs for a configuration.
+
+    These settings are fixed for the lifetime of a MarkItDown instance: plugins and
+    the LLM client used for image descriptions. Document Intelligence is wired in
+    separately, since its converter is registered on the instance.
 
     Args:
         config: The MarkDownConfig object containing conversion settings.
 
     Returns:
-        Dict of kwargs to pass to markitdown conversion methods.
+        Dict of kwargs to pass to the MarkItDown constructor.
 
     Raises:
         ValueError: If config validation fails.
     """
     validate_config(config)
-    kwargs = {}
-
-    if config.docintel_endpoint:
-        kwargs['docintel_endpoint'] = config.docintel_endpoint
-    if config.docintel_key:
-        kwargs['docintel_key'] = config.docintel_key
+    kwargs = {'enable_plugins': config.enable_plugins if config.enable_plugins is not None else True}
 
     if config.llm_model:
         kwargs['llm_model'] = config.llm_model
@@ -86,13 +113,23 @@ def build_conversion_kwargs(config: MarkDownConfig) -> Dict[str, Any]:
         kwargs['llm_prompt'] = config.llm_prompt
 
     if config.llm_api_key and config.llm_model:
-        client = openai.OpenAI(api_key=config.llm_api_key)
-        kwargs['llm_client'] = client
+        # Reuse a pooled client so connections and TLS sessions survive across requests,
+        # and answer repeated images from the image description cache
+        kwargs['llm_client'] = CaptioningClient(get_openai_client(config.llm_api_key, config.llm_model))
 
+    return kwargs
+
+
+def build_conversion_kwargs(config: MarkDownConfig) -> Dict[str, Any]:
+    """Build the per-call kwargs from MarkDownConfig for markitdown conversion methods.
+
+    Args:
+        config: The MarkDownConfig object containing conversion settings.
+
+    Returns:
+        Dict of kwargs to pass to markitdown conversion methods.
+    """
+    kwargs = {}
     if config.keep_data_uris is not None:
         kwargs['keep_data_uris'] = config.keep_data_uris
-    if config.enable_plugins is not None:
-        kwargs['enable_plugins'] = config.enable_plugins
-
     return kwargs
-